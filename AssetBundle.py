@@ -0,0 +1,92 @@
+import os
+import argparse
+import json
+import struct
+import time
+import zlib
+import pygame
+
+# --- Preprocessed Asset Bundle ---
+# One file with every sprite frame already cropped, flood-filled and scaled for one
+# tile size, so startup skips decoding and processing dozens of PNGs.
+# Layout: MAGIC, header length (uint32 LE), JSON header, padding, then one pixel blob
+# per page: raw RGBA rows (memory-mapped when the platform allows) or zlib-compressed.
+# The header holds the page table and the asset tables (see Assets.save_bundle).
+MAGIC = b"HPDB\x01"
+ALIGN = 16
+
+def write(path, pages, index, compress=False):
+    """pages: Surfaces to store; index: JSON-serialisable dict kept next to the page table."""
+    blobs, entries, offset = [], [], 0
+    for surface in pages:
+        data = pygame.image.tostring(surface, "RGBA")
+        if compress: data = zlib.compress(data, 6)
+        entries.append({"offset": offset, "length": len(data), "size": list(surface.get_size()), "zlib": compress})
+        blobs.append(data)
+        offset += len(data) + (-len(data) % ALIGN)
+    header = json.dumps({"pages": entries, "index": index}, separators=(",", ":")).encode()
+    start = len(MAGIC) + 4 + len(header)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header + b"\0" * (-start % ALIGN))
+        for data in blobs:
+            f.write(data + b"\0" * (-len(data) % ALIGN))
+    os.replace(tmp, path) # A half-written bundle is never picked up
+
+def read(path):
+    """(index, pages) of a bundle, or None if path is missing or not a bundle.
+    Pages are converted to the display format, so a display must be set."""
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        try:
+            import mmap
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ImportError, OSError, ValueError): # No mmap (web build) or empty file
+            data = f.read()
+        view = memoryview(data)
+        blob = None
+        try:
+            if bytes(view[:len(MAGIC)]) != MAGIC: return None
+            header_len, = struct.unpack_from("<I", view, len(MAGIC))
+            header_start = len(MAGIC) + 4
+            header = json.loads(bytes(view[header_start:header_start + header_len]))
+            start = header_start + header_len
+            start += -start % ALIGN
+            pages = []
+            for entry in header["pages"]:
+                blob = view[start + entry["offset"]:start + entry["offset"] + entry["length"]]
+                if entry["zlib"]: blob = zlib.decompress(blob)
+                pages.append(pygame.image.frombuffer(blob, tuple(entry["size"]), "RGBA").convert_alpha())
+                blob = None
+            return header["index"], pages
+        finally:
+            if isinstance(blob, memoryview): blob.release() # A slice left by an error would keep the map open
+            view.release()
+            if not isinstance(data, bytes): data.close()
+
+
+# --- Build Step ---
+def main_cli():
+    parser = argparse.ArgumentParser(description="Preprocess all sprite assets into one bundle file.")
+    parser.add_argument("--out", default=None, help="bundle path (default: main.ASSET_BUNDLE)")
+    parser.add_argument("--compress", action="store_true", help="zlib pages: smaller file, no memory mapping")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Needs a display for convert_alpha, not a window
+    import Assets
+    import main
+    out = args.out or main.ASSET_BUNDLE
+    main.ASSET_BUNDLE = None # Load from the source images
+    t0 = time.perf_counter()
+    main.init_display()
+    t1 = time.perf_counter()
+    Assets.save_bundle(out, main.TILE_SIZE, main.WIDTH, main.HEIGHT, main.TILES_SEARCH_FOLDERS, compress=args.compress)
+    t2 = time.perf_counter()
+    print(f"Wrote {out} ({os.path.getsize(out) / 1e6:.1f} MB) in {t2 - t0:.2f}s: "
+          f"{t1 - t0:.2f}s loading and packing, {t2 - t1:.2f}s pending frames and write")
+
+if __name__ == "__main__":
+    main_cli()
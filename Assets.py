@@ -1,7 +1,17 @@
 import pygame
 import os
 import sys
+import hashlib
+import time
 from collections import deque 
+from Atlas import TextureAtlas
+import AssetBundle
+from FrameCache import FrameCache
+
+try:
+    import numpy as np
+except ImportError: # Background removal falls back to the pixel-by-pixel flood fill
+    np = None
 
 # ---------------- CONFIG ----------------
 # --- Configuration for non-pathway assets ---
@@ -118,12 +128,17 @@ ENEMY_CONFIG = {
         "file": "piero_walk.png",
         "w": 90,
         "h": 90,
-        "count": 4
+        "count": 4,
+        "remove_white_bg": True
     }
 }
 ENEMY_SCALE_FACTOR = 1.0
 
 
+# --- Configuration for the processed-frame disk cache ---
+FRAME_CACHE_DIR = ".frame_cache"
+FRAME_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
 # Internal dictionaries to store loaded Pygame surfaces
 _loaded_assets = {} 
 _loaded_llama_sprites = {} 
@@ -132,18 +147,75 @@ _loaded_hamsters = {}
 _loaded_projectiles = {} 
 _loaded_enemies = {} 
 _loaded_forest_sprites = [] 
+# Horizontally mirrored copies for left-facing units, same layout as the tables above
+_flipped_mcuncle_sprites = {}
+_flipped_hamsters = {}
+_flipped_enemies = {}
+_atlas = None # TextureAtlas holding the frames of the tables above, once build_atlas() ran
+_frame_cache = FrameCache(FRAME_CACHE_DIR, FRAME_CACHE_MAX_BYTES)
+_castle_source_key = None # Cache key of the castle frames, for deriving the sizes Castle asks for
+_castle_sprites = {} # (width, height) -> (sprites, masks, union mask), shared by every Castle
+_structure_masks = {} # Asset name -> (per-frame masks, union mask), shared by every instance
+
+
+# --- Helper: Mirrored Frames ---
+def _mirror_frames(frames):
+    return [pygame.transform.flip(frame, True, False) for frame in frames]
 
 
 # --- Helper: Remove Background (Flood Fill) ---
-def _remove_white_background_floodfill(surface):
+# Clears the white background connected (4-neighbour) to the image corners. Sheets opt
+# in with "remove_white_bg": True in their config entry; "white_tolerance" also clears
+# opaque pixels whose channels are all within that distance of 255.
+def _remove_white_background_floodfill(surface, tolerance=0):
     surface = surface.convert_alpha()
+    if np is None: return _remove_white_background_bfs(surface, tolerance)
+    rgb = pygame.surfarray.pixels3d(surface)
+    alpha = pygame.surfarray.pixels_alpha(surface)
+    white = (rgb >= 255 - tolerance).all(axis=2) & (alpha == 255)
+    reached = np.zeros_like(white)
+    for x, y in ((0, 0), (-1, 0), (0, -1), (-1, -1)):
+        reached[x, y] = white[x, y]
+    # Spread along rows and columns in turn: every white run touching a reached pixel is
+    # reached. Converges in a few passes (one per turn of the background's shape).
+    axis, stable = 0, 0
+    while stable < 2:
+        grown = _fill_runs(white, reached, axis)
+        stable = stable + 1 if np.array_equal(grown, reached) else 0
+        reached = grown
+        axis = 1 - axis
+    rgb[reached] = 0
+    alpha[reached] = 0
+    del rgb, alpha # Unlocks the surface
+    return surface
+
+def _fill_runs(white, reached, axis):
+    """reached, grown to every white run along axis that contains a reached pixel."""
+    if axis: white, reached = white.T, reached.T
+    starts = white.copy()
+    starts[:, 1:] &= ~white[:, :-1]
+    runs = np.cumsum(starts, axis=None).reshape(white.shape) * white # Run id per white pixel, 0 elsewhere
+    hit = np.zeros(runs.max() + 1, dtype=bool)
+    hit[runs[reached]] = True
+    hit[0] = False
+    grown = hit[runs]
+    return grown.T if axis else grown
+
+def _remove_white_background_bfs(surface, tolerance=0):
     width, height = surface.get_size()
     pixels = pygame.PixelArray(surface)
-    target_color = surface.map_rgb((255, 255, 255))
+    target_color = surface.map_rgb((255, 255, 255)) & 0xFFFFFFFF # map_rgb is signed, PixelArray values are not
+    if tolerance:
+        def is_background(pixel):
+            r, g, b, a = surface.unmap_rgb(pixel)
+            return a == 255 and min(r, g, b) >= 255 - tolerance
+    else:
+        def is_background(pixel):
+            return pixel == target_color
     queue = deque()
     corners = [(0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1)]
     for x, y in corners:
-        if pixels[x, y] == target_color:
+        if is_background(pixels[x, y]):
             queue.append((x, y))
     visited = set(queue)
     while queue:
@@ -153,12 +225,18 @@ def _remove_white_background_floodfill(surface):
             nx, ny = x + dx, y + dy
             if 0 <= nx < width and 0 <= ny < height:
                 if (nx, ny) not in visited:
-                    if pixels[nx, ny] == target_color:
+                    if is_background(pixels[nx, ny]):
                         visited.add((nx, ny))
                         queue.append((nx, ny))
     pixels.close() 
     return surface
 
+def _preprocess_frame(frame, config):
+    """Per-frame preprocessing passes a sheet's config entry asks for."""
+    if config.get("remove_white_bg"):
+        frame = _remove_white_background_floodfill(frame, config.get("white_tolerance", 0))
+    return frame
+
 # --- Helper: Get Common Bounding Box ---
 def _get_common_bounding_rect(frames):
     """Calculates the smallest rectangle that contains non-transparent pixels across ALL frames."""
@@ -221,6 +299,59 @@ def _find_image_file(name_with_extension, search_folders, subfolder_path=""):
     raise FileNotFoundError(f"Could not find '{name_with_extension}' in {search_folders} (or subfolder '{subfolder_path}')")
 
 
+# --- Lazy Frame Tables ---
+class LazyFrames(dict):
+    """{state: frames} whose states load on first access. pending maps each state that is
+    not loaded yet to a function returning its frames; d[state], d.get(state) and
+    `state in d` see pending states too (and the first two load them)."""
+    def __init__(self, pending):
+        super().__init__()
+        self.pending = dict(pending)
+
+    def __missing__(self, key):
+        frames = self[key] = self.pending.pop(key)() # KeyError if the state does not exist
+        return frames
+
+    def get(self, key, default=None):
+        if key in self.pending: return self[key]
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.pending
+
+    def load_pending(self):
+        for key in list(self.pending): self[key]
+
+_prefetch_queue = deque() # Functions that each load one deferred sheet or frame (see prefetch_step)
+_deferred = {} # Table name -> function that finishes loading it at once (see require)
+
+def prefetch_step(budget=0.0):
+    """Runs queued loads until budget seconds have passed (at least one load). Returns True
+    while more are queued; the step that empties the queue packs the new frames (pack_new_frames)."""
+    deadline = time.perf_counter() + budget
+    while _prefetch_queue:
+        _prefetch_queue.popleft()()
+        if time.perf_counter() >= deadline: break
+    if _prefetch_queue: return True
+    pack_new_frames()
+    _frame_cache.flush()
+    return False
+
+def require(name):
+    """Finishes loading a deferred table (e.g. "windmill") now, for code that needs all of it."""
+    finish = _deferred.pop(name, None)
+    if finish: finish()
+
+def load_pending():
+    """Loads everything still deferred or pending (before build_atlas() for a bundle)."""
+    for name in list(_deferred): require(name)
+    for table in (_loaded_hamsters, _flipped_hamsters):
+        for states in table.values():
+            if isinstance(states, LazyFrames): states.load_pending()
+    _prefetch_queue.clear()
+    _frame_cache.flush()
+
+
 # --- Load non-pathway assets ---
 def load_game_assets(tile_size, screen_width, screen_height, search_folders):
     global _loaded_assets
@@ -306,45 +437,66 @@ def load_llama_assets(tile_size, search_folders):
 
 # --- Load Windmill-specific assets ---
 def load_windmill_assets(tile_size, search_folders):
+    """Loads frame 0 (build menu icon, placement ghost) and queues the other frames for
+    prefetch_step(); require("windmill") loads whatever is left at once."""
     global _loaded_assets
-    _loaded_assets["windmill"] = [] 
+    _structure_masks.pop("windmill", None)
+    frames = _loaded_assets["windmill"] = [] 
     windmill_sprite_size = int(tile_size * WINDMILL_SCALE_FACTOR)
 
-    for i in range(WINDMILL_ANIMATION_FRAMES):
+    def load_next():
+        i = len(frames)
+        if i >= WINDMILL_ANIMATION_FRAMES: return
         filename = f"Windmill__{i:02d}.png"
         try:
             path = _find_image_file(filename, search_folders, WINDMILL_BASE_FOLDER)
-            img = pygame.image.load(path).convert_alpha()
-            _loaded_assets["windmill"].append(pygame.transform.scale(img, (windmill_sprite_size, windmill_sprite_size)))
+            def build():
+                img = pygame.image.load(path).convert_alpha()
+                return [pygame.transform.scale(img, (windmill_sprite_size, windmill_sprite_size))]
+            key = _frame_cache.key(path, "scale", windmill_sprite_size)
+            frames.append(_frame_cache.cached(key, build)[0])
         except FileNotFoundError as e:
             print(f"CRITICAL ERROR in Assets.py: {e}")
             raise 
         except Exception as e:
             print(f"An unexpected error occurred loading Windmill asset '{filename}': {e}")
             raise 
-    print(f"DEBUG: Loaded {len(_loaded_assets['windmill'])} windmill animation frames.")
+        if len(frames) == WINDMILL_ANIMATION_FRAMES: _deferred.pop("windmill", None)
+
+    def finish():
+        while len(frames) < WINDMILL_ANIMATION_FRAMES: load_next()
+
+    load_next()
+    _deferred["windmill"] = finish
+    _prefetch_queue.extend([load_next] * (WINDMILL_ANIMATION_FRAMES - 1))
+    print(f"DEBUG: Loaded 1 of {WINDMILL_ANIMATION_FRAMES} windmill animation frames, the rest are queued.")
 
 # --- Load Castle Assets ---
 def load_castle_assets(tile_size, search_folders):
-    global _loaded_assets
-    _loaded_assets["castle"] = []
+    global _loaded_assets, _castle_source_key
+    _castle_sprites.clear()
     castle_final_size = int(tile_size * CASTLE_SCALE_FACTOR)
     
     try:
         path = _find_image_file(CASTLE_FILENAME, search_folders, CASTLE_FOLDER)
-        sheet = pygame.image.load(path).convert_alpha()
         
-        frame_w = CASTLE_ORIGINAL_SIZE
-        frame_h = CASTLE_ORIGINAL_SIZE
-        
-        for i in range(CASTLE_FRAMES):
-            rect = pygame.Rect(i * frame_w, 0, frame_w, frame_h)
-            if rect.x + rect.w > sheet.get_width():
-                print(f"WARNING: Castle frame {i} exceeds sprite sheet width.")
-                break
-                
-            frame_surf = sheet.subsurface(rect)
-            _loaded_assets["castle"].append(pygame.transform.scale(frame_surf, (castle_final_size, castle_final_size)))
+        def build():
+            sheet = pygame.image.load(path).convert_alpha()
+            frame_w = CASTLE_ORIGINAL_SIZE
+            frame_h = CASTLE_ORIGINAL_SIZE
+            frames = []
+            for i in range(CASTLE_FRAMES):
+                rect = pygame.Rect(i * frame_w, 0, frame_w, frame_h)
+                if rect.x + rect.w > sheet.get_width():
+                    print(f"WARNING: Castle frame {i} exceeds sprite sheet width.")
+                    break
+                    
+                frame_surf = sheet.subsurface(rect)
+                frames.append(pygame.transform.scale(frame_surf, (castle_final_size, castle_final_size)))
+            return frames
+
+        _castle_source_key = _frame_cache.key(path, "frames", CASTLE_ORIGINAL_SIZE, CASTLE_FRAMES, "scale", castle_final_size)
+        _loaded_assets["castle"] = _frame_cache.cached(_castle_source_key, build)
             
     except FileNotFoundError as e:
         print(f"CRITICAL ERROR in Assets.py: {e}")
@@ -354,10 +506,46 @@ def load_castle_assets(tile_size, search_folders):
         raise 
     print(f"DEBUG: Loaded {len(_loaded_assets['castle'])} castle animation frames.")
 
+def castle_sprites(width, height):
+    """Castle frames scaled to width x height, their masks and the union of those, made
+    once per size and shared by every Castle (a new game reuses them)."""
+    found = _castle_sprites.get((width, height))
+    if found is None:
+        raw_sprites = _loaded_assets.get("castle", [])
+        def build():
+            return [pygame.transform.scale(s, (width, height)) for s in raw_sprites]
+        if _castle_source_key:
+            sprites = _frame_cache.cached(_frame_cache.derive(_castle_source_key, "scale", width, height), build)
+        else: # Stand-ins or bundle frames: no source file to key on
+            sprites = build()
+        masks = [pygame.mask.from_surface(s) for s in sprites]
+        found = _castle_sprites[(width, height)] = (sprites, masks, _union_mask(masks))
+    return found
+
+
+# --- Structure Masks ---
+def _union_mask(masks):
+    """One mask of the pixels set in any of masks (None if there are none)."""
+    if not masks: return None
+    union = masks[0].copy()
+    for mask in masks[1:]:
+        union.draw(mask, (0, 0))
+    return union
+
+def structure_masks(name):
+    """Per-frame masks of the _loaded_assets[name] animation (for clicks) and their union
+    (the frame-invariant collision footprint), built on first use and then shared."""
+    found = _structure_masks.get(name)
+    if found is None:
+        require(name)
+        masks = [pygame.mask.from_surface(frame) for frame in _loaded_assets.get(name, [])]
+        found = _structure_masks[name] = (masks, _union_mask(masks))
+    return found
+
 
 # --- Load McUncle assets (UPDATED) ---
 def load_mcuncle_assets(tile_size, search_folders):
-    global _loaded_mcuncle_sprites
+    global _loaded_mcuncle_sprites, _flipped_mcuncle_sprites
     _loaded_mcuncle_sprites = {} 
     
     # 1. Determine Global Scale based on Idle to ensure uniform visual size
@@ -379,7 +567,7 @@ def load_mcuncle_assets(tile_size, search_folders):
             for i in range(count):
                 rect = pygame.Rect(i * frame_w, 0, frame_w, frame_h)
                 if rect.x + rect.w > sheet.get_width(): break
-                raw_frames.append(sheet.subsurface(rect))
+                raw_frames.append(_preprocess_frame(sheet.subsurface(rect), config))
             
             # Crop to content
             common_rect = _get_common_bounding_rect(raw_frames)
@@ -413,76 +601,98 @@ def load_mcuncle_assets(tile_size, search_folders):
             print(f"CRITICAL ERROR in Assets.py: Could not find McUncle sheet '{filename}': {e}")
             raise
 
+    _flipped_mcuncle_sprites = {state: _mirror_frames(frames) for state, frames in _loaded_mcuncle_sprites.items()}
     print(f"DEBUG: Loaded McUncle states: {list(_loaded_mcuncle_sprites.keys())}")
 
 
 # --- Load Hamster Assets ---
+HAMSTER_STARTUP_STATES = ("idle",) # Loaded before the first frame (menu icons, freshly trained units)
+HAMSTER_PREFETCH_STATES = ("walk",) # Queued for prefetch_step(); other states (win, sleep) only load if used
+
+def _load_hamster_state(name, state, sprite_size, search_folders):
+    config = HAMSTER_CONFIG[name]
+    base_subfolder = os.path.join(HAMSTER_ROOT_FOLDER, config['subfolder'])
+    
+    if config["type"] == "static":
+        filename = config['files'][state]
+        try:
+            path = _find_image_file(filename, search_folders, base_subfolder)
+            img = pygame.image.load(path).convert_alpha()
+            return [pygame.transform.scale(img, (sprite_size, sprite_size))]
+        except FileNotFoundError as e:
+            print(f"CRITICAL ERROR: Could not find {name} asset '{filename}' in '{base_subfolder}': {e}")
+            raise
+
+    elif config["type"] == "animated":
+        anim_info = config['actions'][state]
+        folder_name = anim_info["folder"]
+        prefix = anim_info["prefix"]
+        count = anim_info["count"]
+        
+        full_anim_folder = os.path.join(base_subfolder, folder_name)
+        frames = []
+        
+        for i in range(count):
+            filename = f"{prefix}{i:02d}.png" 
+            try:
+                path = _find_image_file(filename, search_folders, full_anim_folder)
+                img = pygame.image.load(path).convert_alpha()
+                frames.append(pygame.transform.scale(img, (sprite_size, sprite_size)))
+            except FileNotFoundError as e:
+                print(f"CRITICAL ERROR: Could not find frame '{filename}' for {name}: {e}")
+                raise
+        return frames
+
+    elif config["type"] == "animated_spritesheets":
+        info = config['actions'][state]
+        filename = info["file"]
+        frame_w = info["w"]
+        frame_h = info["h"]
+        count = info["count"]
+        
+        try:
+            path = _find_image_file(filename, search_folders, base_subfolder)
+            sheet = pygame.image.load(path).convert_alpha()
+            
+            frames = []
+            for i in range(count):
+                rect = pygame.Rect(i * frame_w, 0, frame_w, frame_h)
+                if rect.x + rect.w > sheet.get_width():
+                    print(f"WARNING: Frame {i} exceeds sprite sheet width for {name} ({state})")
+                    break
+                
+                frame_surf = _preprocess_frame(sheet.subsurface(rect), info)
+                # This line ensures standard scaling (Direct Stretch) is applied
+                frames.append(pygame.transform.scale(frame_surf, (sprite_size, sprite_size)))
+            return frames
+            
+        except FileNotFoundError as e:
+            print(f"CRITICAL ERROR: Could not find sprite sheet '{filename}' for {name}: {e}")
+            raise
+
 def load_hamster_assets(tile_size, search_folders):
-    global _loaded_hamsters
+    """Loads HAMSTER_STARTUP_STATES now and queues HAMSTER_PREFETCH_STATES; every other
+    state stays pending until first used (see LazyFrames)."""
+    global _loaded_hamsters, _flipped_hamsters
     _loaded_hamsters = {}
+    _flipped_hamsters = {}
     
     sprite_size = int(tile_size * HAMSTER_SCALE_FACTOR)
     
+    def loader(name, state):
+        return lambda: _load_hamster_state(name, state, sprite_size, search_folders)
+    def mirrored(name, state):
+        return lambda: _mirror_frames(_loaded_hamsters[name][state])
+
     for name, config in HAMSTER_CONFIG.items():
-        _loaded_hamsters[name] = {}
-        base_subfolder = os.path.join(HAMSTER_ROOT_FOLDER, config['subfolder'])
-        
-        if config["type"] == "static":
-            for state, filename in config['files'].items():
-                try:
-                    path = _find_image_file(filename, search_folders, base_subfolder)
-                    img = pygame.image.load(path).convert_alpha()
-                    _loaded_hamsters[name][state] = [pygame.transform.scale(img, (sprite_size, sprite_size))]
-                except FileNotFoundError as e:
-                    print(f"CRITICAL ERROR: Could not find {name} asset '{filename}' in '{base_subfolder}': {e}")
-                    raise
-
-        elif config["type"] == "animated":
-            for state, anim_info in config['actions'].items():
-                folder_name = anim_info["folder"]
-                prefix = anim_info["prefix"]
-                count = anim_info["count"]
-                
-                full_anim_folder = os.path.join(base_subfolder, folder_name)
-                _loaded_hamsters[name][state] = []
-                
-                for i in range(count):
-                    filename = f"{prefix}{i:02d}.png" 
-                    try:
-                        path = _find_image_file(filename, search_folders, full_anim_folder)
-                        img = pygame.image.load(path).convert_alpha()
-                        _loaded_hamsters[name][state].append(pygame.transform.scale(img, (sprite_size, sprite_size)))
-                    except FileNotFoundError as e:
-                        print(f"CRITICAL ERROR: Could not find frame '{filename}' for {name}: {e}")
-                        raise
-
-        elif config["type"] == "animated_spritesheets":
-            for state, info in config['actions'].items():
-                filename = info["file"]
-                frame_w = info["w"]
-                frame_h = info["h"]
-                count = info["count"]
-                
-                try:
-                    path = _find_image_file(filename, search_folders, base_subfolder)
-                    sheet = pygame.image.load(path).convert_alpha()
-                    
-                    frames = []
-                    for i in range(count):
-                        rect = pygame.Rect(i * frame_w, 0, frame_w, frame_h)
-                        if rect.x + rect.w > sheet.get_width():
-                            print(f"WARNING: Frame {i} exceeds sprite sheet width for {name} ({state})")
-                            break
-                        
-                        frame_surf = sheet.subsurface(rect)
-                        # This line ensures standard scaling (Direct Stretch) is applied
-                        frames.append(pygame.transform.scale(frame_surf, (sprite_size, sprite_size)))
-                    
-                    _loaded_hamsters[name][state] = frames
-                    
-                except FileNotFoundError as e:
-                    print(f"CRITICAL ERROR: Could not find sprite sheet '{filename}' for {name}: {e}")
-                    raise
+        states = config['files'] if config["type"] == "static" else config['actions']
+        _loaded_hamsters[name] = LazyFrames({state: loader(name, state) for state in states})
+        _flipped_hamsters[name] = LazyFrames({state: mirrored(name, state) for state in states})
+        for state in states:
+            if state in HAMSTER_STARTUP_STATES:
+                _flipped_hamsters[name][state]
+            elif state in HAMSTER_PREFETCH_STATES:
+                _prefetch_queue.append(lambda table=_flipped_hamsters[name], state=state: table.get(state))
 
     print(f"DEBUG: Loaded Hamsters: {list(_loaded_hamsters.keys())}")
 
@@ -506,7 +716,7 @@ def load_projectile_assets(tile_size, search_folders):
 
 # --- Load Enemy Assets ---
 def load_enemy_assets(tile_size, search_folders):
-    global _loaded_enemies
+    global _loaded_enemies, _flipped_enemies
     _loaded_enemies = {}
     sprite_size = int(tile_size * ENEMY_SCALE_FACTOR)
     
@@ -527,8 +737,7 @@ def load_enemy_assets(tile_size, search_folders):
                     print(f"WARNING: Enemy frame {i} exceeds width for {name}")
                     break
                 
-                frame_surf = sheet.subsurface(rect)
-                frame_surf = _remove_white_background_floodfill(frame_surf)
+                frame_surf = _preprocess_frame(sheet.subsurface(rect), config)
                 frames.append(pygame.transform.scale(frame_surf, (sprite_size, sprite_size)))
             
             _loaded_enemies[name] = frames
@@ -537,4 +746,179 @@ def load_enemy_assets(tile_size, search_folders):
              print(f"CRITICAL ERROR in Assets.py: Could not find Enemy sheet '{filename}': {e}")
              raise
 
-    print(f"DEBUG: Loaded Enemies: {list(_loaded_enemies.keys())}")
\ No newline at end of file
+    _flipped_enemies = {name: _mirror_frames(frames) for name, frames in _loaded_enemies.items()}
+    print(f"DEBUG: Loaded Enemies: {list(_loaded_enemies.keys())}")
+
+# --- Texture Atlas ---
+ATLAS_SKIP = ("grass", "castle") # Screen-sized grass goes into the static layer; Castle rescales its frames itself
+
+def _surface_slots(node, slots, skip=()):
+    """(container, key) of every Surface in nested dicts/lists."""
+    for key, value in (node.items() if isinstance(node, dict) else enumerate(node)):
+        if key in skip: continue
+        if isinstance(value, pygame.Surface): slots.append((node, key))
+        elif isinstance(value, (dict, list)): _surface_slots(value, slots)
+
+def _frame_slots():
+    slots = []
+    _surface_slots(_loaded_assets, slots, skip=ATLAS_SKIP)
+    for table in (_loaded_llama_sprites, _loaded_mcuncle_sprites, _loaded_hamsters, _loaded_projectiles, _loaded_enemies,
+                  _flipped_mcuncle_sprites, _flipped_hamsters, _flipped_enemies):
+        _surface_slots(table, slots)
+    return slots
+
+def _pack_slots(slots):
+    """Packs the frames in slots into new pages of _atlas and puts the packed ones back."""
+    unique = {}
+    for node, key in slots:
+        unique.setdefault(id(node[key]), node[key])
+    packed = dict(zip(unique, _atlas.pack(list(unique.values()))))
+    for node, key in slots:
+        node[key] = packed[id(node[key])]
+    return len(unique)
+
+def build_atlas():
+    """Moves every loaded sprite frame into a few atlas pages, in place: the tables keep
+    their layout, each frame becoming a subsurface (area) of its page."""
+    global _atlas
+    _atlas = TextureAtlas()
+    count = _pack_slots(_frame_slots())
+    print(f"DEBUG: Packed {count} sprite frames into {len(_atlas.pages)} atlas pages.")
+
+def pack_new_frames():
+    """Packs frames loaded since build_atlas() (prefetched, required or lazily loaded
+    states) into additional pages of the same atlas. Does nothing without an atlas."""
+    if _atlas is None: return
+    slots = [(node, key) for node, key in _frame_slots() if node[key] not in _atlas.rects]
+    if slots:
+        count = _pack_slots(slots)
+        print(f"DEBUG: Packed {count} late-loaded sprite frames, {len(_atlas.pages)} atlas pages in total.")
+
+# --- Preprocessed Bundle ---
+BUNDLE_TABLES = ("_loaded_assets", "_loaded_llama_sprites", "_loaded_mcuncle_sprites", "_loaded_hamsters", "_loaded_projectiles",
+                 "_loaded_enemies", "_flipped_mcuncle_sprites", "_flipped_hamsters", "_flipped_enemies")
+
+def source_signature(search_folders):
+    """Hash over the path, size and mtime of every source PNG; a bundle built from other files is stale."""
+    seen, entries = set(), []
+    for folder in search_folders:
+        root = os.path.realpath(folder or ".")
+        if root in seen or not os.path.isdir(root): continue
+        seen.add(root)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "__pycache__"]
+            for name in filenames:
+                if name.lower().endswith(".png"):
+                    stat = os.stat(os.path.join(dirpath, name))
+                    entries.append(f"{os.path.relpath(os.path.join(dirpath, name), root)}:{stat.st_size}:{stat.st_mtime_ns}")
+    entries.sort()
+    return hashlib.sha1("\n".join(entries).encode()).hexdigest()
+
+def _bundle_key(tile_size, screen_width, screen_height, search_folders):
+    return {"tile_size": tile_size, "screen": [screen_width, screen_height], "source": source_signature(search_folders)}
+
+def save_bundle(path, tile_size, screen_width, screen_height, search_folders, compress=False):
+    """Writes the loaded tables to a bundle that load_bundle() can restore. Pending states
+    are loaded and packed first, so the bundle holds everything."""
+    if _deferred or any(states.pending for table in (_loaded_hamsters, _flipped_hamsters) for states in table.values()
+                        if isinstance(states, LazyFrames)):
+        load_pending()
+    if _atlas is None: build_atlas()
+    else: pack_new_frames() # Onto the atlas built at load time, not a second full pack
+    pages = list(_atlas.pages) if _atlas else []
+    page_of = {id(page): i for i, page in enumerate(pages)}
+
+    def encode(node):
+        if isinstance(node, pygame.Surface):
+            if _atlas and node in _atlas.rects:
+                page, rect = _atlas.rects[node]
+                return {"surface": [page, rect.x, rect.y, rect.w, rect.h]}
+            if id(node) not in page_of: # Not in the atlas (grass, castle): a page of its own
+                page_of[id(node)] = len(pages)
+                pages.append(node)
+            return {"surface": [page_of[id(node)], 0, 0] + list(node.get_size())}
+        if isinstance(node, dict): return {"dict": {key: encode(value) for key, value in node.items()}}
+        return {"list": [encode(value) for value in node]}
+
+    tables = {name: encode(globals()[name]) for name in BUNDLE_TABLES}
+    index = dict(_bundle_key(tile_size, screen_width, screen_height, search_folders), atlas_pages=len(_atlas.pages) if _atlas else 0, tables=tables)
+    AssetBundle.write(path, pages, index, compress)
+
+def load_bundle(path, tile_size, screen_width, screen_height, search_folders):
+    """Fills every table from a bundle written by save_bundle(). Returns False (and loads
+    nothing) if there is no bundle or it was built for another tile size or other files."""
+    global _atlas, _castle_source_key
+    bundle = AssetBundle.read(path)
+    if bundle is None: return False
+    index, pages = bundle
+    key = _bundle_key(tile_size, screen_width, screen_height, search_folders)
+    if any(index.get(k) != v for k, v in key.items()):
+        print(f"DEBUG: Asset bundle '{path}' is stale, loading from source images.")
+        return False
+
+    _atlas = TextureAtlas()
+    _atlas.pages = pages[:index["atlas_pages"]]
+    frames = {}
+    def decode(node):
+        if "surface" in node:
+            page, x, y, w, h = node["surface"]
+            if (x, y, w, h) == (0, 0) + pages[page].get_size(): return pages[page]
+            frame = frames.get((page, x, y))
+            if frame is None:
+                rect = pygame.Rect(x, y, w, h)
+                frame = frames[(page, x, y)] = pages[page].subsurface(rect)
+                _atlas.rects[frame] = (page, rect)
+            return frame
+        if "dict" in node: return {key: decode(value) for key, value in node["dict"].items()}
+        return [decode(value) for value in node["list"]]
+
+    for name, table in index["tables"].items():
+        globals()[name] = decode(table)
+    _prefetch_queue.clear() # Everything is loaded
+    _deferred.clear()
+    _castle_sprites.clear()
+    _structure_masks.clear()
+    _castle_source_key = None
+    print(f"DEBUG: Loaded {len(frames)} sprite frames from bundle '{path}'.")
+    return True
+
+# --- Headless Stand-ins ---
+def load_hitbox_stand_ins(tile_size):
+    """Fills every asset table with blank surfaces of the real sprite sizes and frame counts,
+    without a display or any image files (see Headless.py). The surfaces have no alpha, so
+    masks built from them are solid: per-pixel collision becomes bounding-box collision."""
+    global _loaded_assets, _loaded_llama_sprites, _loaded_mcuncle_sprites, _loaded_hamsters, _loaded_projectiles, _loaded_enemies
+    global _flipped_mcuncle_sprites, _flipped_hamsters, _flipped_enemies, _castle_source_key
+
+    def solid(size):
+        return pygame.Surface((size, size))
+
+    tile = solid(tile_size)
+    _loaded_assets = {name: tile for name in ASSET_FILES}
+    _loaded_assets["windmill"] = [solid(int(tile_size * WINDMILL_SCALE_FACTOR))] * WINDMILL_ANIMATION_FRAMES
+    _loaded_assets["castle"] = [solid(int(tile_size * CASTLE_SCALE_FACTOR))] * CASTLE_FRAMES
+
+    llama = solid(int(tile_size * LLAMA_SCALE_FACTOR))
+    _loaded_llama_sprites = {
+        action: {direction: [llama] * len(filenames) for direction, filenames in directions.items()}
+        for action, directions in LLAMA_ANIMATION_INFO.items()
+    }
+    _loaded_mcuncle_sprites = {state: [tile] * config["count"] for state, config in MCUNCLE_CONFIG.items()}
+    hamster = solid(int(tile_size * HAMSTER_SCALE_FACTOR))
+    _loaded_hamsters = {
+        name: {state: [hamster] * info["count"] for state, info in config["actions"].items()}
+        for name, config in HAMSTER_CONFIG.items()
+    }
+    projectile = solid(int(tile_size * PROJECTILE_SCALE_FACTOR))
+    _loaded_projectiles = {key: projectile for key in PROJECTILE_FILES}
+    enemy = solid(int(tile_size * ENEMY_SCALE_FACTOR))
+    _loaded_enemies = {name: [enemy] * config["count"] for name, config in ENEMY_CONFIG.items()}
+    _prefetch_queue.clear()
+    _deferred.clear()
+    _castle_sprites.clear()
+    _structure_masks.clear()
+    _castle_source_key = None
+    # Blank rectangles look the same mirrored
+    _flipped_mcuncle_sprites = _loaded_mcuncle_sprites
+    _flipped_hamsters = _loaded_hamsters
+    _flipped_enemies = _loaded_enemies
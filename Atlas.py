@@ -0,0 +1,73 @@
+import pygame
+
+# ---------------- CONFIG ----------------
+PAGE_SIZE = 2048 # Atlas page width/height; a frame larger than this gets a page of its own
+PADDING = 1 # Transparent pixels between frames, so scaled blits never pick up a neighbour
+
+
+# --- Texture Atlas ---
+class TextureAtlas:
+    """Packs many small surfaces into a few large pages (shelf packing, tallest first).
+    pack() returns each frame as a subsurface of its page: a subsurface is an area
+    view that shares the page's pixels, so blitting it is an area blit of the page and
+    all existing draw code keeps working. rects maps every packed frame to
+    (page index, Rect) for code that wants to blit the page directly."""
+    def __init__(self, page_size=PAGE_SIZE, padding=PADDING):
+        self.page_size = page_size
+        self.padding = padding
+        self.pages = []
+        self.rects = {} # packed subsurface -> (page index, Rect)
+
+    def pack(self, surfaces):
+        """surfaces: list of Surfaces. Returns their packed copies in the same order."""
+        placements = self._place([s.get_size() for s in surfaces])
+        sizes = {}
+        for page, rect in placements:
+            w, h = sizes.get(page, (0, 0))
+            sizes[page] = (max(w, rect.right), max(h, rect.bottom))
+        first = len(self.pages)
+        for page in range(len(sizes)):
+            surface = pygame.Surface(sizes[page], pygame.SRCALPHA)
+            surface.fill((0, 0, 0, 0))
+            self.pages.append(surface)
+
+        packed = []
+        for surface, (page, rect) in zip(surfaces, placements):
+            # RGBA_MAX onto a cleared page copies the pixels as they are (a normal blit would blend)
+            self.pages[first + page].blit(surface, rect.topleft, special_flags=pygame.BLEND_RGBA_MAX)
+            sub = self.pages[first + page].subsurface(rect)
+            self.rects[sub] = (first + page, rect)
+            packed.append(sub)
+        return packed
+
+    def _place(self, sizes):
+        """(page, Rect) for every size; pages are numbered from 0 for this call."""
+        pad = self.padding
+        limit = self.page_size
+        placements = [None] * len(sizes)
+        page, x, y, shelf_h = 0, 0, 0, 0
+        used = False
+        for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0])):
+            w, h = sizes[i]
+            if w > limit or h > limit: # Oversized: its own page, after the packed ones
+                placements[i] = (None, pygame.Rect(0, 0, w, h))
+                continue
+            if x + w > limit: # Next shelf
+                x, y, shelf_h = 0, y + shelf_h + pad, 0
+            if y + h > limit: # Next page
+                page, x, y, shelf_h = page + 1, 0, 0, 0
+            placements[i] = (page, pygame.Rect(x, y, w, h))
+            used = True
+            x += w + pad
+            shelf_h = max(shelf_h, h)
+        next_page = page + 1 if used else 0
+        for i, (p, rect) in enumerate(placements):
+            if p is None:
+                placements[i] = (next_page, rect)
+                next_page += 1
+        return placements
+
+    def region(self, surface):
+        """(page Surface, Rect) of a packed frame, for an area blit: screen.blit(page, pos, rect)."""
+        page, rect = self.rects[surface]
+        return self.pages[page], rect
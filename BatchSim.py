@@ -0,0 +1,100 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1") # One banner per worker is noise
+import argparse
+import json
+import multiprocessing
+import statistics
+import time
+import Headless
+
+# --- Batch Campaign Simulator ---
+# Plays many headless campaigns across a process pool, one seed per campaign,
+# and aggregates survival rates, castle health and cheese income per stage.
+def _play(job):
+    return Headless.run_campaign(**job)
+
+def run_batch(campaigns, processes=None, base_seed=0, **campaign_kwargs):
+    """Runs campaigns with seeds base_seed .. base_seed+campaigns-1 and returns their
+    results in seed order. campaign_kwargs go to Headless.run_campaign."""
+    jobs = [dict(campaign_kwargs, seed=base_seed + i) for i in range(campaigns)]
+    processes = processes or os.cpu_count() or 1
+    if processes <= 1 or campaigns <= 1:
+        return [_play(job) for job in jobs]
+    chunksize = max(1, campaigns // (processes * 4))
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_play, jobs, chunksize=chunksize)
+
+def _stage_order(key):
+    # Campaign stages (ints) first, then survival waves "S1", "S2", ...
+    return (0, key) if isinstance(key, int) else (1, int(key[1:]))
+
+def summarize(results):
+    """Per-stage aggregate: how many campaigns reached and cleared it, castle health
+    at its end (mean / worst) and cheese produced during it."""
+    per_stage = {}
+    for result in results:
+        for entry in result["stages"]:
+            per_stage.setdefault(entry["stage"], []).append(entry)
+
+    stages = []
+    for key in sorted(per_stage, key=_stage_order):
+        entries = per_stage[key]
+        cleared = [e for e in entries if e["castle_health"] > 0]
+        stages.append({
+            "stage": key,
+            "reached": len(entries),
+            "cleared": len(cleared),
+            "survival_rate": len(cleared) / len(results),
+            "castle_health_mean": statistics.fmean(e["castle_health"] for e in cleared) if cleared else 0.0,
+            "castle_health_min": min((e["castle_health"] for e in cleared), default=0),
+            "cheese_mean": statistics.fmean(e["cheese_earned"] for e in entries),
+        })
+
+    return {
+        "campaigns": len(results),
+        "victories": sum(1 for r in results if r["victory"]),
+        "victory_rate": sum(1 for r in results if r["victory"]) / len(results) if results else 0.0,
+        "mean_kills": statistics.fmean(r["enemies_killed"] for r in results) if results else 0.0,
+        "game_seconds": sum(r["game_seconds"] for r in results),
+        "stages": stages,
+    }
+
+def print_summary(summary, wall_seconds):
+    print(f"{summary['campaigns']} campaigns, {summary['victories']} victories "
+          f"({summary['victory_rate']:.1%}), {summary['mean_kills']:.1f} kills on average")
+    print(f"{summary['game_seconds'] / 3600:.1f}h of game time in {wall_seconds:.1f}s")
+    print(f"{'stage':>6} {'reached':>8} {'cleared':>8} {'survive':>8} {'castle avg':>11} {'castle min':>11} {'cheese':>7}")
+    for s in summary["stages"]:
+        print(f"{s['stage']!s:>6} {s['reached']:>8} {s['cleared']:>8} {s['survival_rate']:>8.1%} "
+              f"{s['castle_health_mean']:>11.0f} {s['castle_health_min']:>11} {s['cheese_mean']:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless campaigns in parallel and aggregate balance stats.")
+    parser.add_argument("--campaigns", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first campaign")
+    parser.add_argument("--army", type=Headless._parse_army, default=None, help='starting units, e.g. "McUncle=2,Dracula=3"')
+    parser.add_argument("--train", default=None, help="unit kept on infinite production")
+    parser.add_argument("--windmills", type=int, default=0, help="windmills to build whenever cheese allows")
+    parser.add_argument("--survival-waves", type=int, default=0, help="survival waves to play after a victory")
+    parser.add_argument("--hp-scale", type=float, default=1.0)
+    parser.add_argument("--count-scale", type=float, default=1.0)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--skip-waits", action="store_true")
+    parser.add_argument("--json", default=None, help="write the summary and every campaign result to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_batch(args.campaigns, args.processes, args.seed, army=args.army, train=args.train,
+                        windmills=args.windmills, survival_waves=args.survival_waves, skip_waits=args.skip_waits,
+                        stage_data=Headless.scale_stage_data(args.hp_scale, args.count_scale, args.time_scale))
+    summary = summarize(results)
+    print_summary(summary, time.perf_counter() - start)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # draw() benchmarks render into an offscreen window
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import sys
+import time
+import pygame
+import main
+import MenuUI
+import Headless
+from Entities import McUncle, Hamster, Windmill, Enemy, Projectile, ProjectilePool
+from Simulation import Simulation
+from Pathfinding import Pathfinder
+
+# ---------------- CONFIG ----------------
+BASELINE_FILE = "benchmark_baseline.json"
+REGRESSION_THRESHOLD = 1.25 # Flag paths that got this much slower per entity
+DEFAULT_REPEAT = 30
+DT = main.FIXED_DT
+FLOW_GRIDS = ((20, 11), (50, 50), (100, 100), (200, 200), (500, 500)) # columns x rows for --flow-repair
+FLOW_FENCES = 0.2 # Fraction of tiles fenced off in the flow-repair grids
+FLOW_EDITS = 10 # Fence placements/removals timed per grid
+
+# --- Scenario Fixtures ---
+# hamsters/mcuncles: defenders spread over the map; bobs: Bobs parked next to the windmills;
+# fences: fraction of free tiles covered with fences
+SCENARIOS = {
+    "skirmish":      {"hamsters": 100, "mcuncles": 50, "bobs": 0,  "enemies": 300,  "windmills": 2,  "fences": 0.0},
+    "bob_farm":      {"hamsters": 20,  "mcuncles": 0,  "bobs": 60, "enemies": 50,   "windmills": 12, "fences": 0.0},
+    "dense_fences":  {"hamsters": 80,  "mcuncles": 40, "bobs": 0,  "enemies": 200,  "windmills": 2,  "fences": 0.35},
+    "survival_wave": {"hamsters": 40,  "mcuncles": 20, "bobs": 0,  "enemies": 1000, "windmills": 0,  "fences": 0.0},
+}
+
+def build_scenario(spec, seed=1):
+    random.seed(seed)
+    sim = Simulation(main.ROWS, main.COLUMNS, main.TILE_SIZE, use_entity_store=main.USE_ENTITY_STORE,
+                     store_defenders=main.STORE_DEFENDERS, use_projectile_pool=main.USE_PROJECTILE_POOL,
+                     target_index_cell_size=main.TARGET_INDEX_CELL_SIZE, verbose=False)
+    T = sim.tile_size
+    for _ in range(spec["windmills"]):
+        spots = Headless._free_windmill_spots(sim)
+        if spots: sim.windmills.append(Windmill(random.choice(spots), T))
+
+    free = [(r, c) for r in range(sim.rows) for c in range(sim.columns)
+            if (r, c) not in sim.castle_occupied and sim.is_spot_free(r, c)]
+    for r, c in random.sample(free, int(len(free) * spec["fences"])):
+        sim.player_placed_objects.append(("fence", r, c))
+    sim.collision_map.mark_dirty() # Structures were added behind the Simulation's back
+    sim.pathfinder.mark_dirty()
+
+    def random_tile():
+        return (random.randint(0, sim.rows - 1), random.randint(0, sim.columns - 1))
+    for _ in range(spec["mcuncles"]):
+        sim.mcuncles.append(McUncle(random_tile(), T))
+    for _ in range(spec["hamsters"]):
+        sim.hamsters.append(Hamster(random.choice(["Dracula", "TheHamster", "Plague Doctor"]), random_tile(), T))
+    for i in range(spec["bobs"]):
+        w = sim.windmills[i % len(sim.windmills)]
+        sim.hamsters.append(Hamster("Bob", (w.grid_r + random.randint(-1, 2), w.grid_c + random.randint(-1, 2)), T))
+    for u in sim.mcuncles + sim.hamsters:
+        if random.random() < 0.5:
+            u.set_precise_target(random.uniform(0, main.world_width_pixels), random.uniform(0, main.world_height_pixels))
+
+    sim.spawn_enemy_wave(spec["enemies"])
+    for e in sim.enemies:
+        e.current_pixel_pos = pygame.Vector2(random.uniform(0, main.world_width_pixels * 0.6),
+                                             random.uniform(0, main.world_height_pixels - T))
+    sim.enemies_attacking = True
+    return sim
+
+def _obstacles(sim):
+    tiles = set((r, c) for _, r, c in sim.player_placed_objects)
+    sim.collision_map.sync([sim.castle] + sim.windmills)
+    return tiles, [sim.collision_map]
+
+def _restorer(objects, fields):
+    """Snapshots the given attributes now; the returned callable puts them back, so
+    every repeat of a bench that moves entities starts from the same state."""
+    def copy(value):
+        return pygame.Vector2(value) if isinstance(value, pygame.Vector2) else value
+    saved = [(obj, [(f, copy(getattr(obj, f))) for f in fields]) for obj in objects]
+    def restore():
+        for obj, values in saved:
+            for f, value in values: setattr(obj, f, copy(value))
+    return restore
+
+
+# --- Hot Paths ---
+# Each returns (callable timed once per repeat, entity count[, setup run untimed before each repeat]).
+# Setup work stays outside the callable.
+UNIT_STATE = ("current_pixel_pos", "target_pixel_pos", "is_moving", "state", "grid_r", "grid_c",
+              "facing_right", "animation_frame", "animation_timer", "flow")
+ENEMY_STATE = ("current_pixel_pos", "attack_timer", "facing_right", "animation_frame",
+               "animation_timer", "speed_multiplier")
+
+def bench_separation(sim):
+    units = sim.mcuncles + sim.hamsters
+    obstacles, pixel_obstacles = _obstacles(sim)
+    reset = _restorer(units, UNIT_STATE)
+    def run():
+        sim.friend_grid.rebuild(units)
+        for u in units:
+            u.update(DT, [], sim.projectiles, obstacles, pixel_obstacles, friends=units, spatial_hash=sim.friend_grid)
+    return run, len(units), reset
+
+def bench_targeting(sim):
+    units = sim.mcuncles + sim.hamsters
+    index = sim.enemy_index
+    def run():
+        index.rebuild(sim.enemies, centered=True)
+        for u in units:
+            pos = u.current_pixel_pos
+            index.nearest(pos.x + u.tile_size / 2, pos.y + u.tile_size / 2, u.attack_range)
+    return run, len(units)
+
+def bench_enemy_update(sim):
+    obstacles, _ = _obstacles(sim)
+    flow = sim.castle_flow()
+    reset = _restorer(sim.enemies, ENEMY_STATE)
+    health = sim.castle.health
+    def setup():
+        reset()
+        sim.castle.health = health
+    def run():
+        Enemy.update_all(sim.enemies, DT, obstacles, sim.castle, move_to_castle=True, store=sim.entity_store, flow=flow)
+    return run, len(sim.enemies), setup
+
+def bench_projectile_update(sim):
+    for e in sim.enemies: e.health = 10 ** 9 # Shots land without killing, so every repeat sees the same load
+    shooters = sim.mcuncles + sim.hamsters
+    count = len(shooters) * 2
+    def refill():
+        if isinstance(sim.projectiles, ProjectilePool): sim.projectiles.clear()
+        else: sim.projectiles = []
+        for i in range(count):
+            shooter = shooters[i % len(shooters)]
+            target = sim.enemies[i % len(sim.enemies)]
+            if isinstance(sim.projectiles, ProjectilePool): sim.projectiles.fire(shooter.current_pixel_pos, target, shooter.name)
+            else: sim.projectiles.append(Projectile(shooter.current_pixel_pos, target, shooter.name))
+    def run():
+        if isinstance(sim.projectiles, ProjectilePool):
+            sim.projectiles.update(DT)
+        else:
+            for proj in sim.projectiles: proj.update(DT)
+    return run, count, refill
+
+def bench_windmill_update(sim):
+    friends = sim.mcuncles + sim.hamsters
+    def run():
+        for w in sim.windmills: w.update(DT, hamsters=friends)
+    return run, len(sim.windmills)
+
+def bench_ysort(sim):
+    def run():
+        main.collect_renderables()
+    return run, len(main.collect_renderables())
+
+def bench_ui_draw(sim, panel):
+    def run():
+        panel.draw(main.screen, active_hamsters=sim.hamsters, active_mcuncles=sim.mcuncles, castle_needs_repair=True)
+    return run, len(sim.hamsters) + len(sim.mcuncles)
+
+def bench_draw(sim, panel):
+    def run():
+        main.draw(panel)
+    return run, len(main.collect_renderables())
+
+def bench_draw_zoomed(sim, panel):
+    # Max zoom on the middle of the map. Culling keeps the cost tied to the entities in view rather
+    # than the map size; the frame is still bound by filling the screen with scaled sprites and tiles
+    main.zoom_level = main.max_zoom
+    main.camera_x = main.world_width_pixels / 2 - main.WIDTH / (2 * main.zoom_level)
+    main.camera_y = main.world_height_pixels / 2 - main.HEIGHT / (2 * main.zoom_level)
+    main._clamp_camera()
+    def run():
+        main.draw(panel)
+    return run, len(main.collect_renderables(main._visible_world_rect()))
+
+PATHS = {
+    "separation": bench_separation,
+    "targeting": bench_targeting,
+    "enemy_update": bench_enemy_update,
+    "projectile_update": bench_projectile_update,
+    "windmill_update": bench_windmill_update,
+    "ysort": bench_ysort,
+    "ui_draw": bench_ui_draw,
+    "draw": bench_draw,
+    "draw_zoomed": bench_draw_zoomed,
+}
+NEEDS_PANEL = ("ui_draw", "draw", "draw_zoomed")
+
+
+def _time(run, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter_ns()
+        run()
+        samples.append(time.perf_counter_ns() - t0)
+    return statistics.median(samples)
+
+def run_benchmarks(scenarios=None, paths=None, repeat=DEFAULT_REPEAT, seed=1):
+    """Times every path in every scenario on a freshly built fixture.
+    Returns {"scenario/path": {"entities", "ns_per_frame", "ns_per_entity"}}."""
+    if main.screen is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.init_display()
+    panel = MenuUI.UIControlPanel(main.TILE_SIZE, main.WIDTH, main.HEIGHT, main.tiles)
+    results = {}
+    for scenario in scenarios or SCENARIOS:
+        for path in paths or PATHS:
+            sim = build_scenario(SCENARIOS[scenario], seed)
+            main.sim = sim
+            main.zoom_level = main.min_zoom
+            main._clamp_camera()
+            args = (sim, panel) if path in NEEDS_PANEL else (sim,)
+            bench = PATHS[path](*args)
+            run, entities = bench[0], bench[1]
+            setup = bench[2] if len(bench) > 2 else None
+            if not entities: continue
+            run() # Warm-up (caches, lazy views)
+            ns = _time(run, repeat, setup)
+            results[f"{scenario}/{path}"] = {"entities": entities, "ns_per_frame": ns, "ns_per_entity": ns / entities}
+    return results
+
+# --- Flow Field Repair ---
+def check_line_of_sight():
+    """A diagonal fence wall is sealed for the field (no corner cutting), so no tile
+    behind it may see the goal and walk straight through."""
+    size = 20
+    walls = {(r, r) for r in range(1, size)}
+    field = Pathfinder(size, size, lambda: walls).field_to(0, size - 1)
+    assert field.distance(4, 0) < float("inf"), "goal should be reachable around the wall"
+    leaks = [(r, c) for r in range(size) for c in range(r) if field.in_sight(r, c)]
+    assert not leaks, f"line of sight through a diagonal wall from {leaks}"
+
+def _same_costs(a, b):
+    """Flow field costs equal up to float noise; unreachable (inf) must match exactly."""
+    return all(x == y or abs(x - y) < 1e-6 for x, y in zip(a, b))
+
+def check_flow_repair(trials=100, edits=10, seed=1):
+    """Repairing a field after random fence edits gives the same costs as a fresh search,
+    for a single goal tile and for a blocked 2x2 goal (like the castle)."""
+    rng = random.Random(seed)
+    for _ in range(trials):
+        rows, columns = rng.randint(3, 20), rng.randint(3, 20)
+        blocked = {(rng.randrange(rows), rng.randrange(columns)) for _ in range(rows * columns // 4)}
+        if rng.random() < 0.5:
+            r, c = rng.randrange(rows - 1), rng.randrange(columns - 1)
+            goals = [(r, c), (r + 1, c), (r, c + 1), (r + 1, c + 1)]
+            blocked |= set(goals)
+        else:
+            goals = [(rng.randrange(rows), rng.randrange(columns))]
+        pathfinder = Pathfinder(rows, columns, lambda: blocked)
+        field = pathfinder.field_toward(goals)
+        for _ in range(edits):
+            changed = [(rng.randrange(rows), rng.randrange(columns)) for _ in range(rng.randint(1, 3))]
+            blocked ^= set(changed)
+            pathfinder.mark_dirty(changed)
+            field = pathfinder.field_toward(goals)
+            fresh = Pathfinder(rows, columns, lambda: blocked).field_toward(goals)
+            assert _same_costs(field.dist, fresh.dist), f"repaired field differs after editing {changed} ({rows}x{columns}, goals {goals})"
+
+def run_flow_repair_benchmarks(grids=FLOW_GRIDS, edits=FLOW_EDITS, seed=1):
+    """Times one fence placement or removal followed by a request for the castle flow
+    field, repaired in place versus searched again from scratch, on empty maps of the
+    given sizes with a 4x4 castle at the east edge. Returns {"CxR": {"full_ms", "repair_ms", ...}}: medians,
+    and with _max the slowest edit (a fence closing a gap can invalidate a wide area).
+    After every edit the repaired field must equal the recomputed one."""
+    results = {}
+    for columns, rows in grids:
+        random.seed(seed)
+        castle = {(rows // 2 + dr, columns - 5 + dc) for dr in range(4) for dc in range(4)}
+        free = [(r, c) for r in range(rows) for c in range(columns) if (r, c) not in castle]
+        blocked = castle | set(random.sample(free, int(len(free) * FLOW_FENCES)))
+        toggles = random.sample(free, edits)
+        pathfinders = {"full": Pathfinder(rows, columns, lambda: blocked, incremental=False),
+                       "repair": Pathfinder(rows, columns, lambda: blocked, incremental=True)}
+        for pathfinder in pathfinders.values(): pathfinder.field_toward(castle)
+        samples = {mode: [] for mode in pathfinders}
+        for tile in toggles:
+            blocked = blocked ^ {tile}
+            fields = {}
+            for mode, pathfinder in pathfinders.items():
+                t0 = time.perf_counter_ns()
+                pathfinder.mark_dirty([tile])
+                fields[mode] = pathfinder.field_toward(castle)
+                samples[mode].append(time.perf_counter_ns() - t0)
+            assert _same_costs(fields["repair"].dist, fields["full"].dist), f"{columns}x{rows}: repair differs after toggling {tile}"
+        timings = {}
+        for mode, times in samples.items():
+            timings[f"{mode}_ms"] = statistics.median(times) / 1e6
+            timings[f"{mode}_max_ms"] = max(times) / 1e6
+        results[f"{columns}x{rows}"] = timings
+    return results
+
+def print_flow_repair_report(results):
+    print(f"{'grid':<10} {'full ms':>10} {'repair ms':>10} {'worst ms':>10} {'speedup':>8}")
+    for grid, r in results.items():
+        print(f"{grid:<10} {r['full_ms']:>10.2f} {r['repair_ms']:>10.3f} {r['repair_max_ms']:>10.3f} {r['full_ms'] / max(r['repair_ms'], 1e-6):>7.0f}x")
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Names of benchmarks whose ns/entity grew past threshold times the baseline."""
+    return [key for key, r in results.items()
+            if key in baseline and r["ns_per_entity"] > baseline[key]["ns_per_entity"] * threshold]
+
+def print_report(results, baseline, regressions):
+    print(f"{'benchmark':<34} {'entities':>8} {'us/frame':>10} {'ns/entity':>10} {'baseline':>10} {'ratio':>6}")
+    for key, r in results.items():
+        base = baseline.get(key)
+        base_txt = f"{base['ns_per_entity']:>10.0f}" if base else f"{'-':>10}"
+        ratio_txt = f"{r['ns_per_entity'] / base['ns_per_entity']:>6.2f}" if base else f"{'-':>6}"
+        flag = "  REGRESSION" if key in regressions else ""
+        print(f"{key:<34} {r['entities']:>8} {r['ns_per_frame'] / 1000:>10.1f} {r['ns_per_entity']:>10.0f} {base_txt} {ratio_txt}{flag}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Time the per-frame hot paths on fixed scenarios.")
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=None)
+    parser.add_argument("--path", nargs="+", choices=list(PATHS), default=None)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--flow-repair", action="store_true", help="time flow-field repair against full recompute instead")
+    args = parser.parse_args()
+
+    if args.flow_repair:
+        check_line_of_sight()
+        check_flow_repair()
+        print_flow_repair_report(run_flow_repair_benchmarks())
+        return
+
+    results = run_benchmarks(args.scenario, args.path, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    print_report(results, baseline, regressions)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:g}x baseline")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,70 @@
+import collections
+import weakref
+import pygame
+
+# ---------------- CONFIG ----------------
+ZOOM_QUANTUM = 1.0 / 256 # Zoom levels closer than this share one set of scaled sprites
+MAX_ZOOM_LEVELS = 3 # Scaled sprite sets kept around (least recently used goes first)
+
+
+# --- Camera ---
+class Camera:
+    """World-to-screen transform (screen = world * zoom + offset) and a per-zoom cache of
+    scaled sprites, so entities blit straight to the screen instead of into a world
+    surface that gets rescaled every frame. Sprites are scaled the first time they are
+    drawn at a zoom level; the cache holds weak references, so it never keeps a
+    surface alive."""
+    def __init__(self):
+        self.zoom = 1.0
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+        self._scale = 1.0
+        self._levels = collections.OrderedDict() # quantized zoom -> WeakKeyDictionary{surface: scaled}
+        self._sprites = None
+
+    def set_view(self, zoom, camera_x, camera_y, render_offset_x, render_offset_y):
+        self.zoom = zoom
+        self.offset_x = render_offset_x - camera_x * zoom
+        self.offset_y = render_offset_y - camera_y * zoom
+        key = max(1, round(zoom / ZOOM_QUANTUM))
+        self._scale = key * ZOOM_QUANTUM
+        level = self._levels.get(key)
+        if level is None:
+            level = self._levels[key] = weakref.WeakKeyDictionary()
+            while len(self._levels) > MAX_ZOOM_LEVELS:
+                self._levels.popitem(last=False)
+        self._levels.move_to_end(key)
+        self._sprites = level
+
+    # --- Transform ---
+    # World coordinates are truncated to whole pixels first, as when everything was
+    # drawn into a world-sized surface, so zoom 1 matches that output pixel for pixel.
+    def point(self, x, y):
+        return int(x) * self.zoom + self.offset_x, int(y) * self.zoom + self.offset_y
+
+    def rect(self, x, y, w, h):
+        z = self.zoom
+        return pygame.Rect(int(x) * z + self.offset_x, int(y) * z + self.offset_y, int(w) * z, int(h) * z)
+
+    # --- Sprites ---
+    def scaled(self, image):
+        """image at the current zoom level."""
+        if self._sprites is None or self._scale == 1.0: return image
+        scaled = self._sprites.get(image)
+        if scaled is None:
+            w, h = image.get_size()
+            size = (max(1, round(w * self._scale)), max(1, round(h * self._scale)))
+            scaled = self._sprites[image] = pygame.transform.scale(image, size)
+        return scaled
+
+    def blit(self, screen, image, x, y):
+        """Blits image with its top-left corner at world (x, y)."""
+        screen.blit(self.scaled(image), (int(x) * self.zoom + self.offset_x, int(y) * self.zoom + self.offset_y))
+
+    def blit_centered(self, screen, image, x, y):
+        sprite = self.scaled(image)
+        sx, sy = self.point(x, y)
+        screen.blit(sprite, sprite.get_rect(center=(int(sx), int(sy))))
+
+
+IDENTITY = Camera() # Draws in world pixels; what entity draw methods use when given no camera
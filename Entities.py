@@ -1,6 +1,12 @@
 import pygame
 import random
 import Assets
+from Camera import IDENTITY
+
+try:
+    import numpy as np
+except ImportError: # Batched updates fall back to per-object loops
+    np = None
 
 # --- Global Gameplay Settings ---
 UNIT_DAMAGE = {
@@ -19,11 +25,39 @@ SEPARATION_FORCE = 200.0
 WORLD_WIDTH_PX = 1280
 WORLD_HEIGHT_PX = 720
 
+# Unit speeds are pixels per tick at this rate; updates scale them by dt so a
+# simulation stepped at another rate covers the same ground per second.
+REFERENCE_TICK_RATE = 60
+
+def _tick_scale(dt):
+    return dt * REFERENCE_TICK_RATE
+
 def set_world_dimensions(w, h):
     global WORLD_WIDTH_PX, WORLD_HEIGHT_PX
     WORLD_WIDTH_PX = w
     WORLD_HEIGHT_PX = h
 
+def _separation_candidates(unit, others, spatial_hash):
+    """Units worth testing for separation: the nearby buckets of the shared hash, or everyone."""
+    if spatial_hash is None:
+        return others
+    pos = unit.current_pixel_pos
+    return spatial_hash.nearby(pos.x, pos.y, SEPARATION_RADIUS)
+
+def _flow_waypoint(unit):
+    """Top-left position of the next tile on the unit's flow field, or None to head
+    straight for its own target (no field, near the goal, clear line, or no path)."""
+    flow = unit.flow
+    if flow is None: return None
+    if flow.stale: flow = unit.flow = flow.refreshed()
+    T = unit.tile_size
+    r = int((unit.current_pixel_pos.y + T / 2) // T)
+    c = int((unit.current_pixel_pos.x + T / 2) // T)
+    if flow.distance(r, c) <= unit.flow_release: return None
+    next_tile = flow.heading(r, c)
+    if next_tile is None: return None
+    return pygame.Vector2(next_tile[1] * T, next_tile[0] * T)
+
 # --- Global Castle Settings ---
 CASTLE_HITBOX_WIDTH_TILES = 4
 CASTLE_HITBOX_HEIGHT_TILES = 4
@@ -71,17 +105,181 @@ class Projectile:
         )
         direction = target_center - self.pos
         dist = direction.length()
-        if dist < self.speed:
+        step = self.speed * _tick_scale(dt)
+        if dist < step:
             self.pos = target_center
             self.target.take_damage(self.damage)
             self.active = False
         else:
-            self.pos += direction.normalize() * self.speed
+            self.pos += direction.normalize() * step
 
-    def draw(self, screen):
+    def draw(self, screen, camera=IDENTITY):
         if self.image and self.active:
-            rect = self.image.get_rect(center=(int(self.pos.x), int(self.pos.y)))
-            screen.blit(self.image, rect)
+            camera.blit_centered(screen, self.image, self.pos.x, self.pos.y)
+
+class ProjectilePool:
+    """Fixed slots for in-flight projectiles, stored as arrays and recycled on hit.
+    Same flight rules as Projectile, but update() homes every live shot in one pass.
+    Targets bound to `store` are read straight from its columns."""
+    SPEED = 8.0
+
+    def __init__(self, capacity=512, store=None):
+        self.capacity = capacity
+        self.store = store
+        self.pos = np.zeros((capacity, 2))
+        self.prev_pos = np.zeros((capacity, 2)) # position before the last update, for interpolated drawing
+        self.speed = np.zeros(capacity)
+        self.damage = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.target_eid = np.full(capacity, -1, dtype=np.int64)
+        self.target_gen = np.zeros(capacity, dtype=np.int64)
+        self.seq = np.zeros(capacity, dtype=np.int64) # firing order, used to settle hits like the old list did
+        self.image_idx = np.full(capacity, -1, dtype=np.int64)
+        self.targets = [None] * capacity
+        self.images = []
+        self.image_keys = {}
+        self.high_water = 0
+        self.next_seq = 0
+        self._free = []
+
+    def __len__(self):
+        return int(np.count_nonzero(self.active[:self.high_water]))
+
+    def clear(self):
+        self.active[:] = False
+        self.targets = [None] * self.capacity
+        self.high_water = 0
+        self._free = []
+
+    def _grow(self):
+        new_capacity = self.capacity * 2
+        for attr in ("pos", "prev_pos", "speed", "damage", "active", "target_eid", "target_gen", "seq", "image_idx"):
+            col = getattr(self, attr)
+            grown = np.zeros((new_capacity,) + col.shape[1:], dtype=col.dtype)
+            grown[:self.capacity] = col
+            setattr(self, attr, grown)
+        self.targets.extend([None] * (new_capacity - self.capacity))
+        self.capacity = new_capacity
+
+    def _image_index(self, shooter_name):
+        idx = self.image_keys.get(shooter_name)
+        if idx is None:
+            idx = -1
+            if shooter_name in Assets._loaded_projectiles:
+                self.images.append(Assets._loaded_projectiles[shooter_name])
+                idx = len(self.images) - 1
+            self.image_keys[shooter_name] = idx
+        return idx
+
+    def fire(self, start_pos, target, shooter_name):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self.high_water >= self.capacity:
+                self._grow()
+            slot = self.high_water
+            self.high_water += 1
+        self.pos[slot] = (start_pos[0], start_pos[1])
+        self.prev_pos[slot] = self.pos[slot]
+        self.speed[slot] = self.SPEED
+        self.damage[slot] = UNIT_DAMAGE.get(shooter_name, 10)
+        self.active[slot] = True
+        self.seq[slot] = self.next_seq
+        self.next_seq += 1
+        self.image_idx[slot] = self._image_index(shooter_name)
+        self.targets[slot] = target
+        if self.store is not None and target.__dict__.get("_store") is self.store:
+            self.target_eid[slot] = target._eid
+            self.target_gen[slot] = self.store.generation[target._eid]
+        else:
+            self.target_eid[slot] = -1
+
+    def _release(self, slots):
+        self.active[slots] = False
+        for slot in slots:
+            self.targets[slot] = None
+            self._free.append(int(slot))
+
+    def update(self, dt):
+        live = np.flatnonzero(self.active[:self.high_water])
+        if not len(live): return
+        self.prev_pos[live] = self.pos[live]
+
+        # Gather target centers and health; rows whose target left the store go the slow way
+        center = np.empty((len(live), 2))
+        health = np.empty(len(live))
+        eids = self.target_eid[live]
+        direct = eids >= 0
+        if self.store is not None and direct.any():
+            store = self.store
+            direct[direct] = store.generation[eids[direct]] == self.target_gen[live[direct]]
+            rows = eids[direct]
+            half = store.size[rows] / 2
+            center[direct, 0] = store.columns["pos"][rows, 0] + half
+            center[direct, 1] = store.columns["pos"][rows, 1] + half
+            health[direct] = store.columns["health"][rows]
+        for i in np.flatnonzero(~direct):
+            target = self.targets[live[i]]
+            pos = target.current_pixel_pos
+            center[i] = (pos.x + target.tile_size/2, pos.y + target.tile_size/2)
+            health[i] = target.health
+
+        dead = health <= 0
+        self._release(live[dead])
+        live = live[~dead]
+        center = center[~dead]
+
+        direction = center - self.pos[live]
+        dist = np.sqrt(direction[:, 0] * direction[:, 0] + direction[:, 1] * direction[:, 1])
+        speed = self.speed[live] * _tick_scale(dt)
+        hit = dist < speed
+
+        flying = live[~hit]
+        self.pos[flying] += direction[~hit] / dist[~hit, None] * speed[~hit, None]
+        if not hit.any(): return
+
+        # Settle hits in firing order: a shot fired after the killing blow does no damage,
+        # and later shots still chasing that target drop out this tick, as with the list.
+        hit_slots = live[hit]
+        hit_centers = center[hit]
+        order = np.argsort(self.seq[hit_slots], kind="stable")
+        killed_at = {}
+        for i in order:
+            slot = hit_slots[i]
+            target = self.targets[slot]
+            if target.health > 0:
+                self.pos[slot] = hit_centers[i]
+                target.take_damage(int(self.damage[slot]))
+                if target.health <= 0:
+                    killed_at[id(target)] = self.seq[slot]
+        self._release(hit_slots)
+
+        if killed_at:
+            late = [slot for slot in flying
+                    if id(self.targets[slot]) in killed_at and self.seq[slot] > killed_at[id(self.targets[slot])]]
+            if late: self._release(np.array(late, dtype=np.int64))
+
+    def draw(self, screen, alpha=1.0, view=None, camera=IDENTITY):
+        """alpha blends from the previous tick's position (0) to the current one (1).
+        With a view rect, shots whose current position lies outside it are skipped."""
+        live = self.active[:self.high_water]
+        if view is not None:
+            pos = self.pos[:self.high_water]
+            live = live & (pos[:, 0] >= view.left) & (pos[:, 0] < view.right) & (pos[:, 1] >= view.top) & (pos[:, 1] < view.bottom)
+        for slot in np.flatnonzero(live):
+            idx = self.image_idx[slot]
+            if idx < 0: continue
+            image = self.images[idx]
+            x = self.prev_pos[slot, 0] + (self.pos[slot, 0] - self.prev_pos[slot, 0]) * alpha
+            y = self.prev_pos[slot, 1] + (self.pos[slot, 1] - self.prev_pos[slot, 1]) * alpha
+            camera.blit_centered(screen, image, x, y)
+
+
+def _fire_projectile(projectiles_list, start_pos, target, shooter_name):
+    if isinstance(projectiles_list, ProjectilePool):
+        projectiles_list.fire(start_pos, target, shooter_name)
+    else:
+        projectiles_list.append(Projectile(start_pos, target, shooter_name))
 
 class FlagPole:
     def __init__(self, grid_pos, tile_size):
@@ -95,9 +293,9 @@ class FlagPole:
         self.grid_c = grid_c
         self.pos = pygame.Vector2(self.grid_c * self.tile_size, self.grid_r * self.tile_size)
 
-    def draw(self, screen):
+    def draw(self, screen, camera=IDENTITY):
         if self.image:
-            screen.blit(self.image, (self.pos.x, self.pos.y))
+            camera.blit(screen, self.image, self.pos.x, self.pos.y)
 
 class Windmill:
     def __init__(self, start_grid_pos, tile_size):
@@ -111,12 +309,10 @@ class Windmill:
             self.grid_r * self.tile_size
         )
         
+        # Per-frame click masks and the frame-invariant collision mask, shared by every windmill
+        self.masks, self.collision_mask = Assets.structure_masks("windmill")
         self.sprites = Assets._loaded_assets.get("windmill", [])
         self.alfalfa_sprite = Assets._loaded_assets.get("alfalfa")
-        
-        self.masks = []
-        for s in self.sprites:
-            self.masks.append(pygame.mask.from_surface(s))
             
         self.animation_frame = 0
         self.animation_speed = 0.05 
@@ -207,36 +403,39 @@ class Windmill:
     def get_progress(self):
         return min(1.0, self.cheese_timer / self.CHEESE_GENERATION_TIME)
 
-    def draw_ground(self, screen):
+    def draw_ground(self, screen, camera=IDENTITY):
         """Draws the alfalfa fields and static llamas (Layer 0)"""
         if self.alfalfa_sprite:
             for r, c in self.get_alfalfa_coords():
                 draw_x = c * self.tile_size
                 draw_y = r * self.tile_size
-                screen.blit(self.alfalfa_sprite, (draw_x, draw_y))
+                camera.blit(screen, self.alfalfa_sprite, draw_x, draw_y)
+        self.draw_static_llamas(screen, camera)
 
+    def draw_static_llamas(self, screen, camera=IDENTITY):
+        """Draws only the animated llamas of Layer 0 (the alfalfa comes from the static layer cache)"""
         for llama in self.static_llamas:
             frames = llama['frames']
             idx = int(llama['frame_idx']) % len(frames)
             img = frames[idx]
-            screen.blit(img, (llama['x'], llama['y']))
+            camera.blit(screen, img, llama['x'], llama['y'])
 
-    def draw_structure(self, screen):
+    def draw_structure(self, screen, camera=IDENTITY):
         """Draws the mill sprite (Layer 1 - Y Sorted)"""
         if self.sprites:
             sprite = self.sprites[self.animation_frame]
-            screen.blit(sprite, (self.current_pixel_pos.x, self.current_pixel_pos.y))
+            camera.blit(screen, sprite, self.current_pixel_pos.x, self.current_pixel_pos.y)
 
-    def draw_ui(self, screen):
+    def draw_ui(self, screen, camera=IDENTITY):
         """Draws the progress bar (Layer 2 - Overlay)"""
         bar_w = self.width_tiles * self.tile_size
         bar_h = 8
         x = self.current_pixel_pos.x
         y = self.current_pixel_pos.y - 12
         progress = self.get_progress()
-        pygame.draw.rect(screen, (50, 50, 50), (x, y, bar_w, bar_h))
-        pygame.draw.rect(screen, (255, 215, 0), (x, y, bar_w * progress, bar_h))
-        pygame.draw.rect(screen, (255, 255, 255), (x, y, bar_w, bar_h), 1)
+        pygame.draw.rect(screen, (50, 50, 50), camera.rect(x, y, bar_w, bar_h))
+        pygame.draw.rect(screen, (255, 215, 0), camera.rect(x, y, bar_w * progress, bar_h))
+        pygame.draw.rect(screen, (255, 255, 255), camera.rect(x, y, bar_w, bar_h), 1)
 
     def get_bottom_y(self):
         return self.current_pixel_pos.y + (self.height_tiles * self.tile_size)
@@ -253,6 +452,10 @@ class Windmill:
 
     def check_collision(self, pixel_point):
         return self.is_pixel_clicked(pixel_point)
+
+    def get_collision_footprint(self):
+        """(mask, world top-left) of every pixel any animation frame covers."""
+        return self.collision_mask, (self.current_pixel_pos.x, self.current_pixel_pos.y)
     
     def get_occupied_coords(self):
         coords = []
@@ -290,15 +493,11 @@ class Castle:
         self.max_queue_size = 5
         
     def reload_sprites(self):
-        raw_sprites = Assets._loaded_assets.get("castle", [])
-        self.sprites = []
-        self.masks = []
         target_w = CASTLE_VISUAL_WIDTH_TILES * self.tile_size
         target_h = CASTLE_VISUAL_HEIGHT_TILES * self.tile_size
-        for s in raw_sprites:
-            scaled = pygame.transform.scale(s, (int(target_w), int(target_h)))
-            self.sprites.append(scaled)
-            self.masks.append(pygame.mask.from_surface(scaled))
+        sprites, masks, self.collision_mask = Assets.castle_sprites(int(target_w), int(target_h))
+        self.sprites = list(sprites)
+        self.masks = list(masks)
 
     def is_pixel_clicked(self, world_pos):
         if not self.sprites or not self.masks: return False
@@ -315,6 +514,11 @@ class Castle:
     def check_collision(self, pixel_point):
         return self.is_pixel_clicked(pixel_point)
 
+    def get_collision_footprint(self):
+        """(mask, world top-left) of every pixel any animation frame covers."""
+        return self.collision_mask, (self.current_pixel_pos.x + CASTLE_VISUAL_OFFSET_X_TILES * self.tile_size,
+                                          self.current_pixel_pos.y + CASTLE_VISUAL_OFFSET_Y_TILES * self.tile_size)
+
     def queue_unit(self, unit_name):
         if len(self.training_queue) < self.max_queue_size:
             self.training_queue.append(unit_name)
@@ -365,19 +569,19 @@ class Castle:
             new_unit.set_target(rr, rc)
             self.spawned_units.append(new_unit)
 
-    def draw_structure(self, screen):
+    def draw_structure(self, screen, camera=IDENTITY):
         """Draws the castle sprite (Layer 1 - Y Sorted)"""
         if self.sprites:
             sprite = self.sprites[self.animation_frame]
             sprite_x = self.current_pixel_pos.x + (CASTLE_VISUAL_OFFSET_X_TILES * self.tile_size)
             sprite_y = self.current_pixel_pos.y + (CASTLE_VISUAL_OFFSET_Y_TILES * self.tile_size)
-            screen.blit(sprite, (sprite_x, sprite_y))
+            camera.blit(screen, sprite, sprite_x, sprite_y)
         if SHOW_CASTLE_BORDER:
-            rect = pygame.Rect(self.current_pixel_pos.x, self.current_pixel_pos.y, self.width_tiles * self.tile_size, self.height_tiles * self.tile_size)
+            rect = camera.rect(self.current_pixel_pos.x, self.current_pixel_pos.y, self.width_tiles * self.tile_size, self.height_tiles * self.tile_size)
             pygame.draw.rect(screen, CASTLE_BORDER_COLOR, rect, 2)
-        if self.flagpole: self.flagpole.draw(screen)
+        if self.flagpole: self.flagpole.draw(screen, camera)
 
-    def draw_ui(self, screen):
+    def draw_ui(self, screen, camera=IDENTITY):
         """Draws health bar and training queue (Layer 2 - Overlay)"""
         bar_width = self.tile_size * self.width_tiles
         bar_height = 8
@@ -386,17 +590,17 @@ class Castle:
             hx = self.current_pixel_pos.x
             hy = self.current_pixel_pos.y - 25
             hp_pct = max(0, self.health / self.max_health)
-            pygame.draw.rect(screen, (50, 0, 0), (hx, hy, bar_width, bar_height))
-            pygame.draw.rect(screen, (0, 255, 0), (hx, hy, bar_width * hp_pct, bar_height))
-            pygame.draw.rect(screen, (255, 255, 255), (hx, hy, bar_width, bar_height), 1)
+            pygame.draw.rect(screen, (50, 0, 0), camera.rect(hx, hy, bar_width, bar_height))
+            pygame.draw.rect(screen, (0, 255, 0), camera.rect(hx, hy, bar_width * hp_pct, bar_height))
+            pygame.draw.rect(screen, (255, 255, 255), camera.rect(hx, hy, bar_width, bar_height), 1)
 
         if self.training_queue:
             x = self.current_pixel_pos.x
             y = self.current_pixel_pos.y - 10
             progress = self.training_timer / self.TOTAL_TRAINING_TIME
-            pygame.draw.rect(screen, (50, 50, 50), (x, y, bar_width, bar_height))
-            pygame.draw.rect(screen, (0, 200, 255), (x, y, bar_width * progress, bar_height))
-            pygame.draw.rect(screen, (255, 255, 255), (x, y, bar_width, bar_height), 1)
+            pygame.draw.rect(screen, (50, 50, 50), camera.rect(x, y, bar_width, bar_height))
+            pygame.draw.rect(screen, (0, 200, 255), camera.rect(x, y, bar_width * progress, bar_height))
+            pygame.draw.rect(screen, (255, 255, 255), camera.rect(x, y, bar_width, bar_height), 1)
 
     def get_bottom_y(self):
         return self.current_pixel_pos.y + (self.height_tiles * self.tile_size)
@@ -410,14 +614,27 @@ class Castle:
 
 
 class Enemy:
+    # Attributes that live in an EntityStore row while the enemy is bound to one
+    STORE_FIELDS = {
+        "current_pixel_pos": "pos", "base_speed": "speed", "health": "health",
+        "animation_timer": "anim_timer", "animation_speed": "anim_speed",
+        "animation_frame": "anim_frame", "frame_count": "frame_count",
+        "attack_timer": "attack_timer", "attack_cooldown": "attack_cooldown",
+        "damage": "damage", "speed_multiplier": "speed_mult", "facing_right": "facing_right",
+    }
+    _store = None
+
     def __init__(self, start_grid_pos, tile_size, extra_health=0):
         self.grid_r, self.grid_c = start_grid_pos
         self.tile_size = tile_size
         self.name = "Piero"
         self.current_pixel_pos = pygame.Vector2(self.grid_c * self.tile_size, self.grid_r * self.tile_size)
         self.frames = []
+        self.flipped_frames = []
         if "Piero" in Assets._loaded_enemies:
             self.frames = Assets._loaded_enemies["Piero"]
+            self.flipped_frames = Assets._flipped_enemies.get("Piero", self.frames)
+        self.frame_count = len(self.frames)
         self.animation_frame = 0
         self.animation_speed = 0.2
         self.animation_timer = 0.0
@@ -434,7 +651,8 @@ class Enemy:
     def take_damage(self, amount):
         self.health -= amount
 
-    def update(self, dt, obstacles=set(), castle=None, move_to_castle=False, other_enemies=[]):
+    def update(self, dt, obstacles=set(), castle=None, move_to_castle=False, other_enemies=[], spatial_hash=None, flow=None):
+        """flow: the Pathfinding.FlowField toward the castle; without one enemies walk straight at it."""
         self.animation_timer += dt
         if self.animation_timer >= self.animation_speed:
             if self.frames:
@@ -458,16 +676,20 @@ class Enemy:
                     castle.take_damage(self.damage)
             else:
                 if dist > 0:
+                    T = self.tile_size
+                    heading = flow.heading(int(my_center.y // T), int(my_center.x // T)) if flow else None
+                    if heading is not None: direction = pygame.Vector2((heading[1] + 0.5) * T, (heading[0] + 0.5) * T) - my_center
                     norm = direction.normalize()
                     if norm.x > 0: self.facing_right = True
                     else: self.facing_right = False
                     
-                    current_speed = self.base_speed * self.speed_multiplier
+                    scale = _tick_scale(dt)
+                    current_speed = self.base_speed * self.speed_multiplier * scale
                     move_vec = norm * current_speed
                     
                     # Separation Logic
                     sep_vec = pygame.Vector2(0, 0)
-                    for e in other_enemies:
+                    for e in _separation_candidates(self, other_enemies, spatial_hash):
                         if e is not self and e.health > 0:
                             dist_to_other = self.current_pixel_pos.distance_to(e.current_pixel_pos)
                             if dist_to_other < SEPARATION_RADIUS and dist_to_other > 0:
@@ -475,31 +697,106 @@ class Enemy:
                                 sep_vec += diff.normalize() * (SEPARATION_FORCE / dist_to_other)
                     
                     # Apply movement + separation
-                    self.current_pixel_pos += move_vec + (sep_vec * 0.05)
+                    new_pos = self.current_pixel_pos + move_vec + (sep_vec * (0.05 * scale))
                     
                     # CLAMP to World Bounds
-                    self.current_pixel_pos.x = max(0, min(self.current_pixel_pos.x, WORLD_WIDTH_PX - self.tile_size))
-                    self.current_pixel_pos.y = max(0, min(self.current_pixel_pos.y, WORLD_HEIGHT_PX - self.tile_size))
+                    new_pos.x = max(0, min(new_pos.x, WORLD_WIDTH_PX - self.tile_size))
+                    new_pos.y = max(0, min(new_pos.y, WORLD_HEIGHT_PX - self.tile_size))
+                    self.current_pixel_pos = new_pos
+
+                    if spatial_hash is not None:
+                        spatial_hash.relocate(self)
         
         self.speed_multiplier = 1.0
 
+    @staticmethod
+    def update_all(enemies, dt, obstacles=set(), castle=None, move_to_castle=False, store=None, flow=None):
+        """Steps every enemy at once. With all enemies bound to an EntityStore the
+        march toward the castle runs as one vectorized pass over its columns;
+        otherwise (or without numpy) each enemy updates itself as before. flow is
+        the shared field toward the castle; each enemy looks up its tile in it."""
+        if not enemies: return
+        if store is None or np is None:
+            for enemy in enemies:
+                enemy.update(dt, obstacles, castle, move_to_castle=move_to_castle, flow=flow)
+            return
+
+        ids = store.ids_of(Enemy)
+        if len(ids) != len(enemies): # Some enemies are not bound; keep them all on one path
+            for enemy in enemies:
+                enemy.update(dt, obstacles, castle, move_to_castle=move_to_castle, flow=flow)
+            return
+        cols = store.columns
+
+        # Animation
+        anim_timer = cols["anim_timer"]
+        anim_timer[ids] += dt
+        flip = ids[anim_timer[ids] >= cols["anim_speed"][ids]]
+        counts = cols["frame_count"][flip]
+        has_frames = counts > 0
+        cols["anim_frame"][flip[has_frames]] = (cols["anim_frame"][flip[has_frames]] + 1) % counts[has_frames]
+        anim_timer[flip] = 0.0
+
+        if move_to_castle and castle:
+            live = ids[cols["health"][ids] > 0]
+            target_x = castle.current_pixel_pos.x + (castle.width_tiles * castle.tile_size) / 2
+            target_y = castle.current_pixel_pos.y + (castle.height_tiles * castle.tile_size) / 2
+            pos = cols["pos"]
+            half = store.size[live] / 2
+            dx = target_x - (pos[live, 0] + half)
+            dy = target_y - (pos[live, 1] + half)
+            dist = np.sqrt(dx * dx + dy * dy)
+
+            # In range: attack the castle
+            in_range = dist < 100
+            attackers = live[in_range]
+            attack_timer = cols["attack_timer"]
+            attack_timer[attackers] += dt
+            striking = attackers[attack_timer[attackers] >= cols["attack_cooldown"][attackers]]
+            attack_timer[striking] = 0.0
+            if len(striking):
+                castle.take_damage(int(cols["damage"][striking].sum()))
+
+            # Out of range: march, at the next tile of the flow field where the way is not clear
+            marching = ~in_range & (dist > 0)
+            movers = live[marching]
+            step_x, step_y, step = dx[marching], dy[marching], dist[marching]
+            if flow is not None and len(movers):
+                step_x, step_y = step_x.copy(), step_y.copy()
+                T = castle.tile_size
+                centre_x = pos[movers, 0] + half[marching]
+                centre_y = pos[movers, 1] + half[marching]
+                columns = flow.pathfinder.columns
+                next_tiles = flow.headings((centre_y // T).astype(np.int64) * columns + (centre_x // T).astype(np.int64))
+                routed = next_tiles >= 0
+                step_x[routed] = (next_tiles[routed] % columns + 0.5) * T - centre_x[routed]
+                step_y[routed] = (next_tiles[routed] // columns + 0.5) * T - centre_y[routed]
+                step = np.sqrt(step_x * step_x + step_y * step_y)
+            norm_x = step_x / step
+            norm_y = step_y / step
+            cols["facing_right"][movers] = norm_x > 0
+            current_speed = cols["speed"][movers] * cols["speed_mult"][movers] * _tick_scale(dt)
+            size = store.size[movers]
+            pos[movers, 0] = np.maximum(0, np.minimum(pos[movers, 0] + norm_x * current_speed, WORLD_WIDTH_PX - size))
+            pos[movers, 1] = np.maximum(0, np.minimum(pos[movers, 1] + norm_y * current_speed, WORLD_HEIGHT_PX - size))
+
+        cols["speed_mult"][ids] = 1.0
+
     def get_bottom_y(self):
         return self.current_pixel_pos.y + self.tile_size
 
-    def draw(self, screen):
+    def draw(self, screen, camera=IDENTITY):
         if self.frames:
-            current_img = self.frames[self.animation_frame]
-            if not self.facing_right:
-                current_img = pygame.transform.flip(current_img, True, False)
-            screen.blit(current_img, (self.current_pixel_pos.x, self.current_pixel_pos.y))
+            frames = self.frames if self.facing_right else self.flipped_frames
+            camera.blit(screen, frames[self.animation_frame], self.current_pixel_pos.x, self.current_pixel_pos.y)
         if self.health < self.max_health:
             bar_w = self.tile_size
             bar_h = 6
             pos_x = self.current_pixel_pos.x
             pos_y = self.current_pixel_pos.y - 10
-            pygame.draw.rect(screen, (255, 0, 0), (pos_x, pos_y, bar_w, bar_h))
+            pygame.draw.rect(screen, (255, 0, 0), camera.rect(pos_x, pos_y, bar_w, bar_h))
             health_pct = max(0, self.health / self.max_health)
-            pygame.draw.rect(screen, (0, 255, 0), (pos_x, pos_y, bar_w * health_pct, bar_h))
+            pygame.draw.rect(screen, (0, 255, 0), camera.rect(pos_x, pos_y, bar_w * health_pct, bar_h))
 
 
 class Llama:
@@ -736,6 +1033,7 @@ class Llama:
         self.state_timer = 0.0 
 
     def update(self, dt, obstacles=set(), pixel_obstacles=[], windmills=[]):
+        step = self.speed * _tick_scale(dt)
         self.animation_timer += dt
         self.state_timer += dt
         if self.animation_timer >= self.animation_speed:
@@ -749,7 +1047,7 @@ class Llama:
             distance = direction_vec.length()
             FOLLOW_DISTANCE = 70.0
             if distance > FOLLOW_DISTANCE:
-                next_pos = self.current_pixel_pos + direction_vec.normalize() * self.speed
+                next_pos = self.current_pixel_pos + direction_vec.normalize() * step
                 collided = False
                 for obj in pixel_obstacles:
                     if obj and obj.check_collision((next_pos.x + self.tile_size/2, next_pos.y + self.tile_size/2)):
@@ -776,7 +1074,7 @@ class Llama:
         if self.state == "walk":
             # Check for "stuck" condition
             dist_moved = self.current_pixel_pos.distance_to(self.last_pos)
-            if dist_moved < 0.1 * self.speed:
+            if dist_moved < 0.1 * step:
                 self.stuck_timer += dt
             else:
                 self.stuck_timer = 0.0
@@ -788,7 +1086,7 @@ class Llama:
                 self._choose_next_action(obstacles, pixel_obstacles, windmills)
                 return
 
-            if self.current_pixel_pos.distance_to(self.target_pixel_pos) < self.speed:
+            if self.current_pixel_pos.distance_to(self.target_pixel_pos) < step:
                 self.current_pixel_pos = self.target_pixel_pos 
                 self.grid_r = self.target_grid_r
                 self.grid_c = self.target_grid_c
@@ -812,7 +1110,7 @@ class Llama:
             else:
                 move_vector = self.target_pixel_pos - self.current_pixel_pos
                 if move_vector.length() > 0: 
-                    self.current_pixel_pos += move_vector.normalize() * self.speed
+                    self.current_pixel_pos += move_vector.normalize() * step
                     # CLAMP
                     self.current_pixel_pos.x = max(0, min(self.current_pixel_pos.x, WORLD_WIDTH_PX - self.tile_size))
                     self.current_pixel_pos.y = max(0, min(self.current_pixel_pos.y, WORLD_HEIGHT_PX - self.tile_size))
@@ -846,12 +1144,15 @@ class Llama:
         llama_render_size = int(self.tile_size * Assets.LLAMA_SCALE_FACTOR)
         return self.current_pixel_pos.y + llama_render_size
 
-    def draw(self, screen):
+    def draw(self, screen, camera=IDENTITY):
         sprite = self.get_current_sprite()
-        screen.blit(sprite, (self.current_pixel_pos.x, self.current_pixel_pos.y))
+        camera.blit(screen, sprite, self.current_pixel_pos.x, self.current_pixel_pos.y)
 
 
 class McUncle:
+    STORE_FIELDS = {"current_pixel_pos": "pos", "target_pixel_pos": "target", "speed": "speed", "cooldown_timer": "cooldown"}
+    _store = None
+
     def __init__(self, start_grid_pos, tile_size):
         self.grid_r, self.grid_c = start_grid_pos
         self.tile_size = tile_size
@@ -863,6 +1164,7 @@ class McUncle:
         self.name = "McUncle" 
         # Update sprite handling for state logic
         self.sprites = Assets._loaded_mcuncle_sprites # Dict {state: frames}
+        self.flipped_sprites = Assets._flipped_mcuncle_sprites # Same, mirrored for facing left
         self.state = "idle"
         
         self.animation_frame = 0
@@ -873,22 +1175,28 @@ class McUncle:
         self.attack_cooldown = 1.0 
         self.cooldown_timer = 0.0
         self.radius = 25 
+        self.flow = None # Pathfinding.FlowField shared by the units of one move order
+        self.flow_release = 0 # Tiles from the field's goal at which the unit leaves it for its own target
         
     def set_target(self, grid_r, grid_c):
         self.target_pixel_pos = pygame.Vector2(grid_c * self.tile_size, grid_r * self.tile_size)
+        self.flow = None
         self.is_moving = True
         self.state = "walk"
         self.animation_frame = 0
         self.animation_timer = 0.0
 
-    def set_precise_target(self, x, y):
+    def set_precise_target(self, x, y, flow=None, release=1):
+        """flow: a FlowField to follow around obstacles until within release tiles of its goal."""
         self.target_pixel_pos = pygame.Vector2(x, y)
+        self.flow = flow
+        self.flow_release = release
         self.is_moving = True
         self.state = "walk"
         self.animation_frame = 0
         self.animation_timer = 0.0
 
-    def update(self, dt, enemies_list=None, projectiles_list=None, obstacles=set(), pixel_obstacles=[], friends=[]):
+    def update(self, dt, enemies_list=None, projectiles_list=None, obstacles=set(), pixel_obstacles=[], friends=[], spatial_hash=None, enemy_index=None):
         self.animation_timer += dt
         if self.animation_timer >= self.animation_speed:
             # Determine current frame list based on state
@@ -905,23 +1213,27 @@ class McUncle:
             
             if distance < 5:
                 self.is_moving = False
+                self.flow = None
                 self.current_pixel_pos = self.target_pixel_pos
                 self.state = "idle" # Stop
             else:
+                waypoint = _flow_waypoint(self)
+                if waypoint is not None and waypoint != self.current_pixel_pos:
+                    direction = waypoint - self.current_pixel_pos
                 if direction.x < 0: self.facing_right = False
                 elif direction.x > 0: self.facing_right = True
                 
-                move_vec = direction.normalize() * self.speed
+                move_vec = direction.normalize() * self.speed * _tick_scale(dt)
                 
                 sep_vec = pygame.Vector2(0, 0)
-                for f in friends:
+                for f in _separation_candidates(self, friends, spatial_hash):
                     if f is not self:
                         dist = self.current_pixel_pos.distance_to(f.current_pixel_pos)
                         if dist < SEPARATION_RADIUS and dist > 0:
                             diff = self.current_pixel_pos - f.current_pixel_pos
                             sep_vec += diff.normalize() * (SEPARATION_FORCE / dist)
                 
-                proposed_pos = self.current_pixel_pos + move_vec + (sep_vec * 0.05)
+                proposed_pos = self.current_pixel_pos + move_vec + (sep_vec * (0.05 * _tick_scale(dt)))
                 
                 def is_blocked(pos):
                     cx = pos.x + self.tile_size/2
@@ -951,7 +1263,7 @@ class McUncle:
         else:
             self.state = "idle" # Ensure idle state
             sep_vec = pygame.Vector2(0, 0)
-            for f in friends:
+            for f in _separation_candidates(self, friends, spatial_hash):
                 if f is not self:
                     dist = self.current_pixel_pos.distance_to(f.current_pixel_pos)
                     if dist < SEPARATION_RADIUS and dist > 0:
@@ -959,7 +1271,7 @@ class McUncle:
                         sep_vec += diff.normalize() * (SEPARATION_FORCE / dist)
             
             if sep_vec.length() > 0.1:
-                proposed_pos = self.current_pixel_pos + (sep_vec * 0.05)
+                proposed_pos = self.current_pixel_pos + (sep_vec * (0.05 * _tick_scale(dt)))
                 proposed_pos.x = max(0, min(proposed_pos.x, WORLD_WIDTH_PX - self.tile_size))
                 proposed_pos.y = max(0, min(proposed_pos.y, WORLD_HEIGHT_PX - self.tile_size))
                 
@@ -974,40 +1286,48 @@ class McUncle:
                 if not blocked:
                     self.current_pixel_pos = proposed_pos
 
-        if self.cooldown_timer > 0:
+        if spatial_hash is not None:
+            spatial_hash.relocate(self)
+
+        # Bound units get their cooldown ticked by EntityStore.tick_cooldowns instead
+        if self._store is None and self.cooldown_timer > 0:
             self.cooldown_timer -= dt
         
         if enemies_list is not None and projectiles_list is not None and self.cooldown_timer <= 0:
             closest_enemy = None
             min_dist = float('inf')
             my_center = self.current_pixel_pos + pygame.Vector2(self.tile_size/2, self.tile_size/2)
-            for enemy in enemies_list:
-                en_center = enemy.current_pixel_pos + pygame.Vector2(enemy.tile_size/2, enemy.tile_size/2)
-                dist = my_center.distance_to(en_center)
-                if dist < self.attack_range and dist < min_dist:
-                    min_dist = dist
-                    closest_enemy = enemy
+            if enemy_index is not None:
+                closest_enemy = enemy_index.nearest(my_center.x, my_center.y, self.attack_range)
+            else:
+                for enemy in enemies_list:
+                    en_center = enemy.current_pixel_pos + pygame.Vector2(enemy.tile_size/2, enemy.tile_size/2)
+                    dist = my_center.distance_to(en_center)
+                    if dist < self.attack_range and dist < min_dist:
+                        min_dist = dist
+                        closest_enemy = enemy
             if closest_enemy:
                 self.cooldown_timer = self.attack_cooldown
-                proj = Projectile(my_center, closest_enemy, self.name)
-                projectiles_list.append(proj)
+                _fire_projectile(projectiles_list, my_center, closest_enemy, self.name)
 
     def get_bottom_y(self):
         return self.current_pixel_pos.y + self.tile_size
 
-    def draw(self, screen):
-        frames = self.sprites.get(self.state, self.sprites.get("idle", []))
+    def draw(self, screen, camera=IDENTITY):
+        sprites = self.sprites if self.facing_right else self.flipped_sprites
+        frames = sprites.get(self.state, sprites.get("idle", []))
         if frames:
             sprite = frames[self.animation_frame % len(frames)]
-            if not self.facing_right:
-                sprite = pygame.transform.flip(sprite, True, False)
-            screen.blit(sprite, (self.current_pixel_pos.x, self.current_pixel_pos.y))
+            camera.blit(screen, sprite, self.current_pixel_pos.x, self.current_pixel_pos.y)
         
         if self.selected:
-            rect = pygame.Rect(self.current_pixel_pos.x, self.current_pixel_pos.y, self.tile_size, self.tile_size)
+            rect = camera.rect(self.current_pixel_pos.x, self.current_pixel_pos.y, self.tile_size, self.tile_size)
             pygame.draw.ellipse(screen, (0, 255, 0), rect, 2)
 
 class Hamster:
+    STORE_FIELDS = {"current_pixel_pos": "pos", "target_pixel_pos": "target", "speed": "speed", "cooldown_timer": "cooldown"}
+    _store = None
+
     def __init__(self, name, start_grid_pos, tile_size):
         self.name = name
         self.grid_r, self.grid_c = start_grid_pos
@@ -1024,26 +1344,34 @@ class Hamster:
         self.facing_right = True
         if name in Assets._loaded_hamsters:
             self.sprites = Assets._loaded_hamsters[name]
+            self.flipped_sprites = Assets._flipped_hamsters.get(name, self.sprites)
         else:
             self.sprites = {}
+            self.flipped_sprites = {}
         self.attack_range = 250
         self.attack_cooldown = 1.0 
         self.cooldown_timer = 0.0
         self.radius = 25
+        self.flow = None # Pathfinding.FlowField shared by the units of one move order
+        self.flow_release = 0 # Tiles from the field's goal at which the unit leaves it for its own target
 
     def set_target(self, grid_r, grid_c):
         self.target_pixel_pos = pygame.Vector2(grid_c * self.tile_size, grid_r * self.tile_size)
+        self.flow = None
         self.is_moving = True
         self.state = "walk"
         self.animation_frame = 0
         self.animation_timer = 0.0
 
-    def set_precise_target(self, x, y):
+    def set_precise_target(self, x, y, flow=None, release=1):
+        """flow: a FlowField to follow around obstacles until within release tiles of its goal."""
         self.target_pixel_pos = pygame.Vector2(x, y)
+        self.flow = flow
+        self.flow_release = release
         self.is_moving = True
         self.state = "walk"
 
-    def update(self, dt, enemies_list=None, projectiles_list=None, obstacles=set(), pixel_obstacles=[], friends=[]):
+    def update(self, dt, enemies_list=None, projectiles_list=None, obstacles=set(), pixel_obstacles=[], friends=[], spatial_hash=None, enemy_index=None):
         self.animation_timer += dt
         if self.animation_timer >= self.animation_speed:
             current_frames = self.sprites.get(self.state, [])
@@ -1057,23 +1385,27 @@ class Hamster:
             
             if distance < 5:
                 self.is_moving = False
+                self.flow = None
                 self.state = "idle"
                 self.current_pixel_pos = self.target_pixel_pos
             else:
+                waypoint = _flow_waypoint(self)
+                if waypoint is not None and waypoint != self.current_pixel_pos:
+                    direction = waypoint - self.current_pixel_pos
                 if direction.x < 0: self.facing_right = False
                 elif direction.x > 0: self.facing_right = True
                 
-                move_vec = direction.normalize() * self.speed
+                move_vec = direction.normalize() * self.speed * _tick_scale(dt)
                 
                 sep_vec = pygame.Vector2(0, 0)
-                for f in friends:
+                for f in _separation_candidates(self, friends, spatial_hash):
                     if f is not self:
                         dist = self.current_pixel_pos.distance_to(f.current_pixel_pos)
                         if dist < SEPARATION_RADIUS and dist > 0:
                             diff = self.current_pixel_pos - f.current_pixel_pos
                             sep_vec += diff.normalize() * (SEPARATION_FORCE / dist)
                 
-                proposed_pos = self.current_pixel_pos + move_vec + (sep_vec * 0.05)
+                proposed_pos = self.current_pixel_pos + move_vec + (sep_vec * (0.05 * _tick_scale(dt)))
                 
                 # Collision Check + Sliding
                 def is_blocked(pos):
@@ -1103,7 +1435,7 @@ class Hamster:
                 self.grid_r = int(self.current_pixel_pos.y // self.tile_size)
         else:
             sep_vec = pygame.Vector2(0, 0)
-            for f in friends:
+            for f in _separation_candidates(self, friends, spatial_hash):
                 if f is not self:
                     dist = self.current_pixel_pos.distance_to(f.current_pixel_pos)
                     if dist < SEPARATION_RADIUS and dist > 0:
@@ -1111,7 +1443,7 @@ class Hamster:
                         sep_vec += diff.normalize() * (SEPARATION_FORCE / dist)
             
             if sep_vec.length() > 0.1:
-                proposed_pos = self.current_pixel_pos + (sep_vec * 0.05)
+                proposed_pos = self.current_pixel_pos + (sep_vec * (0.05 * _tick_scale(dt)))
                 # Bounds
                 proposed_pos.x = max(0, min(proposed_pos.x, WORLD_WIDTH_PX - self.tile_size))
                 proposed_pos.y = max(0, min(proposed_pos.y, WORLD_HEIGHT_PX - self.tile_size))
@@ -1127,23 +1459,29 @@ class Hamster:
                 if not blocked:
                     self.current_pixel_pos = proposed_pos
 
-        if self.cooldown_timer > 0:
+        if spatial_hash is not None:
+            spatial_hash.relocate(self)
+
+        # Bound units get their cooldown ticked by EntityStore.tick_cooldowns instead
+        if self._store is None and self.cooldown_timer > 0:
             self.cooldown_timer -= dt
         
         if enemies_list is not None and projectiles_list is not None and self.cooldown_timer <= 0:
             closest_enemy = None
             min_dist = float('inf')
             my_center = self.current_pixel_pos + pygame.Vector2(self.tile_size/2, self.tile_size/2)
-            for enemy in enemies_list:
-                en_center = enemy.current_pixel_pos + pygame.Vector2(enemy.tile_size/2, enemy.tile_size/2)
-                dist = my_center.distance_to(en_center)
-                if dist < self.attack_range and dist < min_dist:
-                    min_dist = dist
-                    closest_enemy = enemy
+            if enemy_index is not None:
+                closest_enemy = enemy_index.nearest(my_center.x, my_center.y, self.attack_range)
+            else:
+                for enemy in enemies_list:
+                    en_center = enemy.current_pixel_pos + pygame.Vector2(enemy.tile_size/2, enemy.tile_size/2)
+                    dist = my_center.distance_to(en_center)
+                    if dist < self.attack_range and dist < min_dist:
+                        min_dist = dist
+                        closest_enemy = enemy
             if closest_enemy:
                 self.cooldown_timer = self.attack_cooldown
-                proj = Projectile(my_center, closest_enemy, self.name)
-                projectiles_list.append(proj)
+                _fire_projectile(projectiles_list, my_center, closest_enemy, self.name)
         
         # Apply slow logic for "The Hamster"
         if self.name == "The Hamster" and enemies_list:
@@ -1156,14 +1494,13 @@ class Hamster:
     def get_bottom_y(self):
         return self.current_pixel_pos.y + self.tile_size
 
-    def draw(self, screen):
-        frames = self.sprites.get(self.state, self.sprites.get("idle", []))
+    def draw(self, screen, camera=IDENTITY):
+        sprites = self.sprites if self.facing_right else self.flipped_sprites
+        frames = sprites.get(self.state, sprites.get("idle", []))
         if frames:
             sprite = frames[self.animation_frame % len(frames)]
-            if not self.facing_right:
-                sprite = pygame.transform.flip(sprite, True, False)
-            screen.blit(sprite, (self.current_pixel_pos.x, self.current_pixel_pos.y))
+            camera.blit(screen, sprite, self.current_pixel_pos.x, self.current_pixel_pos.y)
         
         if self.selected:
-            rect = pygame.Rect(self.current_pixel_pos.x, self.current_pixel_pos.y, self.tile_size, self.tile_size)
+            rect = camera.rect(self.current_pixel_pos.x, self.current_pixel_pos.y, self.tile_size, self.tile_size)
             pygame.draw.ellipse(screen, (0, 255, 0), rect, 2)
\ No newline at end of file
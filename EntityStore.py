@@ -0,0 +1,190 @@
+import pygame
+
+try:
+    import numpy as np
+except ImportError: # Web builds without numpy keep plain per-object attributes
+    np = None
+
+HAS_NUMPY = np is not None
+
+# --- Column Layout ---
+# name -> (width, dtype); width 1 = scalar, 2 = x/y pair. Units map their
+# attributes onto these through a STORE_FIELDS dict, e.g. {"current_pixel_pos": "pos"}.
+DEFAULT_COLUMNS = {
+    "pos": (2, float),
+    "prev_pos": (2, float), # pos before the last simulation step, for interpolated drawing
+    "target": (2, float),
+    "speed": (1, float),
+    "health": (1, int),
+    "cooldown": (1, float),
+    # Enemy march state (see Enemy.update_all)
+    "anim_timer": (1, float),
+    "anim_speed": (1, float),
+    "anim_frame": (1, int),
+    "frame_count": (1, int),
+    "attack_timer": (1, float),
+    "attack_cooldown": (1, float),
+    "damage": (1, int),
+    "speed_mult": (1, float),
+    "facing_right": (1, bool),
+}
+
+
+# --- Attribute View ---
+class StoreField:
+    """Data descriptor that reads/writes an EntityStore row once the owner is bound.
+    Unbound objects keep the value in their own __dict__ under the same name, so
+    installing the descriptor on a class never breaks existing instances."""
+    def __init__(self, name, column):
+        self.name = name
+        self.column = column
+
+    def __get__(self, obj, owner=None):
+        if obj is None: return self
+        store = obj.__dict__.get("_store")
+        if store is None:
+            return obj.__dict__[self.name]
+        col = store.columns[self.column]
+        eid = obj.__dict__["_eid"]
+        if store.widths[self.column] == 2:
+            return pygame.Vector2(col.item(eid, 0), col.item(eid, 1))
+        return col.item(eid)
+
+    def __set__(self, obj, value):
+        store = obj.__dict__.get("_store")
+        if store is None:
+            obj.__dict__[self.name] = value
+            return
+        col = store.columns[self.column]
+        eid = obj.__dict__["_eid"]
+        if store.widths[self.column] == 2:
+            col[eid, 0] = value[0]
+            col[eid, 1] = value[1]
+        else:
+            col[eid] = value
+
+
+# --- Struct-of-Arrays Entity Store ---
+class EntityStore:
+    """Contiguous NumPy columns for unit state, indexed by entity id.
+    Bound units become thin views over their row, so draw() and MenuUI keep
+    reading the same attributes while bulk passes run over whole columns."""
+    def __init__(self, capacity=256):
+        if np is None:
+            raise RuntimeError("EntityStore requires numpy")
+        self.capacity = capacity
+        self.columns = {}
+        self.widths = {}
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.size = np.zeros(capacity) # tile size of each row, used for clamping
+        self.generation = np.zeros(capacity, dtype=np.int64)
+        self.kind = np.zeros(capacity, dtype=np.int64) # small int per unit class
+        self.kinds = {}
+        self.owners = [None] * capacity
+        self.high_water = 0
+        self._free = []
+        for name, (width, dtype) in DEFAULT_COLUMNS.items():
+            self.add_column(name, width, dtype)
+
+    def add_column(self, name, width=1, dtype=float):
+        if name in self.columns: return self.columns[name]
+        shape = (self.capacity, 2) if width == 2 else (self.capacity,)
+        self.columns[name] = np.zeros(shape, dtype=dtype)
+        self.widths[name] = width
+        return self.columns[name]
+
+    def _grow(self):
+        new_capacity = self.capacity * 2
+        for name, col in self.columns.items():
+            grown = np.zeros((new_capacity,) + col.shape[1:], dtype=col.dtype)
+            grown[:self.capacity] = col
+            self.columns[name] = grown
+        for attr in ("alive", "size", "generation", "kind"):
+            col = getattr(self, attr)
+            grown = np.zeros(new_capacity, dtype=col.dtype)
+            grown[:self.capacity] = col
+            setattr(self, attr, grown)
+        self.owners.extend([None] * (new_capacity - self.capacity))
+        self.capacity = new_capacity
+
+    @staticmethod
+    def _install_views(cls):
+        if cls.__dict__.get("_store_views_installed"): return
+        for attr, column in cls.STORE_FIELDS.items():
+            setattr(cls, attr, StoreField(attr, column))
+        cls._store_views_installed = True
+
+    def bind(self, unit):
+        """Moves the unit's STORE_FIELDS into a free row and returns its entity id."""
+        if unit.__dict__.get("_store") is self: return unit._eid
+        cls = type(unit)
+        self._install_views(cls)
+        if self._free:
+            eid = self._free.pop()
+        else:
+            if self.high_water >= self.capacity:
+                self._grow()
+            eid = self.high_water
+            self.high_water += 1
+
+        for attr, column in cls.STORE_FIELDS.items():
+            if column not in self.columns:
+                self.add_column(column)
+            value = unit.__dict__.pop(attr)
+            col = self.columns[column]
+            if self.widths[column] == 2:
+                col[eid, 0] = value[0]
+                col[eid, 1] = value[1]
+            else:
+                col[eid] = value
+        self.columns["prev_pos"][eid] = self.columns["pos"][eid]
+        self.alive[eid] = True
+        self.size[eid] = getattr(unit, "tile_size", 0)
+        self.kind[eid] = self.kinds.setdefault(cls, len(self.kinds) + 1)
+        self.owners[eid] = unit
+        unit.__dict__["_store"] = self
+        unit.__dict__["_eid"] = eid
+        return eid
+
+    def unbind(self, unit):
+        """Copies the row back onto the unit and frees it. The unit keeps working unbound."""
+        if unit.__dict__.get("_store") is not self: return
+        eid = unit._eid
+        values = {attr: getattr(unit, attr) for attr in type(unit).STORE_FIELDS}
+        unit.__dict__["_store"] = None
+        unit.__dict__.update(values)
+        self.alive[eid] = False
+        self.generation[eid] += 1
+        self.owners[eid] = None
+        self._free.append(eid)
+
+    def clear(self):
+        for unit in self.owners[:self.high_water]:
+            if unit is not None:
+                self.unbind(unit)
+        self._free = []
+        self.high_water = 0
+
+    def ids(self, units=None):
+        """Entity ids of the given units (all live rows if None) as an index array."""
+        if units is None:
+            return np.flatnonzero(self.alive[:self.high_water])
+        return np.fromiter((u._eid for u in units), dtype=np.intp, count=len(units))
+
+    def ids_of(self, cls):
+        """Entity ids of every live row bound from instances of cls."""
+        code = self.kinds.get(cls)
+        if code is None: return np.zeros(0, dtype=np.intp)
+        hw = self.high_water
+        return np.flatnonzero(self.alive[:hw] & (self.kind[:hw] == code))
+
+    # --- Bulk Passes ---
+    def save_previous(self):
+        hw = self.high_water
+        self.columns["prev_pos"][:hw] = self.columns["pos"][:hw]
+
+    def tick_cooldowns(self, dt, ids=None):
+        if ids is None: ids = self.ids()
+        cd = self.columns["cooldown"]
+        running = ids[cd[ids] > 0]
+        cd[running] -= dt
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import struct
+import zlib
+import pygame
+import AssetBundle
+
+# ---------------- CONFIG ----------------
+CACHE_VERSION = 1 # Bump when processing changes in a way the key parts do not capture
+INDEX_FILE = "sources.json"
+ENTRY_SUFFIX = ".frames"
+# What reading a corrupt or foreign entry can raise: bad JSON header or pixel size
+# (ValueError), missing header fields, truncated data, bad zlib stream, bad surface
+CORRUPT_ENTRY_ERRORS = (ValueError, KeyError, struct.error, zlib.error, pygame.error)
+
+
+# --- Frame Cache ---
+class FrameCache:
+    """Content-addressed disk cache of processed frames (scaled, cropped, ...). An entry's
+    key is a hash of the source file's content plus whatever describes the processing
+    (slice rect, target size, steps), so a changed image or setting simply misses.
+    Entries use the bundle format (see AssetBundle). Source hashes are remembered by
+    path, size and mtime, so unchanged files are not re-read. When the directory grows
+    past max_bytes the least recently used entries go first. A corrupt entry is deleted
+    and counts as a miss. Any I/O error on writing turns the cache into a no-op
+    (read-only or web file systems). Newly hashed sources are remembered in memory;
+    flush() writes them out once loading is done."""
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._sources = None # path -> [size, mtime_ns, sha1]
+        self._sources_changed = False
+
+    # --- Keys ---
+    def source_hash(self, path):
+        if self._sources is None: self._sources = self._read_index()
+        stat = os.stat(path)
+        known = self._sources.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self._sources[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._sources_changed = True
+        return digest
+
+    def key(self, path, *parts):
+        """Key for what was made from the file at path; parts describe how (JSON-able)."""
+        description = json.dumps([CACHE_VERSION, self.source_hash(path), parts], separators=(",", ":"))
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def derive(self, key, *parts):
+        """Key for something made from the entry under key."""
+        return hashlib.sha1(json.dumps([key, parts], separators=(",", ":")).encode()).hexdigest()
+
+    # --- Entries ---
+    def get(self, key):
+        """The list of Surfaces stored under key, or None."""
+        if not self.enabled: return None
+        path = os.path.join(self.directory, key + ENTRY_SUFFIX)
+        try:
+            bundle = AssetBundle.read(path)
+            if bundle is None:
+                if os.path.exists(path): self._discard(path) # Not a bundle (wrong magic)
+                return None
+            os.utime(path) # Recently used
+        except OSError:
+            return None
+        except CORRUPT_ENTRY_ERRORS as e:
+            print(f"WARNING: Discarding corrupt frame cache entry {key}: {e}")
+            self._discard(path)
+            return None
+        return bundle[1]
+
+    def put(self, key, surfaces):
+        if not self.enabled: return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            AssetBundle.write(os.path.join(self.directory, key + ENTRY_SUFFIX), surfaces, {})
+            self._evict()
+        except OSError as e:
+            print(f"WARNING: Frame cache disabled: {e}")
+            self.enabled = False
+
+    def cached(self, key, build):
+        """Surfaces under key; on a miss build() makes them and they are stored."""
+        surfaces = self.get(key)
+        if surfaces is None:
+            surfaces = build()
+            self.put(key, surfaces)
+        return surfaces
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes: break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    # --- Source Index ---
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def flush(self):
+        """Writes the source hashes learned since the last flush."""
+        if self._sources_changed:
+            self._sources_changed = False
+            self._write_index()
+
+    def _write_index(self):
+        if not self.enabled: return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, INDEX_FILE), "w") as f:
+                json.dump(self._sources, f)
+        except OSError:
+            self.enabled = False
@@ -0,0 +1,169 @@
+import argparse
+import copy
+import random
+import time
+import Assets
+from main import ROWS, COLUMNS, TILE_SIZE, SIM_TICK_RATE, USE_ENTITY_STORE, STORE_DEFENDERS, USE_PROJECTILE_POOL, TARGET_INDEX_CELL_SIZE
+from Simulation import Simulation, STAGE_DATA
+
+# ---------------- CONFIG ----------------
+DEFAULT_ARMY = {"McUncle": 2, "Dracula": 2, "Bob": 1}
+MAX_GAME_MINUTES = 120 # Safety stop for campaigns that neither win nor lose
+
+_stand_ins_loaded = False
+
+
+# --- Headless Campaign Runner ---
+# Plays the stage/wave loop of main.py with no window and no sprite files, as fast
+# as the CPU allows. Masks come from Assets.load_hitbox_stand_ins(), so structures
+# collide by bounding box instead of per pixel.
+def _ensure_stand_ins():
+    global _stand_ins_loaded
+    if not _stand_ins_loaded:
+        Assets.load_hitbox_stand_ins(TILE_SIZE)
+        _stand_ins_loaded = True
+
+def scale_stage_data(hp_scale=1.0, count_scale=1.0, time_scale=1.0, stage_data=None):
+    """Copy of STAGE_DATA with enemy health bonus, wave size and wait times scaled."""
+    scaled = copy.deepcopy(stage_data or STAGE_DATA)
+    for conf in scaled.values():
+        conf["hp_add"] = int(round(conf["hp_add"] * hp_scale))
+        conf["wave_enemies"] = max(1, int(round(conf["wave_enemies"] * count_scale)))
+        conf["base_time"] = conf["base_time"] * time_scale
+        conf["dec"] = conf["dec"] * time_scale
+    return scaled
+
+def _free_windmill_spots(sim):
+    spots = []
+    for r in range(sim.rows - 1):
+        for c in range(sim.columns - 1):
+            tiles = [(r, c), (r + 1, c), (r, c + 1), (r + 1, c + 1)]
+            if all(t not in sim.castle_occupied and sim.is_spot_free(*t) for t in tiles):
+                spots.append((r, c))
+    return spots
+
+def _auto_build(sim, windmills):
+    """Builds windmills on random free 2x2 spots while cheese allows, up to the target count."""
+    while len(sim.windmills) < windmills and sim.cheese_count >= sim.next_windmill_cost:
+        spots = _free_windmill_spots(sim)
+        if not spots: return
+        r, c = random.choice(spots)
+        sim.build_windmill(r, c)
+
+def run_campaign(seed=None, army=None, train=None, windmills=0, stage_data=None, skip_waits=False,
+                 survival_waves=0, tick_rate=SIM_TICK_RATE, max_game_minutes=MAX_GAME_MINUTES, verbose=False):
+    """Plays one campaign until game over, victory (or survival_waves more waves after it)
+    or the time limit, and returns a summary dict.
+    army: {unit name: count} spawned at the castle on the first tick.
+    train: unit name kept on infinite production (paid from cheese, as in the game).
+    windmills: how many windmills to build whenever cheese allows.
+    skip_waits: press the skip button whenever the next wave is on a timer.
+    The "stages" entry lists castle health and cheese income at the end of every
+    stage and survival wave that was reached."""
+    _ensure_stand_ins()
+    if seed is not None: random.seed(seed)
+    sim = Simulation(ROWS, COLUMNS, TILE_SIZE, use_entity_store=USE_ENTITY_STORE, store_defenders=STORE_DEFENDERS,
+                     use_projectile_pool=USE_PROJECTILE_POOL, target_index_cell_size=TARGET_INDEX_CELL_SIZE,
+                     stage_data=stage_data, verbose=verbose)
+
+    for name, count in (DEFAULT_ARMY if army is None else army).items():
+        for _ in range(count):
+            sim.castle._spawn_unit(name)
+    if train: sim.castle.infinite_production = train
+
+    dt = 1.0 / tick_rate
+    max_ticks = int(max_game_minutes * 60 * tick_rate)
+    stages = []
+    stage_key = 1
+    stage_cheese = 0
+    def close_stage(key):
+        stages.append({"stage": key, "castle_health": sim.castle.health,
+                       "cheese_earned": sim.cheese_earned - stage_cheese, "game_seconds": sim.tick * dt})
+
+    start = time.perf_counter()
+    while not sim.game_over and sim.tick < max_ticks:
+        if sim.victory_screen:
+            if not survival_waves: break
+            # Same as the "Continue" button on the victory popup
+            sim.victory_screen = False
+            sim.survival_mode = True
+            sim.game_timer = 0.1
+        if windmills: _auto_build(sim, windmills)
+        if skip_waits and not sim.enemies_attacking and not sim.waiting_for_next_stage:
+            sim.game_timer = 0
+        sim.step(dt)
+
+        if sim.victory_screen:
+            close_stage(stage_key)
+            stage_key = "S1"
+            stage_cheese = sim.cheese_earned
+            continue
+        key = f"S{sim.survival_wave}" if sim.survival_mode else sim.stage_number
+        if key != stage_key:
+            close_stage(stage_key)
+            stage_key = key
+            stage_cheese = sim.cheese_earned
+            if sim.survival_mode and sim.survival_wave > survival_waves: break
+    if sim.game_over: close_stage(stage_key)
+
+    return {
+        "seed": seed,
+        "map_seed": sim.seed,
+        "victory": sim.victory_screen or sim.survival_mode,
+        "game_over": sim.game_over,
+        "stage": sim.stage_number,
+        "wave": sim.wave_in_stage,
+        "survival_wave": sim.survival_wave if sim.survival_mode else 0,
+        "castle_health": sim.castle.health,
+        "enemies_killed": sim.enemies_killed,
+        "units": len(sim.mcuncles) + len(sim.hamsters),
+        "cheese": sim.cheese_count,
+        "cheese_earned": sim.cheese_earned,
+        "stages": stages,
+        "game_seconds": sim.tick * dt,
+        "wall_seconds": time.perf_counter() - start,
+    }
+
+def format_result(result):
+    outcome = "VICTORY" if result["victory"] else ("GAME OVER" if result["game_over"] else "TIME LIMIT")
+    return (f"seed {result['seed']} (map {result['map_seed']}): {outcome} at stage {result['stage']} wave {result['wave']} | "
+            f"castle {result['castle_health']} | kills {result['enemies_killed']} | units {result['units']} | "
+            f"{result['game_seconds']:.0f}s game in {result['wall_seconds']:.2f}s")
+
+
+def _parse_army(text):
+    army = {}
+    for part in text.split(","):
+        if not part.strip(): continue
+        name, _, count = part.partition("=")
+        army[name.strip()] = int(count or 1)
+    return army
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Hamster Path Defense campaigns without a window.")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None, help="seed of the first run; later runs use seed+1, seed+2, ...")
+    parser.add_argument("--army", type=_parse_army, default=None, help='starting units, e.g. "McUncle=2,Dracula=3"')
+    parser.add_argument("--train", default=None, help="unit kept on infinite production")
+    parser.add_argument("--windmills", type=int, default=0, help="windmills to build whenever cheese allows")
+    parser.add_argument("--hp-scale", type=float, nargs="+", default=[1.0], help="sweep: multipliers for STAGE_DATA hp_add")
+    parser.add_argument("--count-scale", type=float, default=1.0)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--skip-waits", action="store_true")
+    parser.add_argument("--tick-rate", type=int, default=SIM_TICK_RATE)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    for hp_scale in args.hp_scale:
+        stage_data = scale_stage_data(hp_scale, args.count_scale, args.time_scale)
+        wins = 0
+        for i in range(args.runs):
+            seed = None if args.seed is None else args.seed + i
+            result = run_campaign(seed, args.army, args.train, args.windmills, stage_data, args.skip_waits,
+                                  tick_rate=args.tick_rate, verbose=args.verbose)
+            wins += result["victory"]
+            print(f"[hp x{hp_scale:g}] {format_result(result)}")
+        print(f"[hp x{hp_scale:g}] {wins}/{args.runs} victories")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import heapq
+import math
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError: # Only FlowField.headings() needs it
+    np = None
+
+# ---------------- CONFIG ----------------
+MAX_CACHED_FIELDS = 32 # Flow fields kept per Pathfinder, one per destination tile (least recently used goes first)
+INCREMENTAL_REPAIR = True # Repair cached flow fields around changed tiles instead of searching again
+DIAGONAL_COST = math.sqrt(2)
+INF = float("inf")
+UNKNOWN = -2 # headings() cache slot not worked out yet
+EPSILON = 1e-9 # Cost comparisons (diagonal costs make sums inexact)
+
+# (dr, dc, cost); diagonals last so straight moves win ties
+NEIGHBOURS = ((-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
+              (-1, -1, DIAGONAL_COST), (-1, 1, DIAGONAL_COST), (1, -1, DIAGONAL_COST), (1, 1, DIAGONAL_COST))
+
+
+# --- Flow Field ---
+class FlowField:
+    """Walking cost from every tile of the grid to the nearest goal tile (Dijkstra over
+    8 neighbours; diagonal steps may not cut a blocked corner). Any number of units
+    heading for the goals share one field: next_tile() and in_sight() are memoised
+    lookups, not searches. A field goes stale when the obstacles change; refreshed()
+    then gives the current one."""
+    def __init__(self, pathfinder, goals):
+        self.pathfinder = pathfinder
+        self.goals = goals
+        self.revision = pathfinder.revision
+        self.dist = pathfinder._costs_to(goals) # Flat, index r * columns + c
+        rows = [r for r, _ in goals]
+        cols = [c for _, c in goals]
+        self.target = ((min(rows) + max(rows) + 1) / 2, (min(cols) + max(cols) + 1) / 2) # Middle of the goals, in tiles
+        self._goal_set = set(goals)
+        self._next = {} # (r, c) -> next tile, filled as units ask
+        self._sight = {} # (r, c) -> in_sight()
+        self._headings = None # numpy cache for headings(), filled as units ask
+
+    def distance(self, r, c):
+        pf = self.pathfinder
+        if 0 <= r < pf.rows and 0 <= c < pf.columns: return self.dist[r * pf.columns + c]
+        return INF
+
+    def next_tile(self, r, c):
+        """The neighbour one step closer to the goal, or None (at the goal, unreachable or off the grid).
+        From a blocked tile it is the cheapest free neighbour, so units pushed onto one step off it."""
+        key = (r, c)
+        if key in self._next: return self._next[key]
+        pf = self.pathfinder
+        best, best_cost = None, self.distance(r, c)
+        if 0 <= r < pf.rows and 0 <= c < pf.columns:
+            for dr, dc, _ in pf.steps_from(r, c):
+                cost = self.dist[(r + dr) * pf.columns + c + dc]
+                if cost < best_cost: best, best_cost = (r + dr, c + dc), cost
+        self._next[key] = best
+        return best
+
+    def in_sight(self, r, c):
+        """True when the straight line from the centre of tile (r, c) to the middle of the
+        goals crosses no blocked tile, so a unit there can walk straight instead of
+        following the field tile by tile. Every tile the line touches is visited (grid
+        traversal); passing exactly through a corner counts as blocked when either tile
+        beside it is, like a diagonal step in steps_from."""
+        start = key = (r, c)
+        sight = self._sight.get(start)
+        if sight is not None: return sight
+        pf = self.pathfinder
+        goals = self._goal_set
+        dy, dx = self.target[0] - (r + 0.5), self.target[1] - (c + 0.5)
+        step_r, step_c = (1 if dy > 0 else -1), (1 if dx > 0 else -1)
+        t_dr = abs(1 / dy) if dy else INF # Line parameter (0..1) per tile crossed
+        t_dc = abs(1 / dx) if dx else INF
+        t_r, t_c = 0.5 * t_dr, 0.5 * t_dc # Next row / column boundary, from a tile centre
+        sight = True
+        while key not in goals and min(t_r, t_c) <= 1 + EPSILON:
+            r, c = key
+            if abs(t_r - t_c) < EPSILON: # Through a corner
+                beside = ((r + step_r, c), (r, c + step_c))
+                if beside[0] in goals or beside[1] in goals: break
+                if pf.is_blocked(*beside[0]) or pf.is_blocked(*beside[1]):
+                    sight = False
+                    break
+                key = (r + step_r, c + step_c)
+                t_r += t_dr
+                t_c += t_dc
+            elif t_r < t_c:
+                key = (r + step_r, c)
+                t_r += t_dr
+            else:
+                key = (r, c + step_c)
+                t_c += t_dc
+            if key not in goals and pf.is_blocked(*key):
+                sight = False
+                break
+        self._sight[start] = sight
+        return sight
+
+    def heading(self, r, c):
+        """Tile to walk at from (r, c): the next tile of the field, or None to go straight for the goal."""
+        if self.in_sight(r, c): return None
+        return self.next_tile(r, c)
+
+    def headings(self, tiles):
+        """heading() for a numpy array of flat tile indices (r * columns + c), as flat
+        indices with -1 for straight ahead. Each tile is worked out once per field."""
+        if self._headings is None: self._headings = np.full(len(self.dist), UNKNOWN, dtype=np.int64)
+        found = self._headings[tiles]
+        unknown = found == UNKNOWN
+        if unknown.any():
+            columns = self.pathfinder.columns
+            for tile in np.unique(tiles[unknown]).tolist():
+                heading = self.heading(*divmod(tile, columns))
+                self._headings[tile] = -1 if heading is None else heading[0] * columns + heading[1]
+            found = self._headings[tiles]
+        return found
+
+    def _repair(self, raised, lowered):
+        """Localised Dijkstra after tiles were blocked (raised) or freed (lowered); the
+        pathfinder's grid is already the new one. A tile loses its cost only if every
+        neighbour it could have got that cost from lost its own (or the step between them
+        is gone), checked in order of the old costs. The lost ones are refilled from
+        their surviving neighbours, freed tiles from theirs, and only that region is
+        relaxed again."""
+        pf = self.pathfinder
+        columns = pf.columns
+        dist = self.dist
+
+        # Tiles whose cost depended on a raised tile or on a diagonal it now cuts off
+        affected = set()
+        decided = set()
+        candidates = []
+        for r, c in raised:
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    rr, cc = r + dr, c + dc
+                    if 0 <= rr < pf.rows and 0 <= cc < columns:
+                        heapq.heappush(candidates, (dist[rr * columns + cc], rr, cc))
+        while candidates:
+            d, r, c = heapq.heappop(candidates)
+            i = r * columns + c
+            if i in decided or d == 0.0 or d == INF: continue # Goals and unreachable tiles keep theirs
+            decided.add(i)
+            if not pf.blocked[i]:
+                supported = False
+                for dr, dc, cost in self._parent_steps(r, c):
+                    j = (r + dr) * columns + c + dc
+                    if j not in affected and abs(dist[j] + cost - d) < EPSILON:
+                        supported = True
+                        break
+                if supported: continue
+            affected.add(i)
+            for dr, dc, cost in pf.steps_from(r, c):
+                j = (r + dr) * columns + c + dc
+                if abs(dist[j] - d - cost) < EPSILON: heapq.heappush(candidates, (dist[j], r + dr, c + dc))
+
+        # Refill from the edge of the affected region and around freed tiles
+        for i in affected: dist[i] = INF
+        heap = []
+        for i in affected:
+            r, c = divmod(i, columns)
+            if pf.blocked[i]: continue
+            best = INF
+            for dr, dc, cost in self._parent_steps(r, c):
+                best = min(best, dist[(r + dr) * columns + c + dc] + cost)
+            if best < INF:
+                dist[i] = best
+                heap.append((best, r, c))
+        for r, c in lowered:
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    rr, cc = r + dr, c + dc
+                    if 0 <= rr < pf.rows and 0 <= cc < columns and dist[rr * columns + cc] < INF:
+                        heap.append((dist[rr * columns + cc], rr, cc))
+        heapq.heapify(heap)
+        pf._relax(dist, heap)
+
+        self._next.clear()
+        self._sight.clear()
+        self._headings = None
+        return len(affected)
+
+    def _parent_steps(self, r, c):
+        """Steps from (r, c) to the neighbours its cost can come from: free tiles, and goals even when blocked."""
+        pf = self.pathfinder
+        steps = pf.steps_from(r, c)
+        for dr, dc, cost in NEIGHBOURS:
+            if (r + dr, c + dc) in self._goal_set and pf.is_blocked(r + dr, c + dc):
+                if dr and dc and (pf.is_blocked(r + dr, c) or pf.is_blocked(r, c + dc)): continue
+                steps.append((dr, dc, cost))
+        return steps
+
+    @property
+    def stale(self):
+        return self.revision != self.pathfinder.revision
+
+    def refreshed(self):
+        return self.pathfinder.field_toward(self.goals) if self.stale else self
+
+
+# --- Pathfinder ---
+class Pathfinder:
+    """Tile-grid navigation service. blocked_tiles() returns the set of tiles units must
+    walk around. Flow fields are cached per set of goal tiles, so a group ordered to one
+    spot, or every enemy marching on the castle, costs one search. After mark_dirty(coords)
+    the cached fields are repaired around coords on the next request (incremental), or
+    thrown away and searched again from scratch (incremental=False, or no coords)."""
+    def __init__(self, rows, columns, blocked_tiles, incremental=INCREMENTAL_REPAIR):
+        self.rows = rows
+        self.columns = columns
+        self.incremental = incremental
+        self.blocked = bytearray(rows * columns)
+        self._blocked_tiles = blocked_tiles
+        self._dirty = True
+        self._pending = set() # Tiles that may have changed since the fields were last repaired
+        self.revision = 0 # Bumped whenever the obstacles change; older fields are stale
+        self._fields = OrderedDict() # goals -> FlowField
+
+    def mark_dirty(self, coords=None):
+        """Obstacles changed at coords (or anywhere, when None): every field goes stale."""
+        if coords is None or not self.incremental: self._dirty = True
+        else: self._pending.update(coords)
+        self.revision += 1
+
+    def field_to(self, r, c):
+        """Shared flow field toward tile (r, c), clamped onto the grid."""
+        return self.field_toward([(r, c)])
+
+    def field_toward(self, goals):
+        """Shared flow field toward the nearest of several tiles (e.g. a structure's footprint)."""
+        if self._dirty: self._rebuild()
+        elif self._pending: self._repair()
+        key = tuple(sorted({(min(max(r, 0), self.rows - 1), min(max(c, 0), self.columns - 1)) for r, c in goals}))
+        field = self._fields.get(key)
+        if field is None:
+            field = self._fields[key] = FlowField(self, key)
+            while len(self._fields) > MAX_CACHED_FIELDS:
+                self._fields.popitem(last=False)
+        self._fields.move_to_end(key)
+        return field
+
+    def is_blocked(self, r, c):
+        return not (0 <= r < self.rows and 0 <= c < self.columns) or self.blocked[r * self.columns + c] == 1
+
+    def steps_from(self, r, c):
+        """(dr, dc, cost) of every legal step out of (r, c)."""
+        steps = []
+        for dr, dc, cost in NEIGHBOURS:
+            if self.is_blocked(r + dr, c + dc): continue
+            if dr and dc and (self.is_blocked(r + dr, c) or self.is_blocked(r, c + dc)): continue
+            steps.append((dr, dc, cost))
+        return steps
+
+    def _rebuild(self):
+        self.blocked = bytearray(self.rows * self.columns)
+        for r, c in self._blocked_tiles():
+            if 0 <= r < self.rows and 0 <= c < self.columns: self.blocked[r * self.columns + c] = 1
+        self._pending.clear()
+        self._fields.clear()
+        self._dirty = False
+
+    def _repair(self):
+        """Applies the pending tiles to the grid and repairs every cached field in place."""
+        blocked = self._blocked_tiles()
+        raised, lowered = [], []
+        for r, c in self._pending:
+            if not (0 <= r < self.rows and 0 <= c < self.columns): continue
+            now = 1 if (r, c) in blocked else 0
+            if now != self.blocked[r * self.columns + c]:
+                self.blocked[r * self.columns + c] = now
+                (raised if now else lowered).append((r, c))
+        self._pending.clear()
+        for field in self._fields.values():
+            if raised or lowered: field._repair(raised, lowered)
+            field.revision = self.revision
+
+    def _costs_to(self, goals):
+        """Dijkstra outward from the goals. Goals may be blocked (units then walk up to them)."""
+        dist = [INF] * (self.rows * self.columns)
+        heap = []
+        for gr, gc in goals:
+            dist[gr * self.columns + gc] = 0.0
+            heap.append((0.0, gr, gc))
+        self._relax(dist, heap)
+        return dist
+
+    def _relax(self, dist, heap):
+        """Dijkstra main loop: lowers dist outward from the (cost, r, c) entries of heap."""
+        columns = self.columns
+        while heap:
+            d, r, c = heapq.heappop(heap)
+            if d > dist[r * columns + c]: continue
+            for dr, dc, cost in self.steps_from(r, c):
+                i = (r + dr) * columns + c + dc
+                nd = d + cost
+                if nd < dist[i]:
+                    dist[i] = nd
+                    heapq.heappush(heap, (nd, r + dr, c + dc))
@@ -0,0 +1,130 @@
+import collections
+import contextlib
+import csv
+import time
+import pygame
+
+# ---------------- CONFIG ----------------
+PHASES = ("events", "obstacles", "projectiles", "entities", "draw", "present")
+COUNTERS = ("steps", "enemies", "defenders", "projectiles")
+FRAME_BUDGET_MS = 1000.0 / 60
+HISTORY_FRAMES = 3600 # One minute at 60 FPS
+STATS_EVERY = 15 # Frames between percentile refreshes in the overlay
+SPARKLINE_FRAMES = 240
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+# --- Frame Profiler ---
+class FrameProfiler:
+    """Wall time per main-loop phase and entity counts per frame, kept in a ring buffer.
+    Phases are timed with start()/stop() or `with profiler.phase(name)`; a phase that runs
+    several times in one frame (one per simulation step) accumulates. Costs nothing while
+    disabled apart from the enabled check."""
+    def __init__(self, capacity=HISTORY_FRAMES):
+        self.enabled = False
+        self.frames = collections.deque(maxlen=capacity) # rows: [frame ms, phase ms..., counters...]
+        self.frame_index = 0
+        self._current = dict.fromkeys(PHASES, 0.0)
+        self._started = {}
+        self._frame_start = None
+        self._stats = {}
+        self._font = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self._frame_start = None
+
+    # --- Recording ---
+    def start(self, name):
+        if self.enabled: self._started[name] = time.perf_counter()
+
+    def stop(self, name):
+        if self.enabled and name in self._started:
+            self._current[name] += time.perf_counter() - self._started.pop(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[name] += time.perf_counter() - t0
+
+    def phase(self, name):
+        return self._timed(name) if self.enabled else _NO_PHASE
+
+    def begin_frame(self):
+        if not self.enabled: return
+        for name in self._current: self._current[name] = 0.0
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self, **counters):
+        if not self.enabled or self._frame_start is None: return
+        frame_ms = (time.perf_counter() - self._frame_start) * 1000.0
+        row = [self.frame_index, frame_ms] + [self._current[p] * 1000.0 for p in PHASES] + [counters.get(c, 0) for c in COUNTERS]
+        self.frames.append(row)
+        self.frame_index += 1
+        if self.frame_index % STATS_EVERY == 0:
+            self._stats = self.percentiles()
+
+    # --- Statistics ---
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """{column: [p50, p95, p99]} in ms over the ring buffer, for the frame total and each phase."""
+        stats = {}
+        if not self.frames: return stats
+        for col, name in enumerate(("frame",) + PHASES, start=1):
+            values = sorted(row[col] for row in self.frames)
+            last = len(values) - 1
+            stats[name] = [values[int(q * last)] for q in quantiles]
+        return stats
+
+    def dump_csv(self, path):
+        if not self.frames: return False
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", "frame_ms"] + [f"{p}_ms" for p in PHASES] + list(COUNTERS))
+            writer.writerows(self.frames)
+        return True
+
+    # --- Overlay ---
+    def draw(self, screen, pos=(10, 110)):
+        if not self.enabled: return
+        if self._font is None: self._font = pygame.font.Font(None, 20)
+        x, y = pos
+        line_h = 16
+        width = 300
+        rows = len(self._stats) + 3
+        panel = pygame.Surface((width, rows * line_h + 60), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        screen.blit(panel, (x - 5, y - 5))
+
+        header = self._font.render(f"{'ms':<12} p50    p95    p99", True, (255, 255, 0))
+        screen.blit(header, (x, y))
+        y += line_h
+        for name, (p50, p95, p99) in self._stats.items():
+            color = (255, 80, 80) if name == "frame" and p95 > FRAME_BUDGET_MS else (230, 230, 230)
+            txt = self._font.render(f"{name:<12} {p50:5.2f}  {p95:5.2f}  {p99:5.2f}", True, color)
+            screen.blit(txt, (x, y))
+            y += line_h
+        if self.frames:
+            last = self.frames[-1]
+            counts = "  ".join(f"{c} {v}" for c, v in zip(COUNTERS, last[2 + len(PHASES):]))
+            screen.blit(self._font.render(counts, True, (180, 220, 255)), (x, y))
+        y += line_h + 4
+        self._draw_sparkline(screen, pygame.Rect(x, y, width - 10, 40))
+
+    def _draw_sparkline(self, screen, rect):
+        """Frame time of the last SPARKLINE_FRAMES frames; the line marks the 60 FPS budget."""
+        pygame.draw.rect(screen, (60, 60, 60), rect, 1)
+        top_ms = FRAME_BUDGET_MS * 2
+        budget_y = rect.bottom - rect.height * (FRAME_BUDGET_MS / top_ms)
+        pygame.draw.line(screen, (255, 80, 80), (rect.left, budget_y), (rect.right, budget_y))
+        recent = list(self.frames)[-SPARKLINE_FRAMES:]
+        if len(recent) < 2: return
+        step = rect.width / (SPARKLINE_FRAMES - 1)
+        points = []
+        for i, row in enumerate(recent):
+            ms = min(row[1], top_ms)
+            points.append((rect.left + i * step, rect.bottom - rect.height * (ms / top_ms)))
+        pygame.draw.lines(screen, (0, 255, 120), False, points)
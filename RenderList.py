@@ -0,0 +1,71 @@
+from operator import attrgetter
+
+STATIC_RANK = 1 << 60 # Statics sort after every sprite with the same bottom edge, as they always did
+
+_by_key = attrgetter("key")
+
+
+class RenderEntry:
+    """One item of the y-sorted layer. key = (bottom_y, rank); draw(screen, camera) renders it.
+    tile is (r, c) for static tiles, None for sprites."""
+    __slots__ = ("key", "rank", "item", "draw", "tile", "visible")
+
+    def __init__(self, item, draw, key=(0.0, 0), tile=None):
+        self.item = item
+        self.draw = draw
+        self.key = key
+        self.rank = key[1]
+        self.tile = tile
+        self.visible = True
+
+
+def _draw_callable(item):
+    # Structures have a separate ground/UI pass, so their y-sorted part is draw_structure
+    draw_structure = getattr(item, "draw_structure", None)
+    return draw_structure if draw_structure is not None else item.draw
+
+
+# --- Render List ---
+class RenderList:
+    """Depth-ordered (back to front) entries for the y-sorted layer, kept between frames.
+    Sprites get an entry when they first show up and lose it once they are gone; static
+    tiles are inserted once per static layer revision. Each frame only the sprite keys
+    are updated in place before re-sorting: between two frames units barely change
+    order, and list.sort is adaptive (a nearly sorted list costs about one pass), so it
+    does the insertion-sort work in C.
+    Ties go by group, then by arrival within the group, the order the sprites were
+    listed in when the list was rebuilt every frame."""
+    def __init__(self):
+        self.entries = []
+        self.static_revision = None
+        self._sprites = {} # id(item) -> RenderEntry; the entry keeps item alive, so ids stay unique
+        self._arrivals = 0
+
+    def set_statics(self, statics, revision):
+        """statics: (key, item, draw, tile) for every static tile that can be y-sorted."""
+        self.entries = [e for e in self.entries if e.tile is None]
+        self.entries.extend(RenderEntry(item, draw, key, tile) for key, item, draw, tile in statics)
+        self.static_revision = revision
+
+    def refresh(self, groups):
+        """groups: lists of sprites (castle, windmills, units...), in tie-break order."""
+        sprites = self._sprites
+        live = [dict(zip(map(id, items), items)) for items in groups]
+        total = sum(map(len, live))
+        for group, items in enumerate(live):
+            new = items.keys() - sprites.keys()
+            if not new: continue
+            for key, item in items.items(): # Dict order is list order, so arrivals keep it
+                if key in new:
+                    self._arrivals += 1
+                    entry = sprites[key] = RenderEntry(item, _draw_callable(item), (0.0, (group << 32) + self._arrivals))
+                    self.entries.append(entry)
+        if len(sprites) > total: # Something left since the last frame
+            alive = set().union(*live)
+            for key in sprites.keys() - alive: del sprites[key]
+            self.entries = [e for e in self.entries if e.tile is not None or id(e.item) in alive]
+
+        for entry in sprites.values():
+            entry.key = (entry.item.get_bottom_y(), entry.rank)
+        self.entries.sort(key=_by_key)
+        return self.entries
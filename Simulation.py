@@ -0,0 +1,443 @@
+import random
+import contextlib
+import pygame
+from Entities import Llama, McUncle, Enemy, ProjectilePool, Castle, Windmill, CASTLE_HITBOX_WIDTH_TILES, CASTLE_HITBOX_HEIGHT_TILES, SEPARATION_RADIUS
+from Spatial import SpatialHash, CollisionMap
+from Pathfinding import Pathfinder
+from EntityStore import EntityStore, HAS_NUMPY
+
+# Stage Configuration
+STAGE_DATA = {
+    1: {"wave_enemies": 5,  "hp_add": 0,  "base_time": 250.0, "dec": 0},
+    2: {"wave_enemies": 5,  "hp_add": 20, "base_time": 250.0, "dec": 50.0},
+    3: {"wave_enemies": 10, "hp_add": 30,  "base_time": 200.0, "dec": 50.0},
+    4: {"wave_enemies": 15, "hp_add": 40,  "base_time": 200.0, "dec": 50.0},
+    5: {"wave_enemies": 15, "hp_add": 50,  "base_time": 150.0, "dec": 50.0},
+    6: {"wave_enemies": 20, "hp_add": 60,  "base_time": 150.0, "dec": 50.0},
+    7: {"wave_enemies": 20, "hp_add": 70,  "base_time": 100.0, "dec": 50.0},
+    8: {"wave_enemies": 25, "hp_add": 80,  "base_time": 100.0, "dec": 50.0},
+    9: {"wave_enemies": 30, "hp_add": 90,  "base_time": 50.0,  "dec": 10.0},
+    10:{"wave_enemies": 30, "hp_add": 100,  "base_time": 50.0,  "dec": 10.0},
+}
+
+_NO_PHASE = contextlib.nullcontext()
+
+# Castle prices used by infinite production
+UNIT_PRICES = {"McUncle": 30, "Bob": 5, "Dracula": 15, "TheHamster": 10}
+
+
+# --- Game Simulation ---
+class Simulation:
+    """Everything that changes over game time: units, the castle, stage/wave flow and cheese.
+    step(dt) advances it by one fixed tick. Nothing here draws or reads input, so main.py
+    drives it from an accumulator and renders in between."""
+    def __init__(self, rows, columns, tile_size, use_entity_store=True, store_defenders=False,
+                 use_projectile_pool=True, target_index_cell_size=None, stage_data=None, verbose=True):
+        self.rows = rows
+        self.columns = columns
+        self.tile_size = tile_size
+        self.store_defenders = store_defenders
+        self.stage_data = stage_data or STAGE_DATA
+        self.verbose = verbose
+        self.entity_store = EntityStore() if use_entity_store and HAS_NUMPY else None
+        self.use_projectile_pool = use_projectile_pool and HAS_NUMPY
+        self.friend_grid = SpatialHash(SEPARATION_RADIUS) # Rebuilt every tick for unit separation
+        self.enemy_index = SpatialHash(target_index_cell_size or tile_size * 2) # Enemy centers, rebuilt every tick for targeting
+        self.collision_map = CollisionMap(columns * tile_size, rows * tile_size) # Pixels the castle and windmills block
+        self.pathfinder = Pathfinder(rows, columns, self.nav_blocked_tiles) # Flow fields for player move orders
+        self.projectiles = ProjectilePool(store=self.entity_store) if self.use_projectile_pool else []
+        self._previous = [] # (unit, position before the last step) for interpolated drawing
+        self.profiler = None # Profiler.FrameProfiler timing the tick phases, if any
+        self.new_game()
+
+    def new_game(self):
+        """Clears every unit and structure, places a new castle and generates a fresh map."""
+        if self.entity_store: self.entity_store.clear()
+        if isinstance(self.projectiles, ProjectilePool): self.projectiles.clear()
+        else: self.projectiles = []
+        self.player_placed_objects = []
+        self.windmills = []
+        self.llamas = []
+        self.mcuncles = []
+        self.hamsters = []
+        self.enemies = []
+        self._previous = []
+        self.static_dirty = None # Tiles whose ground/features/placed objects changed since the renderer last looked; None = all
+
+        # Game Progress
+        self.cheese_count = 5
+        self.next_windmill_cost = 0
+        self.stage_number = 1
+        self.wave_in_stage = 1 # 1, 2, 3
+        self.survival_mode = False
+        self.survival_wave = 1
+        self.victory_screen = False
+        self.enemies_attacking = False
+        self.game_over = False
+        self.waiting_for_next_stage = False
+        self.stage_cooldown_timer = 0.0
+        self.game_timer = self.stage_data[1]["base_time"]
+        self.tick = 0
+        self.enemies_killed = 0
+        self.cheese_earned = 0 # Windmill production only, spending not subtracted
+
+        castle_c = max(0, self.columns - CASTLE_HITBOX_WIDTH_TILES - 3)
+        max_r = max(CASTLE_HITBOX_HEIGHT_TILES, self.rows - CASTLE_HITBOX_HEIGHT_TILES - 2)
+        castle_r = random.randint(2, max_r)
+
+        self.castle = Castle((castle_r, castle_c), self.tile_size)
+        self.castle_occupied = set(self.castle.get_occupied_coords())
+        self.pathfinder.mark_dirty()
+        self.collision_map.mark_dirty()
+        self._castle_flow = None
+
+        self.map_data = self.generate_grass_map(self.castle_occupied)
+        self.seed = self.map_data["seed"]
+        self.grid = self.map_data["grid"]
+        self.features = self.map_data["features"]
+        self._log(f"Generated map. Seed: {self.seed}")
+
+        self.spawn_entities()
+
+    def _log(self, message):
+        if self.verbose: print(message)
+
+    # --- Map Generation Helpers ---
+    def generate_random_features(self, grid, exclusion_coords):
+        features = []
+        return features
+
+    def generate_grass_map(self, extra_exclusions=None):
+        grid_local = [["grass" for _ in range(self.columns)] for _ in range(self.rows)]
+        seed_local = random.randint(100000, 999999)
+        random.seed(seed_local)
+
+        exclusion_coords = set()
+        for _, r, c in self.player_placed_objects:
+            exclusion_coords.add((r,c))
+        for w in self.windmills:
+            exclusion_coords.update(w.get_occupied_coords())
+
+        if extra_exclusions:
+            exclusion_coords.update(extra_exclusions)
+
+        features_local = self.generate_random_features(grid_local, exclusion_coords)
+
+        return {
+            "grid": grid_local,
+            "features": features_local,
+            "seed": seed_local
+        }
+
+    # --- Spawning Helpers ---
+    def spawn_entities(self):
+        self.llamas.clear()
+
+        walkable_coords = []
+        occupied = set([(r,c) for _, r, c in self.features])
+        for _, r, c in self.player_placed_objects: occupied.add((r,c))
+        for w in self.windmills: occupied.update(w.get_occupied_coords())
+        occupied.update(self.castle_occupied)
+
+        for r in range(self.rows):
+            for c in range(self.columns):
+                if self.grid[r][c] == "grass" and (r,c) not in occupied:
+                    walkable_coords.append((r,c))
+
+        if walkable_coords:
+            for _ in range(3):
+                start_r, start_c = random.choice(walkable_coords)
+                self.llamas.append(Llama((start_r, start_c), self.tile_size, self.grid, walkable_coords, self.llamas))
+
+    def spawn_enemy_wave(self, count=10, hp_add=0):
+        spawn_candidates = []
+        for r in range(self.rows):
+            if self.grid[r][0] == "grass":
+                spawn_candidates.append((r, 0))
+
+        if not spawn_candidates:
+            spawn_candidates = [(r, 0) for r in range(self.rows)]
+
+        for _ in range(count):
+            start_pos = random.choice(spawn_candidates)
+            # Pass extra health to Enemy constructor
+            new_enemy = Enemy(start_pos, self.tile_size, extra_health=hp_add)
+            if self.entity_store: self.entity_store.bind(new_enemy)
+            self.enemies.append(new_enemy)
+        self._log(f"Spawned wave of {count} enemies (HP +{hp_add}) from the left!")
+
+    def remove_units(self, units):
+        """Takes player units off the map (DELETE key)."""
+        for unit in units:
+            if self.entity_store: self.entity_store.unbind(unit)
+            if unit in self.mcuncles:
+                self.mcuncles.remove(unit)
+            elif unit in self.hamsters:
+                self.hamsters.remove(unit)
+
+    # --- Building ---
+    def mark_static_dirty(self, coords):
+        if self.static_dirty is not None: self.static_dirty.update(coords)
+
+    def place_object(self, asset_type, r, c):
+        self.player_placed_objects.append((asset_type, r, c))
+        self.mark_static_dirty([(r, c)])
+        self.pathfinder.mark_dirty([(r, c)])
+
+    def remove_object(self, placed):
+        self.player_placed_objects.remove(placed)
+        self.mark_static_dirty([(placed[1], placed[2])])
+        self.pathfinder.mark_dirty([(placed[1], placed[2])])
+
+    def remove_windmill(self, windmill):
+        self.windmills.remove(windmill)
+        self.collision_map.mark_dirty()
+        self.mark_static_dirty(windmill.get_alfalfa_coords())
+        self.pathfinder.mark_dirty(self._structure_tiles(windmill))
+
+    def is_spot_free(self, r, c):
+        if self.grid[r][c] != "grass": return False
+        for _, pr, pc in self.player_placed_objects:
+            if pr == r and pc == c: return False
+        for w in self.windmills:
+            if (r, c) in w.get_occupied_coords(): return False
+        return True
+
+    def build_windmill(self, r, c):
+        """Pays next_windmill_cost and places a windmill at (r, c). Returns False if there is not enough cheese."""
+        cost = self.next_windmill_cost
+        if self.cheese_count < cost: return False
+        windmill = Windmill((r, c), self.tile_size)
+        self.windmills.append(windmill)
+        self.collision_map.mark_dirty()
+        self.mark_static_dirty(windmill.get_alfalfa_coords())
+        self.pathfinder.mark_dirty(self._structure_tiles(windmill))
+        self.cheese_count -= cost
+        if self.next_windmill_cost == 0: self.next_windmill_cost = 5
+        else: self.next_windmill_cost += 5
+        return True
+
+    # --- Navigation ---
+    def nav_blocked_tiles(self):
+        """Tiles player units path around: placed objects (fences), windmill and castle
+        footprints, and every tile whose centre the structures' collision masks cover."""
+        blocked = set(self.castle_occupied)
+        blocked.update((r, c) for _, r, c in self.player_placed_objects)
+        for structure in ([self.castle] if self.castle else []) + self.windmills:
+            blocked.update(self._structure_tiles(structure))
+        return blocked
+
+    def _structure_tiles(self, structure):
+        """Tiles a structure occupies, plus those its collision mask covers at the tile centre."""
+        tiles = set(structure.get_occupied_coords())
+        mask, (x, y) = structure.get_collision_footprint()
+        if not mask: return tiles
+        T = self.tile_size
+        w, h = mask.get_size()
+        for r in range(max(0, int(y // T)), min(self.rows, int((y + h) // T) + 1)):
+            for c in range(max(0, int(x // T)), min(self.columns, int((x + w) // T) + 1)):
+                mx, my = int(c * T + T / 2 - x), int(r * T + T / 2 - y)
+                if 0 <= mx < w and 0 <= my < h and mask.get_at((mx, my)): tiles.add((r, c))
+        return tiles
+
+    def castle_flow(self):
+        """The one flow field every enemy follows toward the castle footprint."""
+        if not self.castle: return None
+        if self._castle_flow is None or self._castle_flow.stale:
+            self._castle_flow = self.pathfinder.field_toward(self.castle_occupied)
+        return self._castle_flow
+
+    def flow_to(self, x, y):
+        """Shared flow field toward a unit position (top-left pixel, as set_precise_target takes it)."""
+        T = self.tile_size
+        return self.pathfinder.field_to(int((y + T / 2) // T), int((x + T / 2) // T))
+
+    # --- Tick ---
+    def step(self, dt):
+        """Advances the game by exactly dt seconds of game time."""
+        self._remember_positions()
+        self.tick += 1
+        self._update_production()
+        if not self.game_over and not self.victory_screen:
+            self._update_game_flow(dt)
+        self._update_entities(dt)
+
+    def _update_production(self):
+        castle = self.castle
+        if castle and hasattr(castle, 'infinite_production') and castle.infinite_production:
+            if len(castle.training_queue) < castle.max_queue_size:
+                cost = UNIT_PRICES.get(castle.infinite_production, 999)
+                if self.cheese_count >= cost:
+                    success = castle.queue_unit(castle.infinite_production)
+                    if success:
+                        self.cheese_count -= cost
+
+    def _update_game_flow(self, dt):
+        # 1. Stage Break
+        if self.waiting_for_next_stage:
+            self.stage_cooldown_timer -= dt
+            if self.stage_cooldown_timer <= 0:
+                self.waiting_for_next_stage = False
+                self.enemies_attacking = False
+
+                if not self.survival_mode:
+                    # Start Next Stage
+                    self.stage_number += 1
+                    self.wave_in_stage = 1
+                    if self.stage_number > 10:
+                        self.stage_number = 10 # Cap
+                    conf = self.stage_data[self.stage_number]
+                    self.game_timer = conf["base_time"]
+                    self._log(f"Starting Stage {self.stage_number}, Wave 1")
+                else:
+                    self.survival_wave += 1
+                    self.game_timer = 0.1
+                    self._log(f"Starting Survival Wave {self.survival_wave}")
+
+        # 2. Timer Logic (Wait for attack)
+        elif not self.enemies_attacking:
+            self.game_timer -= dt
+            if self.game_timer <= 0:
+                self.game_timer = 0
+                self.enemies_attacking = True
+
+                if self.survival_mode:
+                    count = 50 + (self.survival_wave * 5)
+                    hp_add = 50 + (self.survival_wave * 10)
+                    self.spawn_enemy_wave(int(count), hp_add)
+                else:
+                    conf = self.stage_data[self.stage_number]
+                    self.spawn_enemy_wave(conf["wave_enemies"], conf["hp_add"])
+
+        # 3. Wave Clear Logic
+        elif self.enemies_attacking:
+            if len(self.enemies) == 0:
+                self.enemies_attacking = False
+
+                if self.survival_mode:
+                    self.survival_wave += 1
+                    self.game_timer = 0.1 # Instant
+                    self._log(f"Survival Wave {self.survival_wave} Cleared. Instant start.")
+                else:
+                    self._log(f"Stage {self.stage_number} - Wave {self.wave_in_stage} Cleared!")
+                    self.wave_in_stage += 1
+                    if self.wave_in_stage > 3:
+                        if self.stage_number == 10:
+                            self.victory_screen = True
+                        else:
+                            self.waiting_for_next_stage = True
+                            self.stage_cooldown_timer = 10.0 # 10 seconds break
+                            self._log("Stage Cleared!")
+                    else:
+                        conf = self.stage_data[self.stage_number]
+                        next_time = conf["base_time"] - ((self.wave_in_stage - 1) * conf["dec"])
+                        if next_time < 10: next_time = 10
+                        self.game_timer = next_time
+                        self._log(f"Next wave in {self.game_timer:.2f}s")
+
+        if self.castle and self.castle.health <= 0:
+            self.game_over = True
+            self._log("GAME OVER")
+
+    def _phase(self, name):
+        return self.profiler.phase(name) if self.profiler else _NO_PHASE
+
+    def _update_entities(self, dt):
+        castle = self.castle
+        store = self.entity_store
+
+        # Gather Obstacles
+        with self._phase("obstacles"):
+            current_obstacles = set()
+            for asset_type, r, c in self.player_placed_objects:
+                current_obstacles.add((r, c))
+
+            if self.collision_map.dirty: self.collision_map.sync(([castle] if castle else []) + self.windmills)
+            pixel_obstacles = [self.collision_map]
+
+        # Update Projectiles
+        with self._phase("projectiles"):
+            if isinstance(self.projectiles, ProjectilePool):
+                self.projectiles.update(dt)
+            else:
+                for proj in self.projectiles:
+                    proj.update(dt)
+                self.projectiles = [p for p in self.projectiles if p.active]
+
+        if self.game_over or self.victory_screen: return
+
+        # Update Entities
+        with self._phase("entities"):
+            if castle:
+                castle.update(dt)
+                while castle.spawned_units:
+                    new_unit = castle.spawned_units.pop(0)
+                    if store and self.store_defenders: store.bind(new_unit)
+                    if isinstance(new_unit, McUncle):
+                        self.mcuncles.append(new_unit)
+                    else:
+                        self.hamsters.append(new_unit)
+
+            all_friends = self.mcuncles + self.hamsters
+            self.friend_grid.rebuild(all_friends)
+            self.enemy_index.rebuild(self.enemies, centered=True)
+            if store: store.tick_cooldowns(dt)
+
+            for w in self.windmills:
+                produced = w.update(dt, hamsters=all_friends)
+                if produced:
+                    self.cheese_count += 1
+                    self.cheese_earned += 1
+
+            for llama in self.llamas: llama.update(dt, current_obstacles, pixel_obstacles, self.windmills)
+
+            for mcuncle in self.mcuncles:
+                mcuncle.update(dt, self.enemies, self.projectiles, current_obstacles, pixel_obstacles, friends=all_friends, spatial_hash=self.friend_grid, enemy_index=self.enemy_index)
+
+            for hamster in self.hamsters:
+                hamster.update(dt, self.enemies, self.projectiles, current_obstacles, pixel_obstacles, friends=all_friends, spatial_hash=self.friend_grid, enemy_index=self.enemy_index)
+
+            flow = self.castle_flow() if self.enemies_attacking and self.enemies else None
+            Enemy.update_all(self.enemies, dt, current_obstacles, castle, move_to_castle=self.enemies_attacking, store=store, flow=flow)
+
+            if store:
+                for e in self.enemies:
+                    if e.health <= 0: store.unbind(e)
+            survivors = [e for e in self.enemies if e.health > 0]
+            self.enemies_killed += len(self.enemies) - len(survivors)
+            self.enemies = survivors
+
+    # --- Interpolation ---
+    def _remember_positions(self):
+        store = self.entity_store
+        if store: store.save_previous()
+        self._previous = [(u, pygame.Vector2(u.current_pixel_pos))
+                          for u in self.llamas + self.mcuncles + self.hamsters + self.enemies
+                          if u.__dict__.get("_store") is None]
+
+    @contextlib.contextmanager
+    def interpolated(self, alpha):
+        """Moves units alpha of the way from their previous tick to the current one while
+        the block runs (drawing), then puts the real positions back."""
+        alpha = max(0.0, min(alpha, 1.0))
+        restore = []
+        for unit, prev in self._previous:
+            current = unit.current_pixel_pos
+            restore.append((unit, current))
+            unit.current_pixel_pos = prev.lerp(current, alpha)
+
+        store = self.entity_store
+        saved = None
+        if store:
+            hw = store.high_water
+            pos = store.columns["pos"]
+            prev = store.columns["prev_pos"]
+            saved = pos[:hw].copy()
+            pos[:hw] = prev[:hw] + (saved - prev[:hw]) * alpha
+        try:
+            yield
+        finally:
+            for unit, current in restore:
+                unit.current_pixel_pos = current
+            if saved is not None:
+                store.columns["pos"][:len(saved)] = saved
@@ -0,0 +1,122 @@
+import math
+import pygame
+
+# --- Uniform Spatial Hash ---
+# Buckets objects by pixel position so neighbour lookups only touch the cells
+# around the query point instead of every unit on the map.
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.buckets = {}   # (cell_x, cell_y) -> list of entries
+        self.entries = {}   # id(obj) -> entry [index, obj, x, y, cell]
+        self.next_index = 0
+
+    def clear(self):
+        self.buckets.clear()
+        self.entries.clear()
+        self.next_index = 0
+
+    def _cell(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def insert(self, obj, x, y):
+        """Adds obj at (x, y). Insertion order is kept so query results match list order."""
+        cell = self._cell(x, y)
+        entry = [self.next_index, obj, x, y, cell]
+        self.next_index += 1
+        self.entries[id(obj)] = entry
+        self.buckets.setdefault(cell, []).append(entry)
+
+    def move(self, obj, x, y):
+        entry = self.entries.get(id(obj))
+        if entry is None:
+            self.insert(obj, x, y)
+            return
+        entry[2] = x
+        entry[3] = y
+        cell = self._cell(x, y)
+        if cell != entry[4]:
+            self.buckets[entry[4]].remove(entry)
+            entry[4] = cell
+            self.buckets.setdefault(cell, []).append(entry)
+
+    def rebuild(self, objects, centered=False):
+        """Re-buckets every object by its current_pixel_pos (called once per tick).
+        With centered=True the stored point is the middle of the object's tile."""
+        self.clear()
+        for obj in objects:
+            pos = obj.current_pixel_pos
+            if centered:
+                half = obj.tile_size / 2
+                self.insert(obj, pos.x + half, pos.y + half)
+            else:
+                self.insert(obj, pos.x, pos.y)
+
+    def relocate(self, obj):
+        pos = obj.current_pixel_pos
+        self.move(obj, pos.x, pos.y)
+
+    def _entries_near(self, x, y, radius):
+        min_cx, min_cy = self._cell(x - radius, y - radius)
+        max_cx, max_cy = self._cell(x + radius, y + radius)
+        found = []
+        buckets = self.buckets
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                bucket = buckets.get((cx, cy))
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+    def nearby(self, x, y, radius):
+        """Objects in the cells overlapping the query circle, in insertion order.
+        Callers still do their own exact distance test."""
+        found = self._entries_near(x, y, radius)
+        if len(found) > 1:
+            found.sort(key=lambda e: e[0])
+        return [e[1] for e in found]
+
+    def nearest(self, x, y, radius):
+        """Closest stored point strictly inside radius; ties go to the earlier insertion."""
+        best = None
+        best_index = -1
+        min_dist = float('inf')
+        for entry in self._entries_near(x, y, radius):
+            dx = x - entry[2]
+            dy = y - entry[3]
+            dist = math.sqrt(dx * dx + dy * dy)
+            if dist < radius and (dist < min_dist or (dist == min_dist and entry[0] < best_index)):
+                min_dist = dist
+                best = entry[1]
+                best_index = entry[0]
+        return best
+
+
+# --- Collision Map ---
+# World-sized bitmap of the pixels structures (castle, windmills) block for walking
+# units, composited from each structure's collision footprint. Rebuilt only after
+# mark_dirty() (the owner calls it when structures are built or removed), so a probe
+# is one bit lookup however many windmills stand.
+# Has check_collision() like a structure, so it can stand in for the obstacle list.
+class CollisionMap:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.mask = pygame.mask.Mask((width, height))
+        self.dirty = True
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def sync(self, structures):
+        """Recomposites the bitmap from structures if it was marked dirty since the last sync."""
+        if not self.dirty: return
+        self.dirty = False
+        self.mask.clear()
+        for s in structures:
+            footprint, (x, y) = s.get_collision_footprint()
+            if footprint: self.mask.draw(footprint, (int(x), int(y)))
+
+    def check_collision(self, pixel_point):
+        x, y = int(pixel_point[0]), int(pixel_point[1])
+        return 0 <= x < self.width and 0 <= y < self.height and self.mask.get_at((x, y)) == 1
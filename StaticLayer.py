@@ -0,0 +1,142 @@
+import math
+import pygame
+
+# --- Static Layer Cache ---
+# Grass, alfalfa fields, map features and placed objects (fences, ...) never move, so
+# they are composed once into world-sized surfaces and the frame starts from a single
+# blit. Simulation.static_dirty lists the tiles that changed since the last sync();
+# only those get recomposed. Static sprites are tile-sized (Assets scales them to
+# TILE_SIZE), so a tile can be recomposed on its own.
+#
+# Depth sorting: where a sprite overlaps a static tile that belongs in front of it,
+# that tile is uncovered back to plain ground for the frame and its statics go through
+# the y-sort as before.
+class StaticLayer:
+    def __init__(self, width, height, tile_size):
+        self.ground = pygame.Surface((width, height), pygame.SRCALPHA) # Grass + alfalfa
+        self.surface = pygame.Surface((width, height), pygame.SRCALPHA) # Ground + features + placed objects
+        self.tile_size = tile_size
+        self.rows = height // tile_size
+        self.columns = width // tile_size
+        self.statics = {} # (r, c) -> [(sort key, name)]; sort key = ((r + 1) * T, draw order)
+        self.alfalfa = set()
+        self.revision = 0 # Bumped whenever a tile is recomposed
+        self._sim = None
+        self._scaled_zoom = None # Zoom the scaled tiles below were made for
+        self._scaled_tiles = {} # (r, c) -> tile of surface at _scaled_zoom
+        self._scaled_ground = {} # (r, c) -> tile of ground at _scaled_zoom
+        self._edges = [] # Tile edge i at _scaled_zoom, in pixels from the layer's top-left
+
+    def sync(self, sim, tiles):
+        """Brings the layer up to date with sim. A different Simulation or static_dirty = None
+        (new map) recomposes everything; otherwise only the dirty tiles."""
+        if sim is not self._sim or sim.static_dirty is None:
+            self._sim = sim
+            self._index(sim)
+            self._compose_all(tiles)
+        elif sim.static_dirty:
+            self._index(sim)
+            for r, c in sim.static_dirty:
+                if 0 <= r < self.rows and 0 <= c < self.columns:
+                    self._compose_tile(tiles, r, c)
+        else:
+            return
+        sim.static_dirty = set()
+        self.revision += 1
+
+    def _index(self, sim):
+        T = self.tile_size
+        self.statics = {}
+        order = 0
+        # Same order as the y-sort always used: features first, then placed objects
+        for name, r, c in list(sim.features) + [o for o in sim.player_placed_objects if o[0] != "windmill"]:
+            self.statics.setdefault((r, c), []).append((((r + 1) * T, order), name))
+            order += 1
+        self.alfalfa = set()
+        for w in sim.windmills:
+            self.alfalfa.update(w.get_alfalfa_coords())
+
+    def _compose_all(self, tiles):
+        T = self.tile_size
+        self._scaled_tiles.clear()
+        self._scaled_ground.clear()
+        alfalfa = tiles.get("alfalfa")
+        self.ground.fill((0, 0, 0, 0))
+        self.ground.blit(tiles["grass"], (0, 0))
+        if alfalfa:
+            for r, c in self.alfalfa:
+                if 0 <= r < self.rows and 0 <= c < self.columns:
+                    self.ground.blit(alfalfa, (c * T, r * T))
+        self.surface.fill((0, 0, 0, 0))
+        self.surface.blit(self.ground, (0, 0))
+        for (r, c), statics in self.statics.items():
+            for _, name in sorted(statics):
+                if name in tiles: self.surface.blit(tiles[name], (c * T, r * T))
+
+    def _compose_tile(self, tiles, r, c):
+        T = self.tile_size
+        self._scaled_tiles.pop((r, c), None)
+        self._scaled_ground.pop((r, c), None)
+        rect = pygame.Rect(c * T, r * T, T, T)
+        alfalfa = tiles.get("alfalfa")
+        self.ground.fill((0, 0, 0, 0), rect)
+        self.ground.blit(tiles["grass"], rect.topleft, rect)
+        if alfalfa and (r, c) in self.alfalfa:
+            self.ground.blit(alfalfa, rect.topleft)
+        self.surface.fill((0, 0, 0, 0), rect)
+        self.surface.blit(self.ground, rect.topleft, rect)
+        for _, name in sorted(self.statics.get((r, c), ())):
+            if name in tiles: self.surface.blit(tiles[name], rect.topleft)
+
+    def covered_tiles(self, boxes):
+        """Tiles whose statics must be y-sorted because they are drawn over a sprite.
+        boxes: (x, y, w, h, bottom_y) around each sprite; bottom_y None means the sprite
+        lies under every static (ground layer)."""
+        T = self.tile_size
+        statics = self.statics
+        found = set()
+        for x, y, w, h, bottom_y in boxes:
+            # All statics of row r end at (r + 1) * T, so rows above the sprite's bottom are skipped
+            first_r = int(y // T) if bottom_y is None else max(int(y // T), -int(-bottom_y // T) - 1)
+            last_r = min(self.rows - 1, int((y + h - 1) // T))
+            first_c = max(0, int(x // T))
+            last_c = min(self.columns - 1, int((x + w - 1) // T))
+            for r in range(max(0, first_r), last_r + 1):
+                for c in range(first_c, last_c + 1):
+                    if (r, c) in statics: found.add((r, c))
+        return found
+
+    def draw_view(self, screen, camera, view, uncovered=()):
+        """Blits the view rect of the layer through camera, with the tiles in uncovered
+        showing ground only. At zoom 1 that is one area blit. Zoomed, the visible tiles
+        come from a cache of scaled tiles: each is scaled once per zoom level (again only
+        after it is recomposed), so panning never rescales anything."""
+        T = self.tile_size
+        if camera.zoom == 1.0:
+            screen.blit(self.surface, camera.point(view.x, view.y), view)
+            for r, c in uncovered:
+                screen.blit(self.ground, camera.point(c * T, r * T), (c * T, r * T, T, T))
+            return
+        if camera.zoom != self._scaled_zoom:
+            self._scaled_zoom = camera.zoom
+            self._scaled_tiles.clear()
+            self._scaled_ground.clear()
+            self._edges = [round(i * T * camera.zoom) for i in range(max(self.rows, self.columns) + 1)]
+        ox, oy = camera.point(0, 0)
+        ox, oy = math.floor(ox), math.floor(oy)
+        edges = self._edges
+        for r in range(max(0, view.top // T), min(self.rows, -(-view.bottom // T))):
+            for c in range(max(0, view.left // T), min(self.columns, -(-view.right // T))):
+                screen.blit(self._scaled_tile(self._scaled_tiles, self.surface, r, c), (ox + edges[c], oy + edges[r]))
+        for r, c in uncovered:
+            screen.blit(self._scaled_tile(self._scaled_ground, self.ground, r, c), (ox + edges[c], oy + edges[r]))
+
+    def _scaled_tile(self, cache, surface, r, c):
+        """Tile (r, c) of surface scaled to its exact span at the cached zoom, so neighbours meet without seams."""
+        tile = cache.get((r, c))
+        if tile is None:
+            T = self.tile_size
+            edges = self._edges
+            tile = cache[(r, c)] = pygame.transform.scale(surface.subsurface((c * T, r * T, T, T)),
+                                                          (edges[c + 1] - edges[c], edges[r + 1] - edges[r]))
+        return tile
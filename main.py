@@ -1,12 +1,18 @@
 import asyncio # Required for Pygbag/Web
 import pygame
-import random
 import os
 import sys
 import math 
+import time
 import Assets 
-from Entities import Llama, McUncle, Hamster, Enemy, Projectile, Castle, Windmill, CASTLE_HITBOX_WIDTH_TILES, CASTLE_HITBOX_HEIGHT_TILES, set_world_dimensions
+from Entities import Projectile, ProjectilePool, Castle, set_world_dimensions
+from Entities import CASTLE_VISUAL_WIDTH_TILES, CASTLE_VISUAL_HEIGHT_TILES, CASTLE_VISUAL_OFFSET_X_TILES, CASTLE_VISUAL_OFFSET_Y_TILES
+from Simulation import Simulation
 import MenuUI 
+from Profiler import FrameProfiler
+from StaticLayer import StaticLayer
+from Camera import Camera
+from RenderList import RenderList, STATIC_RANK
 
 # ---------------- CONFIG ----------------
 WIDTH, HEIGHT = 1280, 720
@@ -14,26 +20,29 @@ TILE_SIZE = 64
 COLUMNS = WIDTH // TILE_SIZE
 ROWS = HEIGHT // TILE_SIZE 
 TILES_SEARCH_FOLDERS = ["", "tiles", "assets"] 
+ASSET_BUNDLE = "assets.bundle" # Preprocessed sprites (python AssetBundle.py); used when present and up to date
 SAVE_FOLDER = "saved_maps"
+USE_ENTITY_STORE = True # Array-backed unit state (positions, health, cooldowns); needs numpy
+STORE_DEFENDERS = False # Defenders move one at a time with collision sliding, so plain attributes are faster
+USE_PROJECTILE_POOL = True # Recycled, array-backed projectiles; needs numpy
+TARGET_INDEX_CELL_SIZE = TILE_SIZE * 2 
+SIM_TICK_RATE = 60 # Simulation steps per second, independent of the rendered frame rate
+FIXED_DT = 1.0 / SIM_TICK_RATE
+FPS_LIMIT = 60 
+MAX_FRAME_TIME = 0.25 # Longest real frame fed to the simulation (e.g. after a window drag)
+MAX_STEPS_PER_FRAME = 8 
+PREFETCH_BUDGET_MS = 4 # Time per frame spent loading queued sprites after startup
+CULL_MARGIN = TILE_SIZE # World pixels kept around the view for sprite overhang and health bars
+PROFILE_TOGGLE_KEY = pygame.K_F3 # Per-phase frame timing overlay
+PROFILE_CSV = "frame_profile.csv" # Written on exit if the profiler ran
 
 # Update Entities module with world size for boundary clamping
 set_world_dimensions(WIDTH, HEIGHT)
 
-# Stage Configuration
-STAGE_DATA = {
-    1: {"wave_enemies": 5,  "hp_add": 0,  "base_time": 250.0, "dec": 0},
-    2: {"wave_enemies": 5,  "hp_add": 20, "base_time": 250.0, "dec": 50.0},
-    3: {"wave_enemies": 10, "hp_add": 30,  "base_time": 200.0, "dec": 50.0},
-    4: {"wave_enemies": 15, "hp_add": 40,  "base_time": 200.0, "dec": 50.0},
-    5: {"wave_enemies": 15, "hp_add": 50,  "base_time": 150.0, "dec": 50.0},
-    6: {"wave_enemies": 20, "hp_add": 60,  "base_time": 150.0, "dec": 50.0},
-    7: {"wave_enemies": 20, "hp_add": 70,  "base_time": 100.0, "dec": 50.0},
-    8: {"wave_enemies": 25, "hp_add": 80,  "base_time": 100.0, "dec": 50.0},
-    9: {"wave_enemies": 30, "hp_add": 90,  "base_time": 50.0,  "dec": 10.0},
-    10:{"wave_enemies": 30, "hp_add": 100,  "base_time": 50.0,  "dec": 10.0},
-}
-
 # ---------------- GLOBAL STATE ----------------
+sim = None # Simulation: units, structures, stage/wave progress and cheese (created in main)
+profiler = FrameProfiler()
+
 # Player Interaction
 current_tool = "none" 
 selected_asset_type = None 
@@ -50,38 +59,6 @@ skip_button_rect = None
 btn_continue_rect = None
 btn_restart_rect = None
 
-# Game Objects
-player_placed_objects = [] 
-llamas = []
-mcuncles = []
-hamsters = [] 
-enemies = []  
-projectiles = []
-windmills = [] 
-castle = None 
-
-# Map Data
-map_data = {}
-grid = []
-features = []
-castle_occupied = set()
-seed = 0
-
-# Game Progress
-cheese_count = 5 
-game_timer = 0.0
-wave_number = 1 
-stage_number = 1 
-wave_in_stage = 1 # 1, 2, 3
-enemies_attacking = False
-game_over = False
-waiting_for_next_stage = False
-stage_cooldown_timer = 0.0
-survival_mode = False
-survival_wave = 1
-victory_screen = False
-next_windmill_cost = 0
-
 # Camera
 zoom_level = 1.0 
 max_zoom = 4.0 
@@ -101,22 +78,24 @@ DELETE_BUTTON_PADDING = 5
 
 # ------------------------------------------------------------
 
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Hamster Path Defense")
-font = pygame.font.Font(None, 28)
-timer_font = pygame.font.Font(None, 32)
-game_over_font = pygame.font.Font(None, 64)
-stage_font = pygame.font.Font(None, 48)
-delete_font = pygame.font.Font(None, 32)
-clock = pygame.time.Clock()
+# Window, fonts and sprites are created by init_display(), so importing this
+# module (e.g. from Headless.py for its config) never opens a window.
+screen = None
+font = None
+timer_font = None
+game_over_font = None
+stage_font = None
+delete_font = None
+clock = None
+static_layer = None # Pre-composed grass, alfalfa, features and placed objects
+camera = Camera() # World-to-screen transform and per-zoom sprite cache for draw()
+render_list = RenderList() # Depth-ordered draw list, kept between frames
 
 # Global dictionary for all loaded tiles
 tiles = {}
 
 world_width_pixels = COLUMNS * TILE_SIZE
 world_height_pixels = ROWS * TILE_SIZE
-world_surface = pygame.Surface((world_width_pixels, world_height_pixels), pygame.SRCALPHA)
 
 calculated_min_zoom_x = WIDTH / world_width_pixels
 calculated_min_zoom_y = HEIGHT / world_height_pixels
@@ -141,6 +120,16 @@ def _screen_to_world_grid(screen_x, screen_y):
     grid_r = int(world_y // TILE_SIZE)
     return grid_r, grid_c
 
+def _visible_world_rect():
+    """The part of the world (in world pixels, clipped to the map) that lands on screen."""
+    x0, y0 = _screen_to_world_pixel(0, 0)
+    x1, y1 = _screen_to_world_pixel(WIDTH, HEIGHT)
+    left = max(0, int(math.floor(x0)))
+    top = max(0, int(math.floor(y0)))
+    right = min(world_width_pixels, int(math.ceil(x1)))
+    bottom = min(world_height_pixels, int(math.ceil(y1)))
+    return pygame.Rect(left, top, max(0, right - left), max(0, bottom - top))
+
 def _clamp_camera():
     global camera_x, camera_y, render_offset_x, render_offset_y
     
@@ -166,19 +155,21 @@ def _clamp_camera():
 def load_all_assets():
     global tiles 
     try:
-        Assets.load_game_assets(TILE_SIZE, WIDTH, HEIGHT, TILES_SEARCH_FOLDERS)
-        tiles.update(Assets._loaded_assets) 
-        Assets.load_llama_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
-        Assets.load_windmill_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
-        tiles.update({"windmill": Assets._loaded_assets["windmill"]}) 
-        Assets.load_castle_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
-        Assets.load_mcuncle_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
+        if not (ASSET_BUNDLE and Assets.load_bundle(ASSET_BUNDLE, TILE_SIZE, WIDTH, HEIGHT, TILES_SEARCH_FOLDERS)):
+            Assets.load_game_assets(TILE_SIZE, WIDTH, HEIGHT, TILES_SEARCH_FOLDERS)
+            Assets.load_llama_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
+            Assets.load_windmill_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
+            Assets.load_castle_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
+            Assets.load_mcuncle_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
+            Assets.load_hamster_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
+            Assets.load_projectile_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
+            Assets.load_enemy_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
+            Assets.build_atlas()
+            Assets._frame_cache.flush()
+        tiles.update({name: img for name, img in Assets._loaded_assets.items() if name != "castle"})
         tiles["mcuncle"] = Assets._loaded_mcuncle_sprites 
-        Assets.load_hamster_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
         tiles["hamsters"] = Assets._loaded_hamsters 
-        Assets.load_projectile_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
         tiles["projectiles"] = Assets._loaded_projectiles 
-        Assets.load_enemy_assets(TILE_SIZE, TILES_SEARCH_FOLDERS)
         tiles["enemies"] = Assets._loaded_enemies 
     except FileNotFoundError as e:
         print(f"CRITICAL ERROR: Asset loading failed: {e}")
@@ -187,39 +178,41 @@ def load_all_assets():
         print(f"An unexpected error occurred during asset loading: {e}")
         sys.exit(1)
 
-try:
-    load_all_assets()
-except Exception as e:
-    sys.exit(1)
-
+async def prefetch_assets():
+    """Loads the sprite sheets load_all_assets() queued between frames, about
+    PREFETCH_BUDGET_MS per frame. One load can take longer (decoding a large PNG without
+    the frame cache); the overrun is paid back by skipping frames, so a cold start
+    spreads its loading over the pre-wave timer instead of stalling every frame."""
+    budget = PREFETCH_BUDGET_MS / 1000
+    debt = 0.0
+    while True:
+        if debt > 0:
+            debt -= budget
+        else:
+            t0 = time.perf_counter()
+            if not Assets.prefetch_step(budget): break
+            debt = time.perf_counter() - t0 - budget
+        await asyncio.sleep(0)
+
+# --- Display Setup ---
+def init_display():
+    global screen, font, timer_font, game_over_font, stage_font, delete_font, clock, static_layer
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Hamster Path Defense")
+    font = pygame.font.Font(None, 28)
+    timer_font = pygame.font.Font(None, 32)
+    game_over_font = pygame.font.Font(None, 64)
+    stage_font = pygame.font.Font(None, 48)
+    delete_font = pygame.font.Font(None, 32)
+    clock = pygame.time.Clock()
+    static_layer = StaticLayer(world_width_pixels, world_height_pixels, TILE_SIZE)
 
-# --- Helper: Generates random non-path features ---
-def generate_random_features(grid, rows, columns, exclusion_coords):
-    features = []
-    return features
+    try:
+        load_all_assets()
+    except Exception as e:
+        sys.exit(1)
 
-# --- Map Generation Helper ---
-def generate_grass_map(rows, columns, extra_exclusions=None):
-    grid_local = [["grass" for _ in range(columns)] for _ in range(rows)]
-    seed_local = random.randint(100000, 999999)
-    random.seed(seed_local)
-    
-    exclusion_coords = set()
-    for _, r, c in player_placed_objects:
-        exclusion_coords.add((r,c))
-    for w in windmills:
-        exclusion_coords.update(w.get_occupied_coords())
-    
-    if extra_exclusions:
-        exclusion_coords.update(extra_exclusions)
-        
-    features_local = generate_random_features(grid_local, rows, columns, exclusion_coords)
-    
-    return {
-        "grid": grid_local,
-        "features": features_local,
-        "seed": seed_local
-    }
 
 # --- Formation Helper ---
 def get_formation_positions(center_pixel_pos, unit_count, formation_type, spacing=40):
@@ -285,157 +278,141 @@ def get_formation_positions(center_pixel_pos, unit_count, formation_type, spacin
             
     return positions
 
-# --- Spawning Helpers (Global) ---
-def spawn_entities():
-    global llamas
-    llamas.clear()
-    
-    walkable_coords = []
-    occupied = set([(r,c) for _, r, c in features])
-    for _, r, c in player_placed_objects: occupied.add((r,c))
-    for w in windmills: occupied.update(w.get_occupied_coords())
-    occupied.update(castle_occupied) 
-    
-    for r in range(ROWS):
-        for c in range(COLUMNS):
-            if grid[r][c] == "grass" and (r,c) not in occupied:
-                walkable_coords.append((r,c))
-    
-    if walkable_coords:
-        for _ in range(3): 
-            start_r, start_c = random.choice(walkable_coords)
-            llamas.append(Llama((start_r, start_c), TILE_SIZE, grid, walkable_coords, llamas))
-
-def spawn_enemy_wave(count=10, hp_add=0):
-    global enemies
-    spawn_candidates = []
-    for r in range(ROWS):
-        if grid[r][0] == "grass":
-            spawn_candidates.append((r, 0))
-    
-    if not spawn_candidates:
-            spawn_candidates = [(r, 0) for r in range(ROWS)]
-            
-    for _ in range(count):
-        start_pos = random.choice(spawn_candidates)
-        # Pass extra health to Enemy constructor
-        enemies.append(Enemy(start_pos, TILE_SIZE, extra_health=hp_add))
-    print(f"Spawned wave of {count} enemies (HP +{hp_add}) from the left!")
+# --- Y-Sort Helper ---
+def _sprite_box(item, bottom_y):
+    """World box (x, y, w, h) that covers what item draws, with some slack at the sides."""
+    x, y = item.current_pixel_pos
+    if isinstance(item, Castle):
+        return (x + CASTLE_VISUAL_OFFSET_X_TILES * TILE_SIZE, y + CASTLE_VISUAL_OFFSET_Y_TILES * TILE_SIZE,
+                CASTLE_VISUAL_WIDTH_TILES * TILE_SIZE, CASTLE_VISUAL_HEIGHT_TILES * TILE_SIZE)
+    h = bottom_y - y
+    return x - TILE_SIZE / 4, y, h + TILE_SIZE / 2, h
+
+def _box_in_view(box, view):
+    # view is already grown by CULL_MARGIN, which covers health bars and sprite overhang
+    x, y, w, h = box[:4]
+    return x < view.right and x + w > view.left and y < view.bottom and y + h > view.top
+
+def _static_drawer(name, r, c):
+    def draw_static(screen, camera):
+        if name in tiles:
+            camera.blit(screen, tiles[name], c * TILE_SIZE, r * TILE_SIZE)
+    return draw_static
+
+def collect_renderables(view=None):
+    """Everything that needs depth sorting, as RenderEntries sorted back to front.
+    Features and placed objects are only listed where they cover a sprite.
+    With a view rect (world pixels), sprites outside it are left out."""
+    # Static Objects (Map Features, Player Placed Objects) enter the list once per layer change
+    static_layer.sync(sim, tiles)
+    if render_list.static_revision != static_layer.revision:
+        render_list.set_statics([((key[0], STATIC_RANK + key[1]), None, _static_drawer(name, r, c), (r, c))
+                                 for (r, c), statics in static_layer.statics.items() for key, name in statics],
+                                static_layer.revision)
+
+    # Castle, Windmills, then Units (Llamas, McUncles, Hamsters, Enemies); ties keep this order
+    entries = render_list.refresh(([sim.castle] if sim.castle else (), sim.windmills,
+                                   sim.llamas, sim.mcuncles, sim.hamsters, sim.enemies))
+
+    # Viewport Culling
+    if view is None and not static_layer.statics:
+        for entry in entries: entry.visible = True
+        return entries
+    cull = view.inflate(CULL_MARGIN * 2, CULL_MARGIN * 2) if view is not None else None
+    boxes = []
+    for entry in entries:
+        if entry.tile is not None: continue
+        bottom_y = entry.key[0]
+        box = _sprite_box(entry.item, bottom_y) + (bottom_y,)
+        entry.visible = cull is None or _box_in_view(box, cull)
+        if entry.visible: boxes.append(box)
+
+    # Statics drawn over a sprite; the rest stay baked into the static layer
+    covered = ()
+    if static_layer.statics:
+        for w in sim.windmills:
+            for llama in w.static_llamas:
+                img = llama['frames'][0]
+                boxes.append((llama['x'], llama['y'], img.get_width(), img.get_height(), None))
+        covered = static_layer.covered_tiles(boxes)
+
+    return [entry for entry in entries if (entry.visible if entry.tile is None else entry.tile in covered)]
 
 
 # --- draw ---
-def draw(seed, grid, features, ui_control_panel): 
+def draw(ui_control_panel): 
     global delete_button_rect, skip_button_rect, btn_continue_rect, btn_restart_rect
     global repair_button_rect
 
-    world_surface.fill((0,0,0,0)) 
+    # World sprites go straight to the screen, pre-scaled for the current zoom by the camera
+    view = _visible_world_rect()
+    if not view.width or not view.height: return
+    cull = view.inflate(CULL_MARGIN * 2, CULL_MARGIN * 2)
+    camera.set_view(zoom_level, camera_x, camera_y, render_offset_x, render_offset_y)
+    screen.set_clip(camera.rect(0, 0, world_width_pixels, world_height_pixels))
+
+    renderables = collect_renderables(view)
 
-    # 1. Background (Grass)
-    world_surface.blit(tiles["grass"], (0,0)) 
+    # 1. Static Layer (Grass, Alfalfa, Features and Placed Objects not in the y-sort)
+    uncovered = {entry.tile for entry in renderables if entry.tile is not None}
+    static_layer.draw_view(screen, camera, view, uncovered)
     
-    # 2. Ground Layer (Alfalfa, Static Llamas)
-    for w in windmills:
-        w.draw_ground(world_surface)
+    # 2. Ground Layer (Static Llamas)
+    for w in sim.windmills:
+        ground_box = ((w.grid_c - 1) * TILE_SIZE, (w.grid_r - 1) * TILE_SIZE, (w.width_tiles + 2) * TILE_SIZE, (w.height_tiles + 2) * TILE_SIZE)
+        if _box_in_view(ground_box, cull):
+            w.draw_static_llamas(screen, camera)
 
     # 3. Y-Sort Layer (Entities, Structures, Features, Placed Objects)
-    # Collect everything that needs depth sorting
-    renderables = []
-
-    # A. Castle
-    if castle:
-        renderables.append((castle.get_bottom_y(), castle))
-
-    # B. Windmills
-    for w in windmills:
-        renderables.append((w.get_bottom_y(), w))
-
-    # C. Units (Llamas, McUncles, Hamsters, Enemies)
-    all_units = llamas + mcuncles + hamsters + enemies
-    for u in all_units:
-        renderables.append((u.get_bottom_y(), u))
-
-    # D. Static Objects (Map Features)
-    for name, r, c in features:
-        # Calculate approximate bottom Y for static tiles
-        bottom_y = (r + 1) * TILE_SIZE
-        renderables.append((bottom_y, ("static", name, r, c)))
-
-    # E. Player Placed Objects
-    for asset_type, r, c in player_placed_objects:
-        if asset_type != "windmill": # Windmills are handled as entities
-            bottom_y = (r + 1) * TILE_SIZE
-            renderables.append((bottom_y, ("static", asset_type, r, c)))
-
-    # Sort by Y coordinate (z-index)
-    renderables.sort(key=lambda x: x[0])
-
     # Draw sorted entities
-    for _, item in renderables:
-        if isinstance(item, (Castle, Windmill)):
-            item.draw_structure(world_surface)
-        elif isinstance(item, (Llama, McUncle, Hamster, Enemy)):
-            item.draw(world_surface)
-        elif isinstance(item, tuple) and item[0] == "static":
-            # Static Object: ("static", name, r, c)
-            _, name, r, c = item
-            if name in tiles:
-                world_surface.blit(tiles[name], (c * TILE_SIZE, r * TILE_SIZE))
+    for entry in renderables:
+        entry.draw(screen, camera)
 
     # 4. Overlay Layer (Projectiles, UI Bars, Ghosts, Selection)
     
     # Projectiles (in the air)
-    for proj in projectiles:
-        proj.draw(world_surface)
+    if isinstance(sim.projectiles, ProjectilePool):
+        sim.projectiles.draw(screen, view=cull, camera=camera)
+    else:
+        for proj in sim.projectiles:
+            if cull.collidepoint(proj.pos): proj.draw(screen, camera)
 
     # UI Overlays for structures (Health/Progress Bars)
-    if castle:
-        castle.draw_ui(world_surface)
-    for w in windmills:
-        w.draw_ui(world_surface)
+    if sim.castle:
+        sim.castle.draw_ui(screen, camera)
+    for w in sim.windmills:
+        if _box_in_view(_sprite_box(w, w.get_bottom_y()), cull): w.draw_ui(screen, camera)
 
     # Selection Highlights (Static Objects)
     if selected_removable_object:
         asset_type, r, c = selected_removable_object
-        pygame.draw.rect(world_surface, (255, 255, 0), (c * TILE_SIZE, r * TILE_SIZE, TILE_SIZE, TILE_SIZE), 2)
+        pygame.draw.rect(screen, (255, 255, 0), camera.rect(c * TILE_SIZE, r * TILE_SIZE, TILE_SIZE, TILE_SIZE), 2)
         
         # Highlight selected windmill if applicable (it's larger)
         if asset_type == "windmill":
-             pygame.draw.rect(world_surface, (255, 255, 0), (c * TILE_SIZE, r * TILE_SIZE, TILE_SIZE*2, TILE_SIZE*2), 2)
+             pygame.draw.rect(screen, (255, 255, 0), camera.rect(c * TILE_SIZE, r * TILE_SIZE, TILE_SIZE*2, TILE_SIZE*2), 2)
 
     # Ghosts (Placement Preview)
+    ghost_image = None
     if current_tool == "place" and selected_asset_type:
+        if selected_asset_type == "windmill":
+            if tiles["windmill"]: ghost_image = tiles["windmill"][0]
+        elif selected_asset_type in tiles:
+            ghost_image = tiles[selected_asset_type]
+    elif current_tool == "set_rally":
+        ghost_image = tiles.get("flagpole")
+
+    if ghost_image:
         mouse_x, mouse_y = pygame.mouse.get_pos()
         world_r, world_c = _screen_to_world_grid(mouse_x, mouse_y) 
         if 0 <= world_r < ROWS and 0 <= world_c < COLUMNS:
-            ghost_image = None
-            if selected_asset_type == "windmill":
-                if tiles["windmill"]: ghost_image = tiles["windmill"][0].copy()
-            elif selected_asset_type in tiles:
-                ghost_image = tiles[selected_asset_type].copy()
-            
-            if ghost_image:
-                ghost_image.set_alpha(128) 
-                offset_x = (TILE_SIZE - ghost_image.get_width()) / 2
-                offset_y = (TILE_SIZE - ghost_image.get_height()) / 2
-                world_surface.blit(ghost_image, (world_c * TILE_SIZE + offset_x, world_r * TILE_SIZE + offset_y))
-    
-    elif current_tool == "set_rally":
-        if "flagpole" in tiles:
-            ghost_image = tiles["flagpole"].copy()
-            if ghost_image:
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                world_r, world_c = _screen_to_world_grid(mouse_x, mouse_y) 
-                if 0 <= world_r < ROWS and 0 <= world_c < COLUMNS:
-                    ghost_image.set_alpha(128) 
-                    offset_x = (TILE_SIZE - ghost_image.get_width()) / 2
-                    offset_y = (TILE_SIZE - ghost_image.get_height()) / 2
-                    world_surface.blit(ghost_image, (world_c * TILE_SIZE + offset_x, world_r * TILE_SIZE + offset_y))
-
-    # --- Render World to Screen ---
-    scaled_world_width = int(world_width_pixels * zoom_level)
-    scaled_world_height = int(world_height_pixels * zoom_level)
-    scaled_world = pygame.transform.scale(world_surface, (scaled_world_width, scaled_world_height))
-    screen.blit(scaled_world, (render_offset_x - camera_x * zoom_level, render_offset_y - camera_y * zoom_level))
+            offset_x = (TILE_SIZE - ghost_image.get_width()) / 2
+            offset_y = (TILE_SIZE - ghost_image.get_height()) / 2
+            ghost = camera.scaled(ghost_image).copy()
+            ghost.set_alpha(128) 
+            screen.blit(ghost, camera.point(world_c * TILE_SIZE + offset_x, world_r * TILE_SIZE + offset_y))
+
+    screen.set_clip(None)
 
     # --- UI & Overlays (Screen Space) ---
 
@@ -479,10 +456,10 @@ def draw(seed, grid, features, ui_control_panel):
 
     # Draw UI Panel
     needs_repair = False
-    if castle and castle.health < castle.max_health:
+    if sim.castle and sim.castle.health < sim.castle.max_health:
         needs_repair = True
     
-    ui_control_panel.draw(screen, active_hamsters=hamsters, active_mcuncles=mcuncles, castle_needs_repair=needs_repair)
+    ui_control_panel.draw(screen, active_hamsters=sim.hamsters, active_mcuncles=sim.mcuncles, castle_needs_repair=needs_repair)
     
     # Expose repair button rect from UI panel to global for click detection
     if ui_control_panel.castle_menu_active and needs_repair:
@@ -499,32 +476,32 @@ def draw(seed, grid, features, ui_control_panel):
         cheese_icon = pygame.transform.scale(tiles["cheese"], (40, 40))
         screen.blit(cheese_icon, (ui_x_right, ui_y_right))
         # Text to left of icon
-        cheese_text = font.render(f"{cheese_count}", True, (255, 255, 255))
+        cheese_text = font.render(f"{sim.cheese_count}", True, (255, 255, 255))
         screen.blit(cheese_text, (ui_x_right - cheese_text.get_width() - 5, ui_y_right + 10))
         
         # Windmill Cost
-        cost_txt = ui_control_panel.price_font.render(f"Next Mill: {next_windmill_cost}", True, (200, 200, 200))
+        cost_txt = ui_control_panel.price_font.render(f"Next Mill: {sim.next_windmill_cost}", True, (200, 200, 200))
         screen.blit(cost_txt, (ui_x_right - 40, ui_y_right + 45))
 
     ui_y_right += 80
 
     # 2. Queue List (Floating on top of Castle)
-    if castle:
-        if hasattr(castle, 'infinite_production') and castle.infinite_production:
-            cx, cy = _world_to_screen_pixel(castle.current_pixel_pos.x, castle.current_pixel_pos.y)
-            inf_txt = font.render(f"Inf: {castle.infinite_production}", True, (0, 255, 255))
+    if sim.castle:
+        if hasattr(sim.castle, 'infinite_production') and sim.castle.infinite_production:
+            cx, cy = _world_to_screen_pixel(sim.castle.current_pixel_pos.x, sim.castle.current_pixel_pos.y)
+            inf_txt = font.render(f"Inf: {sim.castle.infinite_production}", True, (0, 255, 255))
             screen.blit(inf_txt, (cx, cy - 60))
 
-        if castle.training_queue:
-            cx, cy = _world_to_screen_pixel(castle.current_pixel_pos.x, castle.current_pixel_pos.y)
+        if sim.castle.training_queue:
+            cx, cy = _world_to_screen_pixel(sim.castle.current_pixel_pos.x, sim.castle.current_pixel_pos.y)
             queue_w = 30 
-            total_w = len(castle.training_queue) * (queue_w + 2)
-            castle_screen_w = castle.width_tiles * TILE_SIZE * zoom_level
+            total_w = len(sim.castle.training_queue) * (queue_w + 2)
+            castle_screen_w = sim.castle.width_tiles * TILE_SIZE * zoom_level
             start_x = cx + (castle_screen_w - total_w) / 2
             start_y = cy - 40 
             
             current_qx = start_x
-            for unit_name in castle.training_queue:
+            for unit_name in sim.castle.training_queue:
                 unit_icon = None
                 # FIX: Check if mcuncle is dict or list to avoid KeyError
                 if unit_name == "McUncle" and "mcuncle" in tiles:
@@ -550,21 +527,21 @@ def draw(seed, grid, features, ui_control_panel):
     ui_y_left = 20
     
     timer_color = (255, 255, 255)
-    if game_timer <= 5.0 and not enemies_attacking and not waiting_for_next_stage and not victory_screen:
+    if sim.game_timer <= 5.0 and not sim.enemies_attacking and not sim.waiting_for_next_stage and not sim.victory_screen:
         timer_color = (255, 50, 50) 
     
     timer_str = ""
     skip_button_rect = None
     
-    if victory_screen:
+    if sim.victory_screen:
         timer_str = ""
-    elif enemies_attacking:
+    elif sim.enemies_attacking:
         timer_str = "Status: WAVE ATTACK!"
         timer_color = (255, 0, 0)
-    elif waiting_for_next_stage:
+    elif sim.waiting_for_next_stage:
         timer_str = "Status: STAGE CLEARED"
     else:
-        timer_str = f"Time until Enemy attacks: {int(game_timer)}s"
+        timer_str = f"Time until Enemy attacks: {int(sim.game_timer)}s"
         # Draw Skip Button
         txt_surf = timer_font.render(timer_str, True, timer_color)
         btn_x = ui_x_left + txt_surf.get_width() + 15
@@ -580,28 +557,28 @@ def draw(seed, grid, features, ui_control_panel):
     
     # Stage Info
     stage_text = ""
-    if survival_mode:
-        stage_text = f"SURVIVAL MODE | Wave: {survival_wave}"
+    if sim.survival_mode:
+        stage_text = f"SURVIVAL MODE | Wave: {sim.survival_wave}"
     else:
-        stage_text = f"Stage: {stage_number}/10 | Wave: {wave_in_stage}/3"
+        stage_text = f"Stage: {sim.stage_number}/10 | Wave: {sim.wave_in_stage}/3"
         
     txt_stage = font.render(stage_text, True, (200, 200, 255))
     screen.blit(txt_stage, (ui_x_left, ui_y_left + 40))
     
     # --- Stage Clear Overlay ---
-    if waiting_for_next_stage:
+    if sim.waiting_for_next_stage:
         overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
         overlay.fill((0, 0, 0, 150))
         screen.blit(overlay, (0, 0))
         
         msg = stage_font.render("Stage cleared roller", True, (0, 255, 0))
-        sub = font.render(f"Next stage starts in {int(stage_cooldown_timer)} seconds, hope you are ready", True, (255, 255, 255))
+        sub = font.render(f"Next stage starts in {int(sim.stage_cooldown_timer)} seconds, hope you are ready", True, (255, 255, 255))
         
         screen.blit(msg, (WIDTH//2 - msg.get_width()//2, HEIGHT//2 - 50))
         screen.blit(sub, (WIDTH//2 - sub.get_width()//2, HEIGHT//2 + 20))
 
     # --- Victory Popup ---
-    if victory_screen:
+    if sim.victory_screen:
         overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
         overlay.fill((0, 0, 0, 200))
         screen.blit(overlay, (0, 0))
@@ -629,7 +606,7 @@ def draw(seed, grid, features, ui_control_panel):
         screen.blit(txt_rest, (btn_restart_rect.centerx - txt_rest.get_width()//2, btn_restart_rect.centery - txt_rest.get_height()//2))
 
     # --- Game Over Overlay ---
-    if game_over:
+    if sim.game_over:
         overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
         overlay.fill((0, 0, 0, 180))
         screen.blit(overlay, (0, 0))
@@ -643,130 +620,39 @@ def draw(seed, grid, features, ui_control_panel):
 
 # --- main (Async for Pygbag) ---
 async def main():
-    global current_tool, selected_asset_type, player_placed_objects, llamas, mcuncles, hamsters, enemies, selected_entity, projectiles, castle, selected_llama_context, windmills, cheese_count
+    global current_tool, selected_asset_type, selected_entity, selected_llama_context, sim
     global selected_removable_object, delete_button_rect, zoom_level, camera_x, camera_y, render_offset_x, render_offset_y, is_dragging, last_mouse_pos
-    global game_timer, enemies_attacking, game_over, repair_button_rect
+    global repair_button_rect
     global selection_drag_start, selection_rect, selected_units
-    global wave_number, waiting_for_next_stage, stage_cooldown_timer
     global active_formation
-    global stage_number, wave_in_stage, next_windmill_cost, skip_button_rect
-    global victory_screen, survival_mode, survival_wave, btn_continue_rect, btn_restart_rect
-    global grid, features, castle_occupied, map_data # Ensure globals are used
+    global skip_button_rect, btn_continue_rect, btn_restart_rect
+
+    init_display()
 
     # Init generation
-    castle_c = max(0, COLUMNS - CASTLE_HITBOX_WIDTH_TILES - 3)
-    max_r = max(CASTLE_HITBOX_HEIGHT_TILES, ROWS - CASTLE_HITBOX_HEIGHT_TILES - 2)
-    castle_r = random.randint(2, max_r)
-    
-    castle = Castle((castle_r, castle_c), TILE_SIZE)
-    castle_occupied = set(castle.get_occupied_coords())
-
-    map_data = generate_grass_map(ROWS, COLUMNS, castle_occupied)
-    seed = map_data["seed"]
-    grid = map_data["grid"]
-    features = map_data["features"]
-    print(f"Generated map. Seed: {seed}")
+    sim = Simulation(ROWS, COLUMNS, TILE_SIZE, use_entity_store=USE_ENTITY_STORE, store_defenders=STORE_DEFENDERS,
+                     use_projectile_pool=USE_PROJECTILE_POOL, target_index_cell_size=TARGET_INDEX_CELL_SIZE)
     
-    # Set init timer
-    conf = STAGE_DATA[1]
-    game_timer = conf["base_time"]
-    
-    spawn_entities()
     _clamp_camera()
     
     ui_control_panel = MenuUI.UIControlPanel(TILE_SIZE, WIDTH, HEIGHT, tiles)
+    sim.profiler = profiler
+    accumulator = 0.0
+    prefetch = asyncio.create_task(prefetch_assets()) # Runs between frames, during the first pre-wave timer
 
     running = True
     while running:
-        dt = clock.tick(60) / 1000.0 
-        
-        # --- Update Infinite Production ---
-        if castle and hasattr(castle, 'infinite_production') and castle.infinite_production:
-            if len(castle.training_queue) < castle.max_queue_size:
-                prices = {"McUncle": 30, "Bob": 5, "Dracula": 15, "TheHamster": 10}
-                cost = prices.get(castle.infinite_production, 999)
-                if cheese_count >= cost:
-                    success = castle.queue_unit(castle.infinite_production)
-                    if success:
-                        cheese_count -= cost
-
-        # --- Game Flow Logic ---
-        if not game_over and not victory_screen:
-            
-            # 1. Stage Break
-            if waiting_for_next_stage:
-                stage_cooldown_timer -= dt
-                if stage_cooldown_timer <= 0:
-                    waiting_for_next_stage = False
-                    enemies_attacking = False
-                    
-                    if not survival_mode:
-                        # Start Next Stage
-                        stage_number += 1
-                        wave_in_stage = 1
-                        if stage_number > 10:
-                            stage_number = 10 # Cap
-                        conf = STAGE_DATA[stage_number]
-                        game_timer = conf["base_time"] 
-                        print(f"Starting Stage {stage_number}, Wave 1")
-                    else:
-                        survival_wave += 1
-                        game_timer = 0.1 
-                        print(f"Starting Survival Wave {survival_wave}")
-
-            # 2. Timer Logic (Wait for attack)
-            elif not enemies_attacking:
-                game_timer -= dt
-                if game_timer <= 0:
-                    game_timer = 0
-                    enemies_attacking = True
-                    
-                    if survival_mode:
-                        count = 50 + (survival_wave * 5)
-                        hp_add = 50 + (survival_wave * 10)
-                        spawn_enemy_wave(int(count), hp_add)
-                    else:
-                        conf = STAGE_DATA[stage_number]
-                        count = conf["wave_enemies"]
-                        hp = conf["hp_add"]
-                        spawn_enemy_wave(count, hp)
-
-            # 3. Wave Clear Logic
-            elif enemies_attacking:
-                if len(enemies) == 0:
-                    enemies_attacking = False
-                    
-                    if survival_mode:
-                        survival_wave += 1
-                        game_timer = 0.1 # Instant
-                        print(f"Survival Wave {survival_wave} Cleared. Instant start.")
-                    else:
-                        print(f"Stage {stage_number} - Wave {wave_in_stage} Cleared!")
-                        wave_in_stage += 1
-                        if wave_in_stage > 3: 
-                            if stage_number == 10:
-                                victory_screen = True
-                            else:
-                                waiting_for_next_stage = True
-                                stage_cooldown_timer = 10.0 # 10 seconds break
-                                print("Stage Cleared!")
-                        else:
-                            conf = STAGE_DATA[stage_number]
-                            next_time = conf["base_time"] - ((wave_in_stage - 1) * conf["dec"])
-                            if next_time < 10: next_time = 10
-                            game_timer = next_time
-                            print(f"Next wave in {game_timer:.2f}s")
-
-            if castle and castle.health <= 0:
-                game_over = True
-                print("GAME OVER")
+        frame_dt = clock.tick(FPS_LIMIT) / 1000.0 
+        accumulator += min(frame_dt, MAX_FRAME_TIME)
+        profiler.begin_frame()
 
         # --- Event Handling ---
+        profiler.start("events")
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.MOUSEWHEEL:
-                if not game_over:
+                if not sim.game_over:
                     mouse_screen_x, mouse_screen_y = pygame.mouse.get_pos()
                     old_zoom_level = zoom_level
                     old_render_offset_x = render_offset_x
@@ -786,16 +672,7 @@ async def main():
             elif event.type == pygame.KEYDOWN: 
                 if event.key == pygame.K_r: 
                     print("\nRegenerating map...")
-                    cheese_count = 5 
-                    next_windmill_cost = 0
-                    
-                    player_placed_objects = [] 
-                    windmills = [] 
-                    llamas = [] 
-                    mcuncles = []
-                    hamsters = []
-                    enemies = []
-                    projectiles = []
+                    sim.new_game()
                     selected_entity = None
                     selected_units = []
                     selected_removable_object = None 
@@ -803,41 +680,17 @@ async def main():
                     selected_llama_context = None
                     repair_button_rect = None
                     active_formation = "none" 
-                    
-                    stage_number = 1
-                    wave_in_stage = 1
-                    survival_mode = False
-                    survival_wave = 1
-                    victory_screen = False
-                    
-                    conf = STAGE_DATA[1]
-                    game_timer = conf["base_time"]
-                    
-                    enemies_attacking = False
-                    game_over = False
-                    waiting_for_next_stage = False
-                    
-                    castle_c = max(0, COLUMNS - CASTLE_HITBOX_WIDTH_TILES - 3)
-                    max_r = max(CASTLE_HITBOX_HEIGHT_TILES, ROWS - CASTLE_HITBOX_HEIGHT_TILES - 2)
-                    castle_r = random.randint(2, max_r)
-                    
-                    castle = Castle((castle_r, castle_c), TILE_SIZE)
-                    castle_occupied = set(castle.get_occupied_coords())
-
-                    map_data = generate_grass_map(ROWS, COLUMNS, castle_occupied)
-                    seed = map_data["seed"]
-                    grid = map_data["grid"]
-                    features = map_data["features"]
-                    
-                    spawn_entities()
                     _clamp_camera()
                     
+                elif event.key == PROFILE_TOGGLE_KEY:
+                    profiler.toggle()
+
                 elif event.key == pygame.K_s: 
                     if os.path.exists(SAVE_FOLDER):
-                        pygame.image.save(screen, os.path.join(SAVE_FOLDER, f"map_{seed}.png"))
+                        pygame.image.save(screen, os.path.join(SAVE_FOLDER, f"map_{sim.seed}.png"))
                 
                 elif event.key == pygame.K_ESCAPE: 
-                    if game_over or victory_screen:
+                    if sim.game_over or sim.victory_screen:
                         running = False
                     else:
                         current_tool = "none"
@@ -849,7 +702,7 @@ async def main():
                             selected_entity.selected = False
                             selected_entity = None
                         selected_units = [] 
-                        for u in mcuncles + hamsters: u.selected = False
+                        for u in sim.mcuncles + sim.hamsters: u.selected = False
                         
                         ui_control_panel.build_menu_active = False 
                         ui_control_panel.castle_menu_active = False
@@ -858,31 +711,27 @@ async def main():
                 elif event.key == pygame.K_DELETE:
                     if selected_units:
                         # Remove selected units from main lists
-                        for unit in selected_units:
-                            if unit in mcuncles:
-                                mcuncles.remove(unit)
-                            elif unit in hamsters:
-                                hamsters.remove(unit)
+                        sim.remove_units(selected_units)
                         # Clear selection
                         selected_units = []
                         print("Selected units deleted.")
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if game_over: continue 
+                if sim.game_over: continue 
                 
-                if victory_screen:
+                if sim.victory_screen:
                     if btn_continue_rect and btn_continue_rect.collidepoint(event.pos):
-                        victory_screen = False
-                        survival_mode = True
-                        game_timer = 0.1
+                        sim.victory_screen = False
+                        sim.survival_mode = True
+                        sim.game_timer = 0.1
                         print("Entering Survival Mode!")
                     elif btn_restart_rect and btn_restart_rect.collidepoint(event.pos):
                         # Force restart via recursion or event post
                         pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_r))
                     continue
 
-                if skip_button_rect and skip_button_rect.collidepoint(event.pos) and not enemies_attacking and not waiting_for_next_stage:
-                    game_timer = 0 
+                if skip_button_rect and skip_button_rect.collidepoint(event.pos) and not sim.enemies_attacking and not sim.waiting_for_next_stage:
+                    sim.game_timer = 0 
                     continue
 
                 if ui_control_panel.is_mouse_over(event.pos):
@@ -900,30 +749,30 @@ async def main():
                         selected_units = []
                     
                     elif ui_action == "train_unit":
-                        if castle and isinstance(ui_data, dict) and "name" in ui_data:
+                        if sim.castle and isinstance(ui_data, dict) and "name" in ui_data:
                             cost = ui_data.get("price", 0)
-                            if cheese_count >= cost:
-                                success = castle.queue_unit(ui_data["name"])
+                            if sim.cheese_count >= cost:
+                                success = sim.castle.queue_unit(ui_data["name"])
                                 if success:
-                                    cheese_count -= cost
-                                    castle.infinite_production = None
+                                    sim.cheese_count -= cost
+                                    sim.castle.infinite_production = None
                             else:
                                 print("Not enough cheese!")
                                 
                     elif ui_action == "train_unit_infinite":
-                        if castle and isinstance(ui_data, dict):
+                        if sim.castle and isinstance(ui_data, dict):
                             name = ui_data["name"]
-                            if castle.infinite_production == name:
-                                castle.infinite_production = None
+                            if sim.castle.infinite_production == name:
+                                sim.castle.infinite_production = None
                             else:
-                                castle.infinite_production = name
+                                sim.castle.infinite_production = name
 
                     elif ui_action == "repair_castle":
-                        if castle:
-                            cost = castle.get_repair_cost()
-                            if cheese_count >= cost:
-                                cheese_count -= cost
-                                castle.repair()
+                        if sim.castle:
+                            cost = sim.castle.get_repair_cost()
+                            if sim.cheese_count >= cost:
+                                sim.cheese_count -= cost
+                                sim.castle.repair()
                             else:
                                 print("Not enough cheese!")
 
@@ -935,7 +784,7 @@ async def main():
                     elif ui_action == "llama_follow":
                         if selected_llama_context:
                             bob_unit = None
-                            for h in hamsters:
+                            for h in sim.hamsters:
                                 if h.name == "Bob": 
                                     bob_unit = h
                                     break
@@ -958,7 +807,7 @@ async def main():
                             selected_units = []
                         
                         new_selection = []
-                        all_units = mcuncles + hamsters
+                        all_units = sim.mcuncles + sim.hamsters
                         for u in all_units:
                             if u.name == target_type:
                                 u.selected = True
@@ -982,15 +831,18 @@ async def main():
                         world_x = max(0, min(world_x, world_width_pixels))
                         world_y = max(0, min(world_y, world_height_pixels))
                         
+                        flow = sim.flow_to(world_x, world_y) # One field for the whole group
                         if active_formation == "none":
                             for u in selected_units:
-                                u.set_precise_target(world_x, world_y)
+                                u.set_precise_target(world_x, world_y, flow)
                         else:
                             positions = get_formation_positions((world_x, world_y), len(selected_units), active_formation)
+                            # Units leave the field where the formation starts and walk to their own slot
+                            release = 1 + max((math.hypot(tx - world_x, ty - world_y) for tx, ty in positions), default=0) / TILE_SIZE
                             for i, unit in enumerate(selected_units):
                                 if i < len(positions):
                                     tx, ty = positions[i]
-                                    unit.set_precise_target(tx, ty)
+                                    unit.set_precise_target(tx, ty, flow, release)
                         continue
 
                     if current_tool != "none" or selected_removable_object or ui_control_panel.castle_menu_active or ui_control_panel.llama_menu_active:
@@ -1014,9 +866,9 @@ async def main():
                     world_x_click, world_y_click = _screen_to_world_pixel(mouse_screen_x, mouse_screen_y)
 
                     if current_tool == "set_rally":
-                        if castle:
+                        if sim.castle:
                             if 0 <= grid_r_click < ROWS and 0 <= grid_c_click < COLUMNS:
-                                castle.set_rally_point(grid_r_click, grid_c_click)
+                                sim.castle.set_rally_point(grid_r_click, grid_c_click)
                                 current_tool = "none"
                                 continue
 
@@ -1025,51 +877,34 @@ async def main():
                             atype, ar, ac = selected_removable_object
                             if atype == "windmill":
                                 to_remove = None
-                                for w in windmills:
+                                for w in sim.windmills:
                                     if w.grid_r == ar and w.grid_c == ac:
                                         to_remove = w
                                         break
-                                if to_remove: windmills.remove(to_remove)
+                                if to_remove: sim.remove_windmill(to_remove)
                             else:
-                                player_placed_objects.remove(selected_removable_object)
+                                sim.remove_object(selected_removable_object)
                         selected_removable_object = None 
                         delete_button_rect = None 
                         continue 
 
                     if current_tool == "place": 
                         if 0 <= grid_r_click < ROWS and 0 <= grid_c_click < COLUMNS:
-                            if (grid_r_click, grid_c_click) in castle_occupied:
+                            if (grid_r_click, grid_c_click) in sim.castle_occupied:
                                 print("Cannot place object on the Castle!")
                                 continue
                             
-                            is_spot_free = (map_data["grid"][grid_r_click][grid_c_click] == "grass")
-                            for _, pr, pc in player_placed_objects:
-                                if pr == grid_r_click and pc == grid_c_click:
-                                    is_spot_free = False
-                                    break
-                            for w in windmills:
-                                if (grid_r_click, grid_c_click) in w.get_occupied_coords():
-                                    is_spot_free = False
-                                    break
-
-                            if is_spot_free:
+                            if sim.is_spot_free(grid_r_click, grid_c_click):
                                 if selected_asset_type == "windmill":
-                                    cost = next_windmill_cost
-                                    if cheese_count >= cost:
-                                        new_w = Windmill((grid_r_click, grid_c_click), TILE_SIZE)
-                                        windmills.append(new_w)
-                                        cheese_count -= cost
-                                        if next_windmill_cost == 0: next_windmill_cost = 5
-                                        else: next_windmill_cost += 5
-                                    else:
+                                    if not sim.build_windmill(grid_r_click, grid_c_click):
                                         print("Not enough cheese for windmill!")
                                 else:
-                                    player_placed_objects.append((selected_asset_type, grid_r_click, grid_c_click)) 
+                                    sim.place_object(selected_asset_type, grid_r_click, grid_c_click)
                             else:
                                 print("Cannot place here.")
                         continue
                     
-                    if castle and castle.is_pixel_clicked((world_x_click, world_y_click)):
+                    if sim.castle and sim.castle.is_pixel_clicked((world_x_click, world_y_click)):
                         ui_control_panel.castle_menu_active = True
                         ui_control_panel.llama_menu_active = False
                         selected_llama_context = None
@@ -1078,7 +913,7 @@ async def main():
                         continue
                     
                     llama_clicked = False
-                    for l in llamas:
+                    for l in sim.llamas:
                         if l.is_pixel_clicked((world_x_click, world_y_click)):
                             selected_llama_context = l
                             ui_control_panel.llama_menu_active = True
@@ -1088,13 +923,13 @@ async def main():
                     if llama_clicked: continue
                     
                     found_removable = False
-                    for w in windmills:
+                    for w in sim.windmills:
                         if w.is_pixel_clicked((world_x_click, world_y_click)):
                             selected_removable_object = ("windmill", w.grid_r, w.grid_c)
                             found_removable = True
                             break
                     if not found_removable:
-                        for asset_type, r, c in player_placed_objects:
+                        for asset_type, r, c in sim.player_placed_objects:
                             if r == grid_r_click and c == grid_c_click:
                                 selected_removable_object = (asset_type, r, c)
                                 found_removable = True
@@ -1105,7 +940,7 @@ async def main():
                         continue
                     
                     clicked_unit = None
-                    all_units = mcuncles + hamsters
+                    all_units = sim.mcuncles + sim.hamsters
                     for unit in all_units:
                         ux = unit.current_pixel_pos.x
                         uy = unit.current_pixel_pos.y
@@ -1153,7 +988,7 @@ async def main():
                             for u in selected_units: u.selected = False
                             selected_units = []
                             
-                        all_units = mcuncles + hamsters
+                        all_units = sim.mcuncles + sim.hamsters
                         for unit in all_units:
                             unit_screen_x, unit_screen_y = _world_to_screen_pixel(
                                 unit.current_pixel_pos.x + TILE_SIZE/2, 
@@ -1193,58 +1028,36 @@ async def main():
                     w = abs(drag_end[0] - selection_drag_start[0])
                     h = abs(drag_end[1] - selection_drag_start[1])
                     selection_rect = pygame.Rect(x1, y1, w, h)
-
-        # Gather Obstacles
-        current_obstacles = set()
-        for asset_type, r, c in player_placed_objects:
-            current_obstacles.add((r, c))
-        
-        pixel_obstacles = []
-        if castle: pixel_obstacles.append(castle)
-        pixel_obstacles.extend(windmills)
-
-        # Update Projectiles
-        for proj in projectiles:
-            proj.update(dt)
-        projectiles = [p for p in projectiles if p.active] 
-
-        if not game_over and not victory_screen:
-            # Update Entities
-            if castle: 
-                castle.update(dt)
-                while castle.spawned_units:
-                    new_unit = castle.spawned_units.pop(0)
-                    if isinstance(new_unit, McUncle):
-                        mcuncles.append(new_unit)
-                    else:
-                        hamsters.append(new_unit)
-            
-            all_friends = mcuncles + hamsters
-            
-            for w in windmills:
-                produced = w.update(dt, hamsters=all_friends)
-                if produced:
-                    cheese_count += 1
-
-            for llama in llamas: llama.update(dt, current_obstacles, pixel_obstacles, windmills)
-            
-            for mcuncle in mcuncles: 
-                mcuncle.update(dt, enemies, projectiles, current_obstacles, pixel_obstacles, friends=all_friends)
-                
-            for hamster in hamsters: 
-                hamster.update(dt, enemies, projectiles, current_obstacles, pixel_obstacles, friends=all_friends)
-                
-            for enemy in enemies: 
-                enemy.update(dt, current_obstacles, castle, move_to_castle=enemies_attacking) 
-            
-            enemies = [e for e in enemies if e.health > 0]
-
+        profiler.stop("events")
+
+        # --- Simulation ---
+        # Fixed ticks keep outcomes independent of the frame rate. If the machine falls
+        # too far behind, the backlog is dropped and the game slows down instead of spiralling.
+        steps = 0
+        while accumulator >= FIXED_DT:
+            if steps >= MAX_STEPS_PER_FRAME:
+                accumulator = 0.0
+                break
+            sim.step(FIXED_DT)
+            accumulator -= FIXED_DT
+            steps += 1
+
+        profiler.start("draw")
         screen.fill((0, 0, 0)) 
-        draw(map_data["seed"], map_data["grid"], map_data["features"], ui_control_panel)
+        with sim.interpolated(accumulator / FIXED_DT):
+            draw(ui_control_panel)
+        profiler.stop("draw")
+        profiler.draw(screen)
+        profiler.start("present")
         pygame.display.flip()
+        profiler.stop("present")
+        profiler.end_frame(steps=steps, enemies=len(sim.enemies), defenders=len(sim.mcuncles) + len(sim.hamsters),
+                           projectiles=len(sim.projectiles))
         
         await asyncio.sleep(0) 
 
+    if profiler.dump_csv(PROFILE_CSV):
+        print(f"Frame profile written to {PROFILE_CSV}")
     pygame.quit()
     sys.exit()
 